@@ -25,6 +25,11 @@ VERILATED_TOP_MODULE_NAME = V$(TOP_MODULE)
 KANATA_CONVERTER = python3 ../Tools/KanataConverter/KanataConverter.py
 RSD_LOG_FILE_RTL = RSD.log
 KANATA_LOG_FILE_RTL = Kanata.log
+RSD_LOG_FIFO_RTL = RSD.fifo
+
+# Produce a Kanata log and statistics from one read of a RSD log.
+RSD_LOG_ANALYZER = python3 ../Tools/KanataConverter/GeneratorMultiplexer.py
+STATISTICS_FILE_RTL = Statistics.json
 
 # Include core source code definition
 include Makefiles/CoreSources.inc.mk
@@ -102,6 +107,27 @@ kanata:
 		RSD_LOG_FILE=RSD.log 
 	$(KANATA_CONVERTER) $(RSD_LOG_FILE_RTL) $(KANATA_LOG_FILE_RTL)
 
+# Convert a RSD log while a simulator writes it to a named pipe.
+kanata-live:
+	rm -f $(RSD_LOG_FIFO_RTL)
+	mkfifo $(RSD_LOG_FIFO_RTL)
+	$(KANATA_CONVERTER) $(RSD_LOG_FIFO_RTL) $(KANATA_LOG_FILE_RTL) & \
+	$(LIBRARY_WORK_RTL)/$(VERILATED_TOP_MODULE_NAME) \
+		MAX_TEST_CYCLES=$(MAX_TEST_CYCLES) \
+		TEST_CODE=$(TEST_CODE) ENABLE_PC_GOAL=$(ENABLE_PC_GOAL) SHOW_SERIAL_OUT=$(SHOW_SERIAL_OUT) \
+		RSD_LOG_FILE=$(RSD_LOG_FIFO_RTL) || kill $$!; \
+	wait $$!; status=$$?; rm -f $(RSD_LOG_FIFO_RTL); exit $$status
+
+analysis:
+	$(LIBRARY_WORK_RTL)/$(VERILATED_TOP_MODULE_NAME) \
+		MAX_TEST_CYCLES=$(MAX_TEST_CYCLES) \
+		TEST_CODE=$(TEST_CODE) ENABLE_PC_GOAL=$(ENABLE_PC_GOAL) SHOW_SERIAL_OUT=$(SHOW_SERIAL_OUT) \
+		RSD_LOG_FILE=$(RSD_LOG_FILE_RTL)
+	$(RSD_LOG_ANALYZER) \
+		--kanata $(KANATA_LOG_FILE_RTL) \
+		--stats $(STATISTICS_FILE_RTL) \
+		$(RSD_LOG_FILE_RTL)
+
 
 # -------------------------------
 # Dump : Run test and dump values of register files for each cycle.
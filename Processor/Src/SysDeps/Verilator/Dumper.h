@@ -13,6 +13,8 @@
 
 #include <stdio.h>
 #include <string>
+#include <vector>
+#include <unordered_map>
 
 
 
@@ -41,6 +43,71 @@ private:
     int64_t m_cycle;
     int64_t m_retireID;
 
+    // Binary trace output (see Tools/KanataConverter/RSD_BinaryTrace.py)
+    static const int BT_TAG_CYCLE = 0x80;
+    static const int BT_TAG_STAGES = 0x81;
+    static const int BT_TAG_LABEL = 0x90;
+    static const int BT_TAG_STRING = 0xA0;
+    static const int BT_TAG_RESET_STRINGS = 0xA1;
+    static const int BT_STAGE_VALID = 0x40;
+    static const int BT_STAGE_STALL = 0x20;
+    static const int BT_STAGE_CLEAR = 0x10;
+    static const size_t BT_MAX_STRINGS = 0xffff;
+
+    bool m_binary;
+    std::vector<uint8_t> m_stages;      // Stage records in a current run
+    size_t m_stageNum;
+    std::unordered_map<std::string, int> m_strings;
+
+    void PutVarint(uint64_t value)
+    {
+        while (value >= 0x80) {
+            fputc((int)(value & 0x7f) | 0x80, m_file);
+            value >>= 7;
+        }
+        fputc((int)value, m_file);
+    }
+
+    void Put32(uint32_t value)
+    {
+        for (int i = 0; i < 4; i++) {
+            fputc((int)((value >> (i * 8)) & 0xff), m_file);
+        }
+    }
+
+    // A run of stage records is output before a cycle/label record.
+    void FlushStages()
+    {
+        if (m_stageNum > 0) {
+            fputc(BT_TAG_STAGES, m_file);
+            PutVarint(m_stageNum);
+            fwrite(&m_stages[0], 1, m_stages.size(), m_file);
+            m_stages.clear();
+            m_stageNum = 0;
+        }
+    }
+
+    // Return an index of an interned string, and define it if new.
+    int GetStringIndex(const std::string& str)
+    {
+        auto i = m_strings.find(str);
+        if (i != m_strings.end())
+            return i->second;
+
+        if (m_strings.size() >= BT_MAX_STRINGS) {
+            FlushStages();
+            fputc(BT_TAG_RESET_STRINGS, m_file);
+            m_strings.clear();
+            m_strings[""] = 0;
+        }
+        int index = (int)m_strings.size();
+        m_strings[str] = index;
+        fputc(BT_TAG_STRING, m_file);
+        PutVarint(str.size());
+        fwrite(str.data(), 1, str.size(), m_file);
+        return index;
+    }
+
     // ヘルパ
     std::string FormatString(const char* fmt, ...)
     {
@@ -92,18 +159,33 @@ public:
         m_file = nullptr;
         m_cycle = 0;
         m_retireID = 0;
+        m_binary = false;
+        m_stageNum = 0;
     }
 
     // ファイルオープン
-    void Open(const std::string& fileName)
+    // 'binary' selects the binary trace format, which is smaller and
+    // faster to convert.
+    void Open(const std::string& fileName, bool binary = false)
     {
         m_cycle = -1;
         m_retireID = 1;
-        m_file = fopen(fileName.c_str(), "w");
+        m_binary = binary;
+        m_file = fopen(fileName.c_str(), binary ? "wb" : "w");
         if (!m_file) {
             printf("Could not open %s\n", fileName.c_str());
         }
 
+        if (m_binary) {
+            m_stages.clear();
+            m_stageNum = 0;
+            m_strings.clear();
+            m_strings[""] = 0;
+            fwrite("\0RSD_Bin", 1, 8, m_file);
+            fputc(0, m_file);   // Version
+            return;
+        }
+
         // ヘッダと初期状態の出力
         fprintf(m_file, "RSD_Kanata\t0000\n");
 
@@ -117,6 +199,8 @@ public:
     // ファイルクローズ
     void Close(){
         if (m_file) {
+            if (m_binary)
+                FlushStages();
             fclose(m_file);
             m_file = nullptr;
         }
@@ -125,6 +209,12 @@ public:
     // サイクルを一つ進める
     void ProceedCycle(){
         m_cycle++;
+        if (m_binary) {
+            FlushStages();
+            fputc(BT_TAG_CYCLE, m_file);
+            PutVarint(1);
+            return;
+        }
         fprintf(m_file, "C\t%11d\n", 1);
         fprintf(m_file, "#\tcycle:%0d\n", (int32_t)m_cycle);
     };
@@ -132,7 +222,20 @@ public:
     void DumpStage(
         int stage, bool valid, bool stall, bool clear, int sid, int mid, const std::string& str){
         // Format: S    stage_id valid stall clear sid mid
-        if(valid)
+        if (valid && m_binary) {
+            int index = GetStringIndex(str);
+            m_stages.push_back(
+                (uint8_t)((stage & 0x0f) | BT_STAGE_VALID |
+                (stall ? BT_STAGE_STALL : 0) | (clear ? BT_STAGE_CLEAR : 0))
+            );
+            m_stages.push_back((uint8_t)(sid & 0xff));
+            m_stages.push_back((uint8_t)((sid >> 8) & 0xff));
+            m_stages.push_back((uint8_t)mid);
+            m_stages.push_back((uint8_t)(index & 0xff));
+            m_stages.push_back((uint8_t)((index >> 8) & 0xff));
+            m_stageNum++;
+        }
+        else if(valid)
             fprintf(m_file, "S\t%0d\t%0d\t%0d\t%0d\t%0d\t%0d\t%s\n", stage, valid, stall, clear, sid, mid, str.c_str());
     }
 
@@ -145,6 +248,15 @@ public:
 // `endif
 
     void DumpInsnCode( int sid, int mid, AddrPath pc, InsnPath insn){
+        if (m_binary) {
+            FlushStages();
+            fputc(BT_TAG_LABEL, m_file);
+            PutVarint(sid);
+            PutVarint(mid);
+            Put32(pc);
+            Put32(insn);
+            return;
+        }
         fprintf(m_file, "L\t%0d\t%0d\t%08x\t%08x\n", sid, mid, pc, insn);
     }
 
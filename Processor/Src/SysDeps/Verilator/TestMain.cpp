@@ -80,6 +80,7 @@ int main(int argc, char** argv) {
     string TEST_CODE = "Verification/TestCode/C/Fibonacci";
     string REG_CSV_FILE = "";
     string RSD_LOG_FILE = "";
+    bool RSD_LOG_BINARY = false;
     string WAVE_LOG_FILE = "";
 
     // Parse command line parameters
@@ -106,6 +107,9 @@ int main(int argc, char** argv) {
             else if (name == "RSD_LOG_FILE") {
                 RSD_LOG_FILE = value;
             }
+            else if (name == "RSD_LOG_BINARY") {
+                RSD_LOG_BINARY = stoi(value) ? true : false;
+            }
             else if (name == "TEST_CODE") {
                 TEST_CODE = value;
             }
@@ -136,7 +140,7 @@ int main(int argc, char** argv) {
     KanataDumper kanataDumper;
     if (RSD_LOG_FILE != "") {
         enableDumpKanata = true;
-        kanataDumper.Open(RSD_LOG_FILE);
+        kanataDumper.Open(RSD_LOG_FILE, RSD_LOG_BINARY);
     }
 
     bool enableDumpRegCSV = false;
@@ -3,83 +3,199 @@
 #
 # This script converts a RSD log to an architecture state log.
 #
-# Source log data is processed in 3 phases:
-#   1: RSD_Parser parses source log data, and then, its results are stored to 'ops'.
-#   2: ArchitectureStateGenerator scans committed 'ops' and generates 'opList'.
-#   3: ArchitectureStateGenerator generates architecuturestate log data from 'opList'.
+# Source log data is processed as follows:
+#   1: RSD_Parser parses source log data, and call
+#      OnCycle/OnEvent of ArchitectureStateGenerator.
+#   2: ArchitectureStateGenerator records the PC of each op from its label,
+#      and outputs it when the op retires.
 #      Now, the log consists of only PCs of committed ops.
 #
+# Ops are stored in a window indexed by gid like KanataGenerator, so memory
+# does not grow with the length of a log.
+#
+# With '--binary', a compact binary log is output. It begins with
+# ARCHITECTURE_STATE_BINARY_MAGIC and a version byte, and each committed op
+# is a pair of varints:
+#   a zigzag-encoded difference from the previous PC
+#   a difference from the previous retirement cycle
+# A binary log is converted to text with '--decode'.
+# A varint is an unsigned LEB128 number. See RSD_BinaryTrace.py
+#
 
 import sys
+from optparse import OptionParser
+
 from RSD_Parser import RSD_Parser, RSD_ParserError
+from RSD_Event import RSD_Event
+from RSD_BinaryTrace import EncodeVarint, DecodeVarint, RSD_BINARY_TRACE_BLOCK_SIZE
+from KanataGenerator import KANATA_CONVERTER_GID_WRAP_AROUND
+from CompressedStream import OpenInputStream, OpenOutputStream
+
+#
+# Global constants
+#
+ARCHITECTURE_STATE_BINARY_MAGIC = b"\x00RSD_Arc"
+ARCHITECTURE_STATE_BINARY_VERSION = 0
+
+# The number of committed ops buffered before they are written.
+ARCHITECTURE_STATE_BUFFER_OPS = 64 * 1024
+
 
 class ArchitectureStateGenerator( object ):
     """ Generate architecture state log data from parsed results. """
 
     ARCHITECTURE_STATE_HEADER = "# PC \n"
 
-    class Op( object ):
-        """ It has information about an op. """
-
-        def __init__( self, pc ):
-            self.pc = pc
-
     def __init__( self ):
         self.outputFileName = ""
         self.outputFile = None
+        self.binary = False
 
-        self.opList = []   # List of committed ops.
+        # gid -> PC of an in-flight op.
+        # PCs are stored in a window indexed by gid % GID_WRAP_AROUND.
+        self.gids_ = [ None ] * KANATA_CONVERTER_GID_WRAP_AROUND
+        self.pcs_ = [ None ] * KANATA_CONVERTER_GID_WRAP_AROUND
+
+        self.currentCycle_ = 0
+        self.retiredOps_ = []   # (gid, PC) of ops retired in a current cycle
+        self.buffer_ = []
+        self.prevPC_ = 0
+        self.prevCycle_ = 0
+        self.unlabeledOps_ = 0
 
     #
     # File open/close
     #
 
-    def Open( self, fileName ):
-        self.outputFileName = fileName;
-        self.outputFile = open( self.outputFileName, "w" )
-
+    def Open( self, fileName, binary=False ):
+        self.outputFileName = fileName
+        self.outputFile = OpenOutputStream( self.outputFileName )
+        self.binary = binary
+        self.OutputHeader()
 
     def Close( self ):
         if self.outputFile is not None :
+            self.OutputRetiredOps_()
+            self.Flush_()
             self.outputFile.close()
-    
+            self.outputFile = None
+        if self.unlabeledOps_ > 0:
+            print( "%d committed ops without labels are not output." % self.unlabeledOps_ )
 
     #
-    # Make and output log data to a file.
+    # Interface for RSD_Parser
     #
-    def Generate( self, parser ):
-        """ Output Kanata log data to a output file. """
-        
-        # Extract parsed results.
-        parserOps = parser.ops
-
-        # gid, pc are extracted.
-        for gid in sorted( parserOps.keys() ):
-            parserOp = parserOps[ gid ]
-            if parserOp.commit:
-                op = ArchitectureStateGenerator.Op( parserOp.label.pc )
-                self.opList.append( op )
-        
-        # Emit architecture state file header.            
-        self.OutputHeader()
 
-        # Emit architecture state log data.
-        for op in self.opList:
-            self.OutputArchitectureState( op )
+    def OnCycle( self, cycle ):
+        """ This method is called from RSD_Parser """
+        self.OutputRetiredOps_()
+        self.currentCycle_ = cycle
+
+    def OnEvent( self, event ):
+        """ This method is called from RSD_Parser """
+        type = event.type
+        if type == RSD_Event.LABEL:
+            # A label begins with a PC. See RSD_Parser.ProcessEvents_
+            i = event.gid % KANATA_CONVERTER_GID_WRAP_AROUND
+            self.gids_[ i ] = event.gid
+            self.pcs_[ i ] = event.comment.partition( ":" )[ 0 ]
+        elif type == RSD_Event.RETIRE:
+            i = event.gid % KANATA_CONVERTER_GID_WRAP_AROUND
+            if self.gids_[ i ] == event.gid:
+                self.retiredOps_.append( ( event.gid, self.pcs_[ i ] ) )
+                self.gids_[ i ] = None
+            else:
+                self.unlabeledOps_ += 1
+
+    #
+    # Output
+    #
 
-    def Write( self, str ):
-        self.outputFile.write( str )
+    def OutputRetiredOps_( self ):
+        """ Output ops retired in a current cycle in order of gid. """
+        if not self.retiredOps_:
+            return
+        self.retiredOps_.sort()
+        for gid, pc in self.retiredOps_:
+            self.OutputArchitectureState( pc )
+        self.retiredOps_ = []
+        if len( self.buffer_ ) >= ARCHITECTURE_STATE_BUFFER_OPS:
+            self.Flush_()
+
+    def Flush_( self ):
+        if self.binary:
+            self.outputFile.buffer.write( b"".join( self.buffer_ ) )
+        else:
+            self.outputFile.write( "".join( self.buffer_ ) )
+        self.buffer_ = []
 
     def OutputHeader( self ):
-        """ Output Kanata log header. """
-        self.Write( self.ARCHITECTURE_STATE_HEADER )
-    
-    def OutputArchitectureState( self, op ):
-        self.Write( "%s\n" % op.pc )
+        """ Output architecture state log header. """
+        if self.binary:
+            self.buffer_.append(
+                ARCHITECTURE_STATE_BINARY_MAGIC + bytes( [ ARCHITECTURE_STATE_BINARY_VERSION ] )
+            )
+        else:
+            self.buffer_.append( self.ARCHITECTURE_STATE_HEADER )
+
+    def OutputArchitectureState( self, pc ):
+        if not self.binary:
+            self.buffer_.append( "%s\n" % pc )
+            return
+        try:
+            value = int( pc, 16 )
+        except ValueError:
+            self.unlabeledOps_ += 1     # A PC is unknown, such as 'xxxxxxxx'.
+            return
+        delta = value - self.prevPC_
+        self.buffer_.append(
+            EncodeVarint( delta * 2 if delta >= 0 else -delta * 2 - 1 ) +
+            EncodeVarint( self.currentCycle_ - self.prevCycle_ )
+        )
+        self.prevPC_ = value
+        self.prevCycle_ = self.currentCycle_
+
+
+def ReadArchitectureState( fileName ):
+    """ Read a binary architecture state log and yield (cycle, PC).
+    A log is decoded in blocks, so memory does not grow with its length.
+    """
+    with OpenInputStream( fileName ) as file:
+        file = file.buffer
+        header = file.read( len( ARCHITECTURE_STATE_BINARY_MAGIC ) + 1 )
+        if not header.startswith( ARCHITECTURE_STATE_BINARY_MAGIC ):
+            raise IOError( "An unknown file format: %s" % fileName )
+        if header[ -1 ] != ARCHITECTURE_STATE_BINARY_VERSION:
+            raise IOError( "An unknown file version: %d" % header[ -1 ] )
+
+        pc = 0
+        cycle = 0
+        data = b""
+        while True:
+            block = file.read( RSD_BINARY_TRACE_BLOCK_SIZE )
+            if block == b"":
+                break
+            # 'data' has only a record that continues from a previous block.
+            data = data + block
+            pos = 0
+            while True:
+                start = pos
+                try:
+                    pcDelta, pos = DecodeVarint( data, pos )
+                    cycleDelta, pos = DecodeVarint( data, pos )
+                except IndexError:
+                    break
+                pc += ( pcDelta >> 1 ) ^ -( pcDelta & 1 )
+                cycle += cycleDelta
+                yield cycle, pc
+            data = data[ start: ]
+        if data:
+            raise IOError( "A truncated file: %s" % fileName )
+
 
 class ArchitectureStateConverter( object ):
 
-    def Main( self, inputFileName, outputFileName ):
+    def Main( self, inputFileName, outputFileName, binary=False ):
         """ The entry point of this class. """
 
         parser = RSD_Parser()
@@ -87,30 +203,51 @@ class ArchitectureStateConverter( object ):
 
         try:
             parser.Open( inputFileName )
-            generator.Open( outputFileName )
+            generator.Open( outputFileName, binary )
 
-            parser.Parse()
-            generator.Generate( parser )
+            parser.Parse( generator )
 
-        except IOError, (errno, strerror):
-            print( "I/O error(%s): %s" % ( errno, strerror ) )
+        except IOError as err:
+            print( "I/O error: %s" % err )
 
-        except RSD_ParserError, ( strerror ):
-            print( strerror )
+        except RSD_ParserError as err:
+            print( err )
 
         finally:
             parser.Close()
             generator.Close()
-            
+
+    def Decode( self, inputFileName, outputFileName ):
+        """ Convert a binary architecture state log to text. """
+        try:
+            with OpenOutputStream( outputFileName ) as file:
+                file.write( "# cycle\tPC\n" )
+                for cycle, pc in ReadArchitectureState( inputFileName ):
+                    file.write( "%d\t%08x\n" % ( cycle, pc ) )
+
+        except IOError as err:
+            print( "I/O error: %s" % err )
+
 
 #
 # The entry point of this program.
 #
 if __name__ == '__main__':
-    if ( len(sys.argv) < 3 ):
-        print( "usage: %(exe)s inputFileName outputFileName" % { 'exe': sys.argv[0] } )
+    optionParser = OptionParser( usage="%prog [options] inputFileName outputFileName" )
+    optionParser.add_option('-b', '--binary',
+                  action='store_true', dest='binary', default=False,
+                  help="Output a compact binary log.")
+    optionParser.add_option('-d', '--decode',
+                  action='store_true', dest='decode', default=False,
+                  help="Convert a binary architecture state log to text.")
+    options, args = optionParser.parse_args()
+
+    if ( len(args) < 2 ):
+        print( "usage: %(exe)s [options] inputFileName outputFileName" % { 'exe': sys.argv[0] } )
         exit(1)
-    
-    architectureStateConverter = ArchitectureStateConverter()
-    architectureStateConverter.Main( sys.argv[1], sys.argv[2] )
 
+    architectureStateConverter = ArchitectureStateConverter()
+    if options.decode:
+        architectureStateConverter.Decode( args[0], args[1] )
+    else:
+        architectureStateConverter.Main( args[0], args[1], options.binary )
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+
+#
+# Open RSD/Kanata log files that may be compressed.
+#
+# gzip, bz2, xz and zstd streams are supported. A codec of an input file is
+# chosen by its magic bytes, and that of an output file is chosen by its
+# extension. zstd requires the 'zstandard' module.
+#
+# Compression and decompression run on separate threads, so that they
+# overlap with parsing and formatting on the main thread.
+#
+# An input file name '-' is stdin. An input file may also be a named pipe,
+# and a growing file can be followed like 'tail -f' with 'follow=True'.
+# A codec of these streams is chosen by their first bytes, which are
+# peeked without being consumed.
+#
+
+import io
+import os
+import sys
+import bz2
+import gzip
+import lzma
+import stat
+import time
+import queue
+import threading
+
+
+# (name, magic bytes, extensions)
+COMPRESSED_STREAM_CODECS = [
+    ("gzip", b"\x1f\x8b", (".gz", ".gzip")),
+    ("bz2", b"BZh", (".bz2",)),
+    ("xz", b"\xfd7zXZ\x00", (".xz", ".lzma")),
+    ("zstd", b"\x28\xb5\x2f\xfd", (".zst", ".zstd")),
+]
+
+# The size of a block passed between threads.
+COMPRESSED_STREAM_BLOCK_SIZE = 1024 * 1024
+
+# The max number of blocks queued between threads.
+COMPRESSED_STREAM_QUEUE_DEPTH = 8
+
+# Seconds to wait for a reader thread when a stream is closed. A thread
+# blocked in a read of a pipe is not waited for longer.
+COMPRESSED_STREAM_CLOSE_TIMEOUT = 1.0
+
+# The interval of polling a followed file for new data in seconds.
+COMPRESSED_STREAM_FOLLOW_POLL_INTERVAL = 0.2
+
+# The default level of the gzip command. It is much faster than 9, which is
+# the default of the gzip module.
+COMPRESSED_STREAM_GZIP_LEVEL = 6
+
+
+def GetInputCodec(fileName):
+    """ Return the codec name of an input file, or None if it is not compressed. """
+    with open(fileName, "rb") as file:
+        head = file.read(8)
+    for name, magic, extensions in COMPRESSED_STREAM_CODECS:
+        if head.startswith(magic):
+            return name
+    return GetOutputCodec(fileName)
+
+
+def GetOutputCodec(fileName):
+    """ Return the codec name for an output file name, or None. """
+    lowerName = fileName.lower()
+    for name, magic, extensions in COMPRESSED_STREAM_CODECS:
+        if lowerName.endswith(extensions):
+            return name
+    return None
+
+
+def IsCompressed(fileName):
+    return GetInputCodec(fileName) is not None
+
+
+def IsStream(fileName):
+    """ Return True if an input file is stdin or is not a regular file,
+    such as a named pipe. A stream cannot be seeked or read twice.
+    """
+    if fileName == "-":
+        return True
+    try:
+        return not stat.S_ISREG(os.stat(fileName).st_mode)
+    except OSError:
+        return False
+
+
+def OpenZstd_():
+    try:
+        import zstandard
+    except ImportError:
+        raise IOError("The 'zstandard' module is required for zstd streams.")
+    return zstandard
+
+
+def OpenDecompressor_(codec, file):
+    if codec == "gzip":
+        return gzip.GzipFile(fileobj=file, mode="rb")
+    elif codec == "bz2":
+        return bz2.BZ2File(file, "rb")
+    elif codec == "xz":
+        return lzma.LZMAFile(file, "rb")
+    elif codec == "zstd":
+        return OpenZstd_().ZstdDecompressor().stream_reader(file)
+    raise IOError("An unknown codec: %s" % codec)
+
+
+def OpenCompressor_(codec, file):
+    if codec == "gzip":
+        return gzip.GzipFile(fileobj=file, mode="wb", compresslevel=COMPRESSED_STREAM_GZIP_LEVEL)
+    elif codec == "bz2":
+        return bz2.BZ2File(file, "wb")
+    elif codec == "xz":
+        return lzma.LZMAFile(file, "wb")
+    elif codec == "zstd":
+        return OpenZstd_().ZstdCompressor().stream_writer(file)
+    raise IOError("An unknown codec: %s" % codec)
+
+
+class ThreadedReader(io.RawIOBase):
+    """ Read blocks from a stream in a background thread. """
+
+    END = object()  # A sentinel put after the last block or an error
+
+    def __init__(self, stream, file):
+        io.RawIOBase.__init__(self)
+        self.stream_ = stream
+        self.file_ = file
+        self.queue_ = queue.Queue(COMPRESSED_STREAM_QUEUE_DEPTH)
+        self.block_ = b""
+        self.blockPos_ = 0
+        self.eof_ = False
+        self.error_ = None
+        self.stopping_ = False
+        self.thread_ = threading.Thread(target=self.Run_)
+        self.thread_.daemon = True
+        self.thread_.start()
+
+    def Run_(self):
+        try:
+            while not self.stopping_:
+                block = self.stream_.read(COMPRESSED_STREAM_BLOCK_SIZE)
+                if not block:
+                    break
+                self.queue_.put(block)
+        except Exception as err:
+            self.error_ = err
+        finally:
+            if self.stopping_:
+                # Nothing is read any more, and close() may not wait for
+                # this thread.
+                self.CloseStreams_()
+            else:
+                # The sentinel is always put, so that a reader is not blocked.
+                self.queue_.put(self.END)
+
+    def CloseStreams_(self):
+        self.stream_.close()
+        self.file_.close()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self.blockPos_ >= len(self.block_):
+            if self.eof_:
+                if self.error_ is not None:
+                    raise self.error_
+                return 0
+            block = self.queue_.get()
+            if block is self.END:
+                self.eof_ = True
+                if self.error_ is not None:
+                    raise self.error_
+                return 0
+            self.block_ = block
+            self.blockPos_ = 0
+
+        size = min(len(buffer), len(self.block_) - self.blockPos_)
+        buffer[:size] = self.block_[self.blockPos_:self.blockPos_ + size]
+        self.blockPos_ += size
+        return size
+
+    def close(self):
+        if not self.closed:
+            # Drain the queue so that the thread is not blocked in put.
+            self.stopping_ = True
+            deadline = time.time() + COMPRESSED_STREAM_CLOSE_TIMEOUT
+            while self.thread_.is_alive() and time.time() < deadline:
+                try:
+                    self.queue_.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            if not self.thread_.is_alive():
+                self.CloseStreams_()
+            # Otherwise the thread is blocked in a read, e.g. of a pipe, and
+            # closes streams when the read returns.
+        io.RawIOBase.close(self)
+
+
+class FollowReader(io.RawIOBase):
+    """ Read a growing file like 'tail -f'.
+    At the end of a file, new data is polled until the file does not grow
+    for 'timeout' seconds. A file is followed until this process is
+    interrupted when 'timeout' is None.
+    """
+
+    def __init__(self, file, timeout):
+        io.RawIOBase.__init__(self)
+        self.file_ = file
+        self.timeout_ = timeout
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        idleTime = 0.0
+        while True:
+            size = self.file_.readinto(buffer)
+            if size:
+                return size
+            if self.timeout_ is not None and idleTime >= self.timeout_:
+                return 0
+            time.sleep(COMPRESSED_STREAM_FOLLOW_POLL_INTERVAL)
+            idleTime += COMPRESSED_STREAM_FOLLOW_POLL_INTERVAL
+
+    def close(self):
+        if not self.closed:
+            self.file_.close()
+        io.RawIOBase.close(self)
+
+
+class ThreadedWriter(io.RawIOBase):
+    """ Write blocks to a stream in a background thread. """
+
+    def __init__(self, stream, file):
+        io.RawIOBase.__init__(self)
+        self.stream_ = stream
+        self.file_ = file
+        self.queue_ = queue.Queue(COMPRESSED_STREAM_QUEUE_DEPTH)
+        self.error_ = None
+        self.thread_ = threading.Thread(target=self.Run_)
+        self.thread_.daemon = True
+        self.thread_.start()
+
+    def Run_(self):
+        while True:
+            block = self.queue_.get()
+            if block is None:
+                break
+            if self.error_ is None:
+                try:
+                    self.stream_.write(block)
+                except Exception as err:
+                    self.error_ = err
+
+    def writable(self):
+        return True
+
+    def write(self, buffer):
+        if self.error_ is not None:
+            raise self.error_
+        self.queue_.put(bytes(buffer))
+        return len(buffer)
+
+    def close(self):
+        if not self.closed:
+            self.queue_.put(None)
+            self.thread_.join()
+            self.stream_.close()
+            self.file_.close()
+            io.RawIOBase.close(self)
+            if self.error_ is not None:
+                raise self.error_
+        else:
+            io.RawIOBase.close(self)
+
+
+def OpenInputStream(fileName, follow=False, followTimeout=None):
+    """ Open an input text file that may be compressed.
+    '-' is stdin. When 'follow' is True, a growing file is followed until
+    it does not grow for 'followTimeout' seconds. See FollowReader.
+    """
+    if fileName == "-":
+        file = open(sys.stdin.fileno(), "rb", buffering=0, closefd=False)
+    else:
+        file = open(fileName, "rb", buffering=0)
+    if follow:
+        file = FollowReader(file, followTimeout)
+    file = io.BufferedReader(file)
+
+    # A head is peeked, because a stream cannot be read twice.
+    head = file.peek(8)
+    codec = None
+    for name, magic, extensions in COMPRESSED_STREAM_CODECS:
+        if head.startswith(magic):
+            codec = name
+    if codec is None and fileName != "-":
+        codec = GetOutputCodec(fileName)
+    if codec is None:
+        return io.TextIOWrapper(file)
+
+    reader = ThreadedReader(OpenDecompressor_(codec, file), file)
+    return io.TextIOWrapper(io.BufferedReader(reader, COMPRESSED_STREAM_BLOCK_SIZE))
+
+
+def OpenOutputStream(fileName):
+    """ Open an output text file that is compressed if its extension
+    specifies a codec.
+    """
+    codec = GetOutputCodec(fileName)
+    if codec is None:
+        return open(fileName, "w")
+
+    file = open(fileName, "wb")
+    writer = ThreadedWriter(OpenCompressor_(codec, file), file)
+    return io.TextIOWrapper(io.BufferedWriter(writer, COMPRESSED_STREAM_BLOCK_SIZE))
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+#
+# Deliver events parsed from one RSD log to multiple generators.
+#
+# GeneratorMultiplexer has the OnCycle/OnEvent interface of a generator,
+# and passes each cycle and event to all registered generators, so that
+# artifacts such as a Kanata log and statistics are produced from one read
+# of a log. A generator can run on a worker thread behind a bounded queue
+# with ThreadedGenerator. See ThreadedStage.py
+#
+# A generator is an object with OnCycle(cycle), OnEvent(event) and
+# Close(). Events are shared by generators, so they must not modify them.
+#
+# Usage:
+#   python3 GeneratorMultiplexer.py [options] inputFileName
+#   --kanata FILE:      Output a Kanata log. See KanataGenerator.py
+#   --stats FILE:       Output statistics. With --stats-ipc-series FILE,
+#                       IPC of each window is also output.
+#                       See PipelineStatisticsGenerator.py
+#   --arch-state FILE:  Output PCs of committed ops. With --arch-state-binary,
+#                       they are output in a binary format.
+#                       See ArchitectureStateConverter.py
+#   --hotspots FILE:    Output cycles attributed to PCs. With
+#                       --hotspots-folded FILE, folded stacks are also output.
+#                       See HotspotProfileGenerator.py
+#   --top-down FILE:    Output a top-down breakdown of dispatch slots. The
+#                       number of slots in a cycle is set by --top-down-width.
+#                       See TopDownGenerator.py
+#   --plugin MODULE.CLASS[=FILE]:
+#                       Add a user generator. It is constructed without
+#                       arguments, and opened with FILE if it is given.
+#   --threads:          Run each generator on a worker thread.
+#
+
+import sys
+import importlib
+from optparse import OptionParser
+
+from ThreadedStage import ThreadedGenerator
+
+
+class GeneratorMultiplexer(object):
+    """ Pass cycles and events to multiple generators. """
+
+    def __init__(self):
+        self.generators_ = []
+        self.onCycles_ = []
+        self.onEvents_ = []
+
+    def Add(self, generator, threaded=False):
+        """ Register an opened generator.
+        When 'threaded' is True, it runs on a worker thread.
+        """
+        if threaded:
+            generator = ThreadedGenerator(generator)
+        self.generators_.append(generator)
+        self.onCycles_.append(generator.OnCycle)
+        self.onEvents_.append(generator.OnEvent)
+
+    def Close(self):
+        """ Close all generators. The first error is raised after all of
+        them are closed.
+        """
+        error = None
+        for generator in self.generators_:
+            try:
+                generator.Close()
+            except Exception as err:
+                if error is None:
+                    error = err
+        self.generators_ = []
+        self.onCycles_ = []
+        self.onEvents_ = []
+        if error is not None:
+            raise error
+
+    def OnCycle(self, cycle):
+        """ This method is called from RSD_Parser """
+        for onCycle in self.onCycles_:
+            onCycle(cycle)
+
+    def OnEvent(self, event):
+        """ This method is called from RSD_Parser """
+        for onEvent in self.onEvents_:
+            onEvent(event)
+
+
+def CreatePlugin(spec):
+    """ Create a generator from 'MODULE.CLASS[=FILE]'. """
+    name, _, fileName = spec.partition("=")
+    moduleName, _, className = name.rpartition(".")
+    if moduleName == "":
+        raise ValueError("A plugin must be specified as MODULE.CLASS: %s" % spec)
+    generator = getattr(importlib.import_module(moduleName), className)()
+    if fileName != "":
+        generator.Open(fileName)
+    return generator
+
+
+#
+# The entry point of this program.
+#
+if __name__ == '__main__':
+    from RSD_Parser import RSD_Parser, RSD_ParserError
+    from KanataGenerator import KanataGenerator
+    from PipelineStatisticsGenerator import PipelineStatisticsGenerator
+    from ArchitectureStateConverter import ArchitectureStateGenerator
+    from HotspotProfileGenerator import HotspotProfileGenerator
+    from TopDownGenerator import TopDownGenerator, TOP_DOWN_DEFAULT_WIDTH
+
+    optionParser = OptionParser( usage="%prog [options] inputFileName" )
+    optionParser.add_option('-k', '--kanata',
+                  action='store', type='string', dest='kanata', default=None,
+                  help="Output a Kanata log to the specified file.")
+    optionParser.add_option('-s', '--stats',
+                  action='store', type='string', dest='stats', default=None,
+                  help="Output statistics to the specified file (.json or .csv).")
+    optionParser.add_option('--stats-ipc-series',
+                  action='store', type='string', dest='statsIPC_Series', default=None,
+                  help="Output IPC of each window of statistics to the specified CSV file.")
+    optionParser.add_option('-a', '--arch-state',
+                  action='store', type='string', dest='archState', default=None,
+                  help="Output PCs of committed ops to the specified file.")
+    optionParser.add_option('--arch-state-binary',
+                  action='store_true', dest='archStateBinary', default=False,
+                  help="Output PCs of committed ops in a binary format.")
+    optionParser.add_option('--hotspots',
+                  action='store', type='string', dest='hotspots', default=None,
+                  help="Output cycles attributed to PCs to the specified file (.txt, .json or .csv).")
+    optionParser.add_option('--hotspots-folded',
+                  action='store', type='string', dest='hotspotsFolded', default=None,
+                  help="Output folded stacks of hotspots to the specified file.")
+    optionParser.add_option('--top-down',
+                  action='store', type='string', dest='topDown', default=None,
+                  help="Output a top-down breakdown of dispatch slots to the specified file (.txt, .json or .csv).")
+    optionParser.add_option('--top-down-width',
+                  action='store', type='int', dest='topDownWidth',
+                  default=TOP_DOWN_DEFAULT_WIDTH,
+                  help="The number of dispatch slots in a cycle for --top-down.")
+    optionParser.add_option('-p', '--plugin',
+                  action='append', type='string', dest='plugins', default=[],
+                  help="Add a generator specified as MODULE.CLASS[=FILE].")
+    optionParser.add_option('-t', '--threads',
+                  action='store_true', dest='threads', default=False,
+                  help="Run each generator on a worker thread.")
+    options, args = optionParser.parse_args()
+
+    if ( len(args) < 1 ):
+        print( "usage: %(exe)s [options] inputFileName" % { 'exe': sys.argv[0] } )
+        exit(1)
+
+    parser = RSD_Parser()
+    multiplexer = GeneratorMultiplexer()
+    try:
+        parser.Open( args[0] )
+        if options.kanata is not None:
+            generator = KanataGenerator()
+            generator.Open( options.kanata )
+            multiplexer.Add( generator, options.threads )
+        if options.stats is not None:
+            generator = PipelineStatisticsGenerator()
+            generator.Open( options.stats, options.statsIPC_Series )
+            multiplexer.Add( generator, options.threads )
+        if options.archState is not None:
+            generator = ArchitectureStateGenerator()
+            generator.Open( options.archState, options.archStateBinary )
+            multiplexer.Add( generator, options.threads )
+        if options.hotspots is not None:
+            generator = HotspotProfileGenerator()
+            generator.Open( options.hotspots, options.hotspotsFolded )
+            multiplexer.Add( generator, options.threads )
+        if options.topDown is not None:
+            generator = TopDownGenerator( options.topDownWidth )
+            generator.Open( options.topDown )
+            multiplexer.Add( generator, options.threads )
+        for spec in options.plugins:
+            multiplexer.Add( CreatePlugin( spec ), options.threads )
+
+        parser.Parse( multiplexer )
+
+    except IOError as err:
+        print("I/O error: %s" % err)
+
+    except RSD_ParserError as err:
+        print(err)
+
+    finally:
+        parser.Close()
+        multiplexer.Close()
@@ -0,0 +1,452 @@
+# -*- coding: utf-8 -*-
+
+#
+# This script attributes cycles of a RSD log to the PCs of ops.
+#
+# HotspotProfileGenerator has the same OnCycle/OnEvent interface as
+# KanataGenerator, and is driven by RSD_Parser in the same way. For each
+# label of ops ("PC: disassembly"), it computes:
+#
+#   retired:      The number of retired ops.
+#   flushes:      The number of flushed ops.
+#   headCycles:   Cycles in which no op retires while the op is the oldest
+#                 op in flight. These are the cycles that the op blocks
+#                 commit, and hotspots are ranked by them.
+#   slotCycles:   Cycles that the op occupies pipeline stages, for each
+#                 stage. Those of flushed ops are counted separately as
+#                 flushedSlotCycles.
+#   stallCycles:  Cycles that the op stalls, for each stage. Those of
+#                 flushed ops are counted separately as flushedStallCycles.
+#
+# Every cycle of a log is counted once as a retiring cycle, a head cycle
+# of an op, or an idle cycle without ops in flight.
+#
+# Results are written as a ranked table, as JSON when an output file name
+# ends with '.json', or as CSV when it ends with '.csv'. With '--folded',
+# slot cycles are also written as folded stacks for flamegraph.pl:
+#   region;PC: disassembly;stage            slot cycles without stalls
+#   region;PC: disassembly;stage;stall      stall cycles
+#   region;PC: disassembly;flushed;stage    slot cycles of flushed ops
+#                                           without stalls
+#   region;PC: disassembly;flushed;stage;stall
+#                                           stall cycles of flushed ops
+# A region is a block of PCs of '--region-size' bytes.
+#
+# Usage:
+#   python3 HotspotProfileGenerator.py [options] inputFileName outputFileName
+#
+
+import sys
+import csv
+import json
+import collections
+from optparse import OptionParser
+
+from RSD_Event import RSD_Event
+from KanataGenerator import KANATA_CONVERTER_STAGE_NAME_TABLE
+from KanataGenerator import KANATA_CONVERTER_GID_WRAP_AROUND
+
+#
+# Global constants
+#
+HOTSPOT_PROFILE_UNKNOWN_LABEL = "unknown"
+HOTSPOT_PROFILE_DEFAULT_REGION_SIZE = 256
+HOTSPOT_PROFILE_DEFAULT_TOP = 50
+
+
+class HotspotProfileGenerator(object):
+    """ Attribute cycles to the PCs of ops. """
+
+    class Op(object):
+        """ A state of an in-flight op. """
+        __slots__ = (
+            "gid", "label", "stageID", "stageBegin", "stallStageID", "stallBegin",
+            "slots", "stalls", "headCycles"
+        )
+
+        def __init__(self, gid):
+            self.gid = gid
+            self.label = None
+            self.stageID = None
+            self.stageBegin = None
+            self.stallStageID = None
+            self.stallBegin = None
+            self.slots = []     # (stage id, cycles)
+            self.stalls = []    # (stage id, cycles)
+            self.headCycles = 0
+
+    class Hotspot(object):
+        """ Cycles attributed to a label. """
+        __slots__ = (
+            "retired", "flushes", "headCycles", "slotCycles", "stallCycles",
+            "flushedSlotCycles", "flushedStallCycles"
+        )
+
+        def __init__(self):
+            stageNum = len(KANATA_CONVERTER_STAGE_NAME_TABLE)
+            self.retired = 0
+            self.flushes = 0
+            self.headCycles = 0
+            self.slotCycles = [0] * stageNum
+            self.stallCycles = [0] * stageNum
+            self.flushedSlotCycles = [0] * stageNum
+            self.flushedStallCycles = [0] * stageNum
+
+    def __init__(self, regionSize=HOTSPOT_PROFILE_DEFAULT_REGION_SIZE, top=HOTSPOT_PROFILE_DEFAULT_TOP):
+        self.outputFileName_ = ""
+        self.foldedFileName_ = None
+        self.regionSize_ = regionSize
+        self.top_ = top
+
+        # gid -> Op. See opMap_ in KanataGenerator.py
+        self.ops_ = [None] * KANATA_CONVERTER_GID_WRAP_AROUND
+        self.opsWatermark_ = -KANATA_CONVERTER_GID_WRAP_AROUND
+        # Ops older than this gid are not in flight.
+        self.headGID_ = None
+        self.lastGID_ = None
+
+        self.hotspots_ = {}     # label -> Hotspot
+        self.firstCycle_ = None
+        self.currentCycle_ = None
+        self.retiredInCycle_ = False
+        self.retiringCycles_ = 0
+        self.idleCycles_ = 0
+
+        # Event handlers indexed by an event type.
+        handlers = {
+            RSD_Event.INIT: self.OnInitialize_,
+            RSD_Event.STAGE_BEGIN: self.OnStageBegin_,
+            RSD_Event.STAGE_END: self.OnStageEnd_,
+            RSD_Event.STALL_BEGIN: self.OnStallBegin_,
+            RSD_Event.STALL_END: self.OnStallEnd_,
+            RSD_Event.RETIRE: self.OnRetire_,
+            RSD_Event.FLUSH: self.OnFlush_,
+            RSD_Event.LABEL: self.OnLabel_,
+        }
+        self.eventHandlers_ = [handlers[type] for type in range(len(handlers))]
+
+    #
+    # File open/close
+    # Results are written when a generator is closed.
+    #
+    def Open(self, fileName, foldedFileName=None):
+        self.outputFileName_ = fileName
+        self.foldedFileName_ = foldedFileName
+
+    def Close(self):
+        if self.outputFileName_ == "":
+            return
+        if self.currentCycle_ is not None:
+            self.AccountCycles_(self.currentCycle_ + 1)
+        # Ops in flight at the end of a log
+        for op in self.ops_:
+            if op is not None and op.headCycles > 0:
+                self.GetHotspot_(op).headCycles += op.headCycles
+                op.headCycles = 0
+
+        results = self.GetResults()
+        lowerName = self.outputFileName_.lower()
+        with open(self.outputFileName_, "w") as file:
+            if lowerName.endswith(".json"):
+                json.dump(results, file, indent=2)
+                file.write("\n")
+            elif lowerName.endswith(".csv"):
+                self.WriteCSV_(file, results)
+            else:
+                self.WriteTable_(file, results)
+        if self.foldedFileName_ is not None:
+            with open(self.foldedFileName_, "w") as file:
+                self.WriteFolded_(file)
+        self.outputFileName_ = ""
+
+    #
+    # Interface for RSD_Parser
+    #
+    def OnCycle(self, cycle):
+        """ This method is called from RSD_Parser """
+        if self.currentCycle_ is None:
+            self.firstCycle_ = cycle
+        elif cycle > self.currentCycle_:
+            self.AccountCycles_(cycle)
+        self.currentCycle_ = cycle
+
+    def OnEvent(self, event):
+        """ This method is called from RSD_Parser """
+        op = self.ops_[event.gid % KANATA_CONVERTER_GID_WRAP_AROUND]
+        if op is not None and op.gid == event.gid:
+            self.eventHandlers_[event.type](event, op)
+        elif event.type == RSD_Event.INIT:
+            self.OnInitialize_(event, None)
+
+    def AccountCycles_(self, cycle):
+        """ Attribute cycles from a current cycle to 'cycle'. """
+        cycles = cycle - self.currentCycle_
+        if self.retiredInCycle_:
+            self.retiringCycles_ += 1
+            cycles -= 1
+            self.retiredInCycle_ = False
+        if cycles > 0:
+            # No op retires in the rest of the cycles, because RSD_Parser
+            # calls OnCycle for every cycle with events.
+            head = self.FindHead_()
+            if head is None:
+                self.idleCycles_ += cycles
+            else:
+                head.headCycles += cycles
+
+    def FindHead_(self):
+        """ Return the oldest op in flight, or None. """
+        if self.headGID_ is None:
+            return None
+        W = KANATA_CONVERTER_GID_WRAP_AROUND
+        ops = self.ops_
+        gid = self.headGID_
+        while gid <= self.lastGID_:
+            op = ops[gid % W]
+            if op is not None and op.gid == gid:
+                self.headGID_ = gid
+                return op
+            gid += 1
+        self.headGID_ = gid
+        return None
+
+    def DisposeOps_(self, gid):
+        """ Delete ops older than 'gid'. See DisposeOps_ in KanataGenerator.py """
+        W = KANATA_CONVERTER_GID_WRAP_AROUND
+        ops = self.ops_
+        for g in range(max(self.opsWatermark_, gid - W), gid):
+            op = ops[g % W]
+            if op is not None and op.gid < gid:
+                # An op that is neither retired nor flushed, such as an op
+                # flushed in Np, keeps cycles it blocked commit.
+                if op.headCycles > 0:
+                    self.GetHotspot_(op).headCycles += op.headCycles
+                ops[g % W] = None
+        self.opsWatermark_ = max(self.opsWatermark_, gid)
+        if self.headGID_ is not None and self.headGID_ < gid:
+            self.headGID_ = gid
+
+    def GetHotspot_(self, op):
+        label = op.label if op.label is not None else HOTSPOT_PROFILE_UNKNOWN_LABEL
+        hotspot = self.hotspots_.get(label)
+        if hotspot is None:
+            hotspot = self.hotspots_[label] = HotspotProfileGenerator.Hotspot()
+        return hotspot
+
+    #
+    # Event handlers
+    # 'op' is a state of an event op. It is None when INIT adds a new op.
+    #
+    def OnInitialize_(self, event, op):
+        gid = event.gid
+        self.ops_[gid % KANATA_CONVERTER_GID_WRAP_AROUND] = self.Op(gid)
+        if self.headGID_ is None or gid < self.headGID_:
+            self.headGID_ = gid
+        if self.lastGID_ is None or gid > self.lastGID_:
+            self.lastGID_ = gid
+
+    def OnLabel_(self, event, op):
+        op.label = event.comment
+
+    def OnStageBegin_(self, event, op):
+        op.stageID = event.stageID
+        op.stageBegin = self.currentCycle_
+
+    def OnStageEnd_(self, event, op):
+        if op.stageBegin is not None:
+            op.slots.append((event.stageID, self.currentCycle_ - op.stageBegin))
+            op.stageBegin = None
+
+    def OnStallBegin_(self, event, op):
+        op.stallStageID = event.stageID
+        op.stallBegin = self.currentCycle_
+
+    def OnStallEnd_(self, event, op):
+        if op.stallBegin is not None:
+            op.stalls.append((op.stallStageID, self.currentCycle_ - op.stallBegin))
+            op.stallBegin = None
+
+    def OnRetire_(self, event, op):
+        hotspot = self.GetHotspot_(op)
+        hotspot.retired += 1
+        hotspot.headCycles += op.headCycles
+        op.headCycles = 0
+        for stageID, cycles in op.slots:
+            hotspot.slotCycles[stageID] += cycles
+        for stageID, cycles in op.stalls:
+            hotspot.stallCycles[stageID] += cycles
+        self.retiredInCycle_ = True
+        self.DisposeOps_(event.gid + 1)
+
+    def OnFlush_(self, event, op):
+        # A stall is ended by a flush.
+        self.OnStallEnd_(event, op)
+        hotspot = self.GetHotspot_(op)
+        hotspot.flushes += 1
+        hotspot.headCycles += op.headCycles
+        for stageID, cycles in op.slots:
+            hotspot.flushedSlotCycles[stageID] += cycles
+        for stageID, cycles in op.stalls:
+            hotspot.flushedStallCycles[stageID] += cycles
+        self.ops_[event.gid % KANATA_CONVERTER_GID_WRAP_AROUND] = None
+
+    #
+    # Results
+    #
+    def GetPC_(self, label):
+        """ Return a PC in a label, or None. """
+        try:
+            return int(label.partition(":")[0], 16)
+        except ValueError:
+            return None
+
+    def GetResults(self):
+        """ Return results as a dictionary. Hotspots are sorted by head
+        cycles, stall cycles and slot cycles.
+        """
+        if self.firstCycle_ is None:
+            cycles = 0
+        else:
+            cycles = self.currentCycle_ - self.firstCycle_ + 1
+
+        names = KANATA_CONVERTER_STAGE_NAME_TABLE
+        hotspots = []
+        for label, h in self.hotspots_.items():
+            hotspots.append(collections.OrderedDict([
+                ("pc", self.GetPC_(label)),
+                ("label", label),
+                ("retired", h.retired),
+                ("flushes", h.flushes),
+                ("headCycles", h.headCycles),
+                ("stallCycles", sum(h.stallCycles)),
+                ("slotCycles", sum(h.slotCycles)),
+                ("flushedSlotCycles", sum(h.flushedSlotCycles)),
+                ("flushedStallCycles", sum(h.flushedStallCycles)),
+                ("stages", collections.OrderedDict(
+                    (names[i], collections.OrderedDict([
+                        ("slotCycles", h.slotCycles[i]),
+                        ("stallCycles", h.stallCycles[i]),
+                        ("flushedSlotCycles", h.flushedSlotCycles[i]),
+                        ("flushedStallCycles", h.flushedStallCycles[i]),
+                    ]))
+                    for i in range(len(names))
+                    if (h.slotCycles[i] or h.stallCycles[i] or
+                        h.flushedSlotCycles[i] or h.flushedStallCycles[i])
+                )),
+            ]))
+        hotspots.sort(key=lambda h: (-h["headCycles"], -h["stallCycles"], -h["slotCycles"], h["label"]))
+
+        return collections.OrderedDict([
+            ("cycles", cycles),
+            ("retiringCycles", self.retiringCycles_),
+            ("headCycles", sum(h["headCycles"] for h in hotspots)),
+            ("idleCycles", self.idleCycles_),
+            ("hotspots", hotspots),
+        ])
+
+    def WriteTable_(self, file, results):
+        cycles = results["cycles"]
+        file.write(
+            "cycles: %d, retiring: %d, blocked by ops: %d, idle: %d\n\n" % (
+                cycles, results["retiringCycles"], results["headCycles"], results["idleCycles"]
+            )
+        )
+        file.write(
+            "%4s %10s %10s %6s %10s %10s %10s %8s  %s\n" % (
+                "rank", "PC", "head", "%", "stall", "slots", "retired", "flushes", "instruction"
+            )
+        )
+        for rank, h in enumerate(results["hotspots"][:self.top_]):
+            pc, _, disassembly = h["label"].partition(": ")
+            file.write(
+                "%4d %10s %10d %5.1f%% %10d %10d %10d %8d  %s\n" % (
+                    rank + 1, pc, h["headCycles"],
+                    100.0 * h["headCycles"] / cycles if cycles else 0.0,
+                    h["stallCycles"], h["slotCycles"], h["retired"], h["flushes"],
+                    disassembly
+                )
+            )
+
+    def WriteCSV_(self, file, results):
+        """ Write a row for each label and stage. """
+        writer = csv.writer(file, lineterminator="\n")
+        writer.writerow([
+            "pc", "label", "stage", "retired", "flushes", "headCycles",
+            "slotCycles", "stallCycles", "flushedSlotCycles", "flushedStallCycles"
+        ])
+        for h in results["hotspots"]:
+            writer.writerow([
+                h["pc"], h["label"], "", h["retired"], h["flushes"], h["headCycles"],
+                h["slotCycles"], h["stallCycles"], h["flushedSlotCycles"], h["flushedStallCycles"]
+            ])
+            for stage, s in h["stages"].items():
+                writer.writerow([
+                    h["pc"], h["label"], stage, "", "", "",
+                    s["slotCycles"], s["stallCycles"], s["flushedSlotCycles"], s["flushedStallCycles"]
+                ])
+
+    def WriteFolded_(self, file):
+        """ Write slot cycles as folded stacks. """
+        names = KANATA_CONVERTER_STAGE_NAME_TABLE
+        for label in sorted(self.hotspots_):
+            h = self.hotspots_[label]
+            pc = self.GetPC_(label)
+            if pc is None:
+                region = HOTSPOT_PROFILE_UNKNOWN_LABEL
+            else:
+                region = "%08x" % (pc - pc % self.regionSize_)
+            frame = "%s;%s" % (region, label.replace(";", ","))
+            for i, name in enumerate(names):
+                # Stall cycles are a part of slot cycles of the same ops.
+                self.WriteFoldedStage_(
+                    file, frame, name, h.slotCycles[i], h.stallCycles[i]
+                )
+                self.WriteFoldedStage_(
+                    file, frame + ";flushed", name, h.flushedSlotCycles[i], h.flushedStallCycles[i]
+                )
+
+    def WriteFoldedStage_(self, file, frame, name, slotCycles, stallCycles):
+        busy = slotCycles - stallCycles
+        if busy > 0:
+            file.write("%s;%s %d\n" % (frame, name, busy))
+        if stallCycles > 0:
+            file.write("%s;%s;stall %d\n" % (frame, name, stallCycles))
+
+
+#
+# The entry point of this program.
+#
+if __name__ == '__main__':
+    from RSD_Parser import RSD_Parser, RSD_ParserError
+
+    optionParser = OptionParser( usage="%prog [options] inputFileName outputFileName" )
+    optionParser.add_option('-f', '--folded',
+                  action='store', type='string', dest='folded', default=None,
+                  help="Write slot cycles as folded stacks to the specified file.")
+    optionParser.add_option('-r', '--region-size',
+                  action='store', type='int', dest='regionSize',
+                  default=HOTSPOT_PROFILE_DEFAULT_REGION_SIZE,
+                  help="Group PCs in folded stacks by regions of the specified bytes.")
+    optionParser.add_option('-t', '--top',
+                  action='store', type='int', dest='top',
+                  default=HOTSPOT_PROFILE_DEFAULT_TOP,
+                  help="Write the specified number of hotspots to a table.")
+    options, args = optionParser.parse_args()
+
+    if ( len(args) < 2 ):
+        print( "usage: %(exe)s [options] inputFileName outputFileName" % { 'exe': sys.argv[0] } )
+        exit(1)
+
+    parser = RSD_Parser()
+    generator = HotspotProfileGenerator( options.regionSize, options.top )
+    try:
+        parser.Open( args[0] )
+        generator.Open( args[1], options.folded )
+        parser.Parse( generator )
+    except IOError as err:
+        print("I/O error: %s" % err)
+    except RSD_ParserError as err:
+        print(err)
+    finally:
+        parser.Close()
+        generator.Close()
@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+
+#
+# This script converts many RSD logs to Kanata logs in a process pool.
+#
+# Inputs are given as:
+#   IN=OUT:     A pair of an input log and an output file.
+#   DIRECTORY:  Logs named '--input-name' (RSD.log) under a directory.
+#   FILE/GLOB:  Logs or a glob pattern ('**' matches directories
+#               recursively). Directories matched are searched as above.
+# Unless a pair is given, a Kanata log is output to a directory of its
+# input as '--output-name' (Kanata.log), like 'make kanata' in each test
+# directory.
+#
+# Each log is converted by a worker process in a pool, so the interpreter
+# starts only once per worker. Larger logs are converted first to balance
+# workers. A log is skipped when its output is newer than its input,
+# unless '--force' is given. An output is written to a temporary file and
+# renamed when a conversion succeeds, so an interrupted conversion is not
+# taken as up to date.
+#
+# With '--program-name NAME', labels of a log are looked up in a program
+# image NAME (e.g. code.hex) in a directory of the log when it exists.
+# See RSD_ProgramImage.py
+#
+# Messages printed while a log is converted are counted in a summary, and
+# they are printed with '--verbose'.
+#
+# Usage:
+#   python3 KanataBatchConverter.py [options] inputs...
+#
+
+import os
+import io
+import sys
+import glob
+import time
+import contextlib
+import multiprocessing
+from optparse import OptionParser
+
+from RSD_Parser import RSD_Parser, RSD_ParserError
+from RSD_ProgramImage import RSD_ProgramImage, RSD_ProgramImageError
+from KanataGenerator import KanataGenerator
+from KanataGenerator import KANATA_GENERATOR_PROFILES, KANATA_GENERATOR_PROFILE_FULL
+
+#
+# Global constants
+#
+KANATA_BATCH_INPUT_NAME = "RSD.log"     # See RSD_LOG_FILE_RTL in Src/Makefile
+KANATA_BATCH_OUTPUT_NAME = "Kanata.log" # See KANATA_LOG_FILE_RTL in Src/Makefile
+
+# Results of conversions
+KANATA_BATCH_STATUS_OK = "ok"
+KANATA_BATCH_STATUS_SKIPPED = "skipped"
+KANATA_BATCH_STATUS_ERROR = "error"
+
+
+def FindLogs(specs, inputName=KANATA_BATCH_INPUT_NAME, outputName=KANATA_BATCH_OUTPUT_NAME):
+    """ Return a list of (input, output) pairs from input specifications. """
+    inputs = []
+    pairs = []
+    for spec in specs:
+        if "=" in spec:
+            pairs.append(tuple(spec.split("=", 1)))
+            continue
+        matches = sorted(glob.glob(spec, recursive=True))
+        if not matches:
+            raise ValueError("No log is found: %s" % spec)
+        for match in matches:
+            if not os.path.isdir(match):
+                inputs.append(match)
+                continue
+            for root, dirs, files in os.walk(match):
+                dirs.sort()
+                if inputName in files:
+                    inputs.append(os.path.join(root, inputName))
+
+    for inputFileName in inputs:
+        pairs.append(
+            (inputFileName, os.path.join(os.path.dirname(inputFileName), outputName))
+        )
+
+    outputs = {}
+    for inputFileName, outputFileName in pairs:
+        key = os.path.abspath(outputFileName)
+        if key == os.path.abspath(inputFileName):
+            raise ValueError("An output overwrites its input: %s" % inputFileName)
+        if key in outputs and outputs[key] != os.path.abspath(inputFileName):
+            raise ValueError(
+                "Logs are output to the same file: %s (%s, %s)" %
+                (outputFileName, outputs[key], inputFileName)
+            )
+        outputs[key] = os.path.abspath(inputFileName)
+
+    # A log given twice is converted once.
+    unique = []
+    for pair in pairs:
+        if pair not in unique:
+            unique.append(pair)
+    return unique
+
+
+def IsUpToDate(inputFileName, outputFileName, programFileName=None):
+    """ Return whether an output is newer than its input and a program. """
+    sources = [inputFileName]
+    if programFileName is not None:
+        sources.append(programFileName)
+    try:
+        outputTime = os.path.getmtime(outputFileName)
+        return all(os.path.getmtime(source) <= outputTime for source in sources)
+    except OSError:
+        return False
+
+
+def CreateResult_(inputFileName, outputFileName, status):
+    """ Return a result of a conversion. Values not measured are None. """
+    return {
+        "input": inputFileName,
+        "output": outputFileName,
+        "status": status,
+        "error": None,
+        "inputSize": None,
+        "outputSize": None,
+        "cycles": None,
+        "committedOps": None,
+        "seconds": None,
+        "messages": "",
+    }
+
+
+def ConvertLog_(args):
+    """ Convert a log in a worker process, and return a result. """
+    inputFileName, outputFileName, programFileName, profile = args
+    root, ext = os.path.splitext(outputFileName)
+    tempFileName = "%s.tmp%s" % (root, ext)
+    result = CreateResult_(inputFileName, outputFileName, KANATA_BATCH_STATUS_OK)
+
+    begin = time.time()
+    messages = io.StringIO()
+    parser = RSD_Parser()
+    generator = KanataGenerator(profile)
+    parser.SetLabelOutput(generator.OutputsLabels())
+    try:
+        with contextlib.redirect_stdout(messages):
+            try:
+                if programFileName is not None and generator.OutputsLabels():
+                    parser.SetProgramImage(RSD_ProgramImage(programFileName))
+                parser.Open(inputFileName)
+                generator.Open(tempFileName)
+                parser.Parse(generator)
+            finally:
+                parser.Close()
+                generator.Close()
+        os.replace(tempFileName, outputFileName)
+        result["inputSize"] = os.path.getsize(inputFileName)
+        result["outputSize"] = os.path.getsize(outputFileName)
+        result["cycles"] = parser.currentCycle_
+        result["committedOps"] = parser.committedOpNum_
+
+    except (IOError, RSD_ParserError, RSD_ProgramImageError) as err:
+        result["error"] = str(err)
+    except Exception as err:
+        # A broken log, e.g. one that cannot be decoded, must not abort the
+        # other logs in a batch.
+        result["error"] = "%s: %s" % (type(err).__name__, err)
+
+    if result["error"] is not None:
+        result["status"] = KANATA_BATCH_STATUS_ERROR
+        if os.path.exists(tempFileName):
+            os.remove(tempFileName)
+
+    result["seconds"] = time.time() - begin
+    result["messages"] = messages.getvalue()
+    return result
+
+
+class KanataBatchConverter(object):
+    """ Convert RSD logs to Kanata logs in a process pool. """
+
+    def __init__(
+        self, jobs=None, force=False, programName=None,
+        profile=KANATA_GENERATOR_PROFILE_FULL, verbose=False
+    ):
+        """ 'jobs' is the number of worker processes, or None to use all
+        CPUs of a machine.
+        """
+        self.jobs_ = jobs if jobs is not None else (os.cpu_count() or 1)
+        self.force_ = force
+        self.programName_ = programName
+        self.profile_ = profile
+        self.verbose_ = verbose
+
+    def Main(self, pairs):
+        """ The entry point of this class.
+        Convert (input, output) pairs, print a summary and return results.
+        """
+        begin = time.time()
+        results = [None] * len(pairs)
+        tasks = []
+        for i, (inputFileName, outputFileName) in enumerate(pairs):
+            programFileName = self.GetProgramFileName_(inputFileName)
+            if not self.force_ and IsUpToDate(inputFileName, outputFileName, programFileName):
+                result = CreateResult_(inputFileName, outputFileName, KANATA_BATCH_STATUS_SKIPPED)
+                result["inputSize"] = os.path.getsize(inputFileName)
+                result["outputSize"] = os.path.getsize(outputFileName)
+                results[i] = result
+                continue
+            tasks.append((i, (inputFileName, outputFileName, programFileName, self.profile_)))
+
+        # Larger logs first, so that a large log does not finish last.
+        tasks.sort(key=lambda task: -self.GetSize_(task[1][0]))
+        jobs = max(1, min(self.jobs_, len(tasks)))
+        for done, (i, result) in enumerate(self.Run_(tasks, jobs)):
+            results[i] = result
+            print(
+                "[%d/%d] %s: %s (%.2f s)" %
+                (done + 1, len(tasks), result["input"], result["status"], result["seconds"])
+            )
+            if result["error"] is not None:
+                print("  %s" % result["error"])
+            if self.verbose_ and result["messages"]:
+                sys.stdout.write(result["messages"])
+
+        self.PrintSummary_(results, time.time() - begin, jobs)
+        return results
+
+    def Run_(self, tasks, jobs):
+        """ Yield (index, result) of tasks as they finish. """
+        if jobs == 1:
+            for i, args in tasks:
+                yield i, ConvertLog_(args)
+            return
+
+        # A pair of an input and an output is unique. See FindLogs
+        indices = {(args[0], args[1]): i for i, args in tasks}
+        pool = multiprocessing.Pool(jobs)
+        try:
+            for result in pool.imap_unordered(ConvertLog_, [args for i, args in tasks]):
+                yield indices[(result["input"], result["output"])], result
+        finally:
+            pool.close()
+            pool.join()
+
+    def GetProgramFileName_(self, inputFileName):
+        if self.programName_ is None:
+            return None
+        fileName = os.path.join(os.path.dirname(inputFileName), self.programName_)
+        return fileName if os.path.exists(fileName) else None
+
+    def GetSize_(self, fileName):
+        try:
+            return os.path.getsize(fileName)
+        except OSError:
+            return 0
+
+    def PrintSummary_(self, results, seconds, jobs):
+        """ Print a table of sizes, cycles and conversion times. """
+        width = max([len("input")] + [len(r["input"]) for r in results])
+        print("")
+        print(
+            "%-*s %8s %10s %10s %10s %10s %9s %9s" %
+            (width, "input", "status", "input MB", "output MB", "cycles", "ops", "seconds", "messages")
+        )
+        for r in results:
+            print(
+                "%-*s %8s %10s %10s %10s %10s %9s %9d" % (
+                    width, r["input"], r["status"],
+                    self.FormatValue_(r["inputSize"], 1.0 / (1024 * 1024), "%.1f"),
+                    self.FormatValue_(r["outputSize"], 1.0 / (1024 * 1024), "%.1f"),
+                    self.FormatValue_(r["cycles"], 1, "%d"),
+                    self.FormatValue_(r["committedOps"], 1, "%d"),
+                    self.FormatValue_(r["seconds"], 1, "%.2f"),
+                    r["messages"].count("\n")
+                )
+            )
+
+        counts = {}
+        for r in results:
+            counts[r["status"]] = counts.get(r["status"], 0) + 1
+        print(
+            "%d converted, %d skipped, %d failed in %.2f s with %d processes" % (
+                counts.get(KANATA_BATCH_STATUS_OK, 0),
+                counts.get(KANATA_BATCH_STATUS_SKIPPED, 0),
+                counts.get(KANATA_BATCH_STATUS_ERROR, 0),
+                seconds, jobs
+            )
+        )
+
+    def FormatValue_(self, value, scale, format):
+        return "-" if value is None else format % (value * scale)
+
+
+#
+# The entry point of this program.
+#
+if __name__ == '__main__':
+    optionParser = OptionParser( usage="%prog [options] inputs..." )
+    optionParser.add_option('-j', '--jobs',
+                  action='store', type='int', dest='jobs', default=None,
+                  help="Convert logs with the specified number of processes (default: all CPUs).")
+    optionParser.add_option('--input-name',
+                  action='store', type='string', dest='inputName', default=KANATA_BATCH_INPUT_NAME,
+                  help="The name of logs searched in directories (default: %s)." % KANATA_BATCH_INPUT_NAME)
+    optionParser.add_option('--output-name',
+                  action='store', type='string', dest='outputName', default=KANATA_BATCH_OUTPUT_NAME,
+                  help="The name of Kanata logs output next to inputs (default: %s)." % KANATA_BATCH_OUTPUT_NAME)
+    optionParser.add_option('-f', '--force',
+                  action='store_true', dest='force', default=False,
+                  help="Convert logs even if their outputs are newer.")
+    optionParser.add_option('--program-name',
+                  action='store', type='string', dest='programName', default=None,
+                  help="Look up labels in a program image with the specified name "
+                       "(e.g. code.hex) next to each log.")
+    optionParser.add_option('--output-profile',
+                  action='store', type='choice', dest='outputProfile',
+                  choices=KANATA_GENERATOR_PROFILES, default=KANATA_GENERATOR_PROFILE_FULL,
+                  help="Kanata commands to output: %s" % ", ".join(KANATA_GENERATOR_PROFILES))
+    optionParser.add_option('-v', '--verbose',
+                  action='store_true', dest='verbose', default=False,
+                  help="Print messages from conversions.")
+    options, args = optionParser.parse_args()
+
+    if ( len(args) < 1 ):
+        print( "usage: %(exe)s [options] inputs..." % { 'exe': sys.argv[0] } )
+        exit(1)
+
+    try:
+        pairs = FindLogs( args, options.inputName, options.outputName )
+    except ValueError as err:
+        print( err )
+        exit(1)
+
+    converter = KanataBatchConverter(
+        options.jobs, options.force, options.programName, options.outputProfile, options.verbose
+    )
+    results = converter.Main( pairs )
+    if any( r["status"] == KANATA_BATCH_STATUS_ERROR for r in results ):
+        exit(1)
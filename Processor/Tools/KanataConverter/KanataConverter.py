@@ -21,27 +21,173 @@
 #   rid: An unique id for each 'retired' micro op in a Kanata log.
 #       This is calculated from gid when output.
 #
+# With '--jobs N', a log is converted with N processes.
+# See KanataParallelConverter.py
+#
+# Logs of many tests are converted at once in a process pool by
+# KanataBatchConverter.py
+#
+# With '--from-cycle' and '--to-cycle', only a cycle window of a log is
+# converted using a cycle index of the log.
+# See KanataWindowConverter.py and RSD_LogIndex.py
+#
+# An input file may be '-' (stdin) or a named pipe, so that a log is
+# converted while a simulator writes it. With '--follow', a growing file is
+# followed like 'tail -f' until it does not grow for '--follow-timeout'
+# seconds. Kanata commands are written as cycles complete in these modes.
+#
+# With '--profile', time spent in each phase of a conversion is measured,
+# and progress is reported periodically. With '--profile-output', a summary
+# is also saved as JSON. A log is converted with a single process and
+# without a cycle window when it is profiled.
+# See KanataConverterProfiler.py
+#
+# With '--sample-period N' and '--sample-length K', only K cycles out of
+# every N cycles are converted, and the rest of a log is fast-forwarded.
+# With '--sample-unit commits', samples are K committed ops out of every N
+# committed ops. Samples are output to a single file, or to a file per
+# sample with '--sample-segments'. See KanataSampleConverter.py
+#
+# Only selected ops are output with filters: '--pc-range BEGIN-END' and
+# '--symbol NAME' with '--symbol-file' select ops by PCs, '--flushed-only'
+# selects flushed ops, and '--min-stall N' selects ops that stall N cycles
+# or more (in a stage given by '--stall-stage'). '--stages' outputs only
+# the given stages. See RSD_OpFilter.py
+#
+# With '--program FILE', labels are looked up in a program image of a test
+# (an ELF file or code.hex) decoded once before a conversion, and they are
+# annotated with 'function+offset' from symbols in an ELF file or in
+# '--symbol-file'. '--program-base' gives the address of the head of
+# code.hex. See RSD_ProgramImage.py
+#
+# With '--output-profile compact', a stage comment is output once and ops
+# have no gid labels. With '--output-profile minimal', only ops, stages and
+# retirement/flush are output, and labels are not disassembled. See
+# KanataGenerator.py
+#
+# With '--threads', reading a log and formatting/writing a Kanata log run on
+# worker threads, and they overlap with parsing. Formatting stays on the
+# parsing thread for a stream or a followed file, so that output is not
+# delayed by batching. See ThreadedStage.py
+#
 
 import sys
 import pprint
+from optparse import OptionParser
 
 from RSD_Parser import RSD_Parser, RSD_ParserError
-from KanataGenerator import KanataGenerator
+from RSD_OpFilter import RSD_OpFilter, ReadSymbolRanges
+from RSD_ProgramImage import RSD_ProgramImage, RSD_ProgramImageError
+from KanataGenerator import KanataGenerator, KANATA_CONVERTER_STAGE_NAME_TABLE
+from KanataGenerator import KANATA_GENERATOR_PROFILES, KANATA_GENERATOR_PROFILE_FULL
+from KanataParallelConverter import KanataParallelConverter
+from KanataWindowConverter import KanataWindowConverter
+from RSD_LogIndex import RSD_LogIndexError
+from RSD_BinaryTrace import IsBinaryTraceFile
+from KanataConverterProfiler import KanataConverterProfiler
+from ThreadedStage import ThreadedGenerator
+from KanataSampleConverter import KanataSampleSchedule, KanataSampleParser, KanataSampleGenerator
+from KanataSampleConverter import KANATA_SAMPLE_UNITS, KANATA_SAMPLE_UNIT_CYCLES
 import RISCV_Disassembler
+import CompressedStream
+
+#
+# Global constants
+#
+
+# Output is written every this number of seconds when a log is converted
+# from a stream or a followed file.
+KANATA_CONVERTER_LIVE_FLUSH_INTERVAL = 1.0
+
+# The default seconds to wait for a followed file to grow.
+KANATA_CONVERTER_FOLLOW_TIMEOUT = 30.0
+
+# The max number of blocks read ahead of parsing with '--threads'.
+KANATA_CONVERTER_READ_AHEAD = 4
 
 
 class KanataConverter( object ):
 
-    def Main( self, inputFileName, outputFileName ):
-        """ The entry point of this class. """
+    def Main(
+        self, inputFileName, outputFileName, jobs=1, fromCycle=None, toCycle=None,
+        profiler=None, follow=False, followTimeout=KANATA_CONVERTER_FOLLOW_TIMEOUT,
+        sampler=None, sampleSegments=False, opFilter=None, threads=False,
+        programImage=None, outputProfile=KANATA_GENERATOR_PROFILE_FULL
+    ):
+        """ The entry point of this class.
+        When 'profiler' is a KanataConverterProfiler, a conversion is
+        measured by it. When 'follow' is True, a growing input file is
+        followed. 'followTimeout' is None to follow it until interrupted.
+        When 'sampler' is a KanataSampleSchedule, only its samples are
+        converted, to a file per sample if 'sampleSegments' is True.
+        When 'opFilter' is a RSD_OpFilter, only ops selected by it are output.
+        When 'threads' is True, stages of a conversion run on worker threads.
+        When 'programImage' is a RSD_ProgramImage, labels are looked up in it.
+        'outputProfile' selects Kanata commands to output. See KanataGenerator.py
+        """
+
+        if follow:
+            if jobs > 1 or fromCycle is not None or toCycle is not None:
+                print("A whole followed log is converted with a single process.")
+            jobs = 1
+            fromCycle = toCycle = None
+        live = follow or CompressedStream.IsStream( inputFileName )
+
+        if profiler is not None:
+            if jobs > 1 or fromCycle is not None or toCycle is not None or threads:
+                print("A whole log is converted with a single thread for profiling.")
+            jobs = 1
+            fromCycle = toCycle = None
+            threads = False
 
-        parser = RSD_Parser()
-        generator = KanataGenerator()
+        if opFilter is not None:
+            if jobs > 1 or fromCycle is not None or toCycle is not None:
+                print("A filtered log is converted with a single process and without a cycle window.")
+            jobs = 1
+            fromCycle = toCycle = None
+
+        if sampler is not None:
+            if jobs > 1 or fromCycle is not None or toCycle is not None:
+                print("A sampled log is converted with a single process and without a cycle window.")
+            jobs = 1
+            fromCycle = toCycle = None
+
+        if fromCycle is not None or toCycle is not None:
+            self.MainWindow(
+                inputFileName, outputFileName, fromCycle, toCycle, programImage, outputProfile
+            )
+            return
+
+        if jobs > 1 and self.MainParallel(
+            inputFileName, outputFileName, jobs, programImage, outputProfile
+        ):
+            return
+
+        if sampler is None:
+            parser = RSD_Parser()
+            generator = KanataGenerator( outputProfile )
+        else:
+            parser = KanataSampleParser( sampler )
+            generator = KanataSampleGenerator( sampler, sampleSegments, outputProfile )
+        parser.SetLabelOutput( generator.OutputsLabels() )
+        if opFilter is not None:
+            parser.SetOpFilter( opFilter )
+        if programImage is not None:
+            parser.SetProgramImage( programImage )
 
         try:
-            parser.Open( inputFileName )
+            parser.Open( inputFileName, follow, followTimeout )
             generator.Open( outputFileName )
+            if live:
+                generator.SetFlushInterval( KANATA_CONVERTER_LIVE_FLUSH_INTERVAL )
+            if threads:
+                parser.SetReadAhead( KANATA_CONVERTER_READ_AHEAD )
+                if not live:
+                    generator = ThreadedGenerator( generator )
 
+            if profiler is not None:
+                profiler.Instrument( parser, generator )
+                profiler.Begin()
             parser.Parse(generator)
             #generator.Generate( parser )
             #pprint.pprint( parser.events );
@@ -52,18 +198,229 @@ class KanataConverter( object ):
         except RSD_ParserError as err:
             print(err)
 
+        except KeyboardInterrupt:
+            print("Interrupted. Ops in flight are not output.")
+
         finally:
+            if profiler is not None:
+                profiler.End()
             parser.Close()
             generator.Close()
 
+    def MainParallel(
+        self, inputFileName, outputFileName, jobs, programImage=None,
+        outputProfile=KANATA_GENERATOR_PROFILE_FULL
+    ):
+        """ Convert a log with multiple processes.
+        See KanataParallelConverter.py
+        Returns False when a log must be converted with a single process.
+        """
+        try:
+            if CompressedStream.IsStream( inputFileName ):
+                # A stream cannot be split at byte offsets or read twice.
+                print("A stream is converted with a single process.")
+                return False
+            if CompressedStream.IsCompressed( inputFileName ):
+                # A compressed stream cannot be split at byte offsets.
+                print("A compressed log is converted with a single process.")
+                return False
+            if IsBinaryTraceFile( inputFileName ):
+                # Records in a binary trace cannot be found from an arbitrary offset.
+                print("A binary log is converted with a single process.")
+                return False
+            KanataParallelConverter( jobs ).Main(
+                inputFileName, outputFileName, programImage, outputProfile
+            )
+
+        except IOError as err:
+            print("I/O error: %s" % err)
+
+        except RSD_ParserError as err:
+            print(err)
+
+        return True
+
+    def MainWindow(
+        self, inputFileName, outputFileName, fromCycle, toCycle, programImage=None,
+        outputProfile=KANATA_GENERATOR_PROFILE_FULL
+    ):
+        """ Convert a cycle window of a log.
+        See KanataWindowConverter.py
+        """
+        try:
+            KanataWindowConverter().Main(
+                inputFileName, outputFileName,
+                fromCycle if fromCycle is not None else 0, toCycle, programImage,
+                outputProfile
+            )
+
+        except IOError as err:
+            print("I/O error: %s" % err)
+
+        except (RSD_ParserError, RSD_LogIndexError) as err:
+            print(err)
+
 
 #
 # The entry point of this program.
 #
 if __name__ == '__main__':
-    if ( len(sys.argv) < 3 ):
-        print( "usage: %(exe)s inputFileName outputFileName" % { 'exe': sys.argv[0] } )
+    optionParser = OptionParser( usage="%prog [options] inputFileName outputFileName" )
+    optionParser.add_option('-j', '--jobs',
+                  action='store', type='int', dest='jobs', default=1,
+                  help="Convert a log with the specified number of processes.")
+    optionParser.add_option('--from-cycle',
+                  action='store', type='int', dest='fromCycle', default=None,
+                  help="Convert a log from the specified cycle.")
+    optionParser.add_option('--to-cycle',
+                  action='store', type='int', dest='toCycle', default=None,
+                  help="Convert a log to the specified cycle (inclusive).")
+    optionParser.add_option('--profile',
+                  action='store_true', dest='profile', default=False,
+                  help="Measure each phase of a conversion and report progress.")
+    optionParser.add_option('--profile-output',
+                  action='store', type='string', dest='profileOutput', default=None,
+                  help="Save a profile summary to the specified JSON file (implies --profile).")
+    optionParser.add_option('--progress-interval',
+                  action='store', type='float', dest='progressInterval', default=10.0,
+                  help="Report progress every specified seconds when profiling.")
+    optionParser.add_option('-f', '--follow',
+                  action='store_true', dest='follow', default=False,
+                  help="Follow a growing input file like 'tail -f'.")
+    optionParser.add_option('--follow-timeout',
+                  action='store', type='float', dest='followTimeout',
+                  default=KANATA_CONVERTER_FOLLOW_TIMEOUT,
+                  help="Stop following an input file when it does not grow for "
+                       "the specified seconds (0: until interrupted).")
+    optionParser.add_option('--sample-period',
+                  action='store', type='int', dest='samplePeriod', default=None,
+                  help="Convert a sample every specified number of cycles or committed ops.")
+    optionParser.add_option('--sample-length',
+                  action='store', type='int', dest='sampleLength', default=None,
+                  help="The number of cycles or committed ops in a sample.")
+    optionParser.add_option('--sample-unit',
+                  action='store', type='choice', dest='sampleUnit',
+                  choices=KANATA_SAMPLE_UNITS, default=KANATA_SAMPLE_UNIT_CYCLES,
+                  help="The unit of --sample-period and --sample-length: %s" %
+                       ", ".join(KANATA_SAMPLE_UNITS))
+    optionParser.add_option('--sample-offset',
+                  action='store', type='int', dest='sampleOffset', default=0,
+                  help="Begin the first sample at the specified cycle or committed op.")
+    optionParser.add_option('--sample-segments',
+                  action='store_true', dest='sampleSegments', default=False,
+                  help="Output each sample to its own file such as Kanata.0000.log.")
+    optionParser.add_option('-t', '--threads',
+                  action='store_true', dest='threads', default=False,
+                  help="Read, parse and format a log on separate threads.")
+    optionParser.add_option('--pc-range',
+                  action='append', type='string', dest='pcRanges', default=[],
+                  help="Output only ops with PCs in a hexadecimal range BEGIN-END (exclusive).")
+    optionParser.add_option('--symbol',
+                  action='append', type='string', dest='symbols', default=[],
+                  help="Output only ops in the specified symbol (requires --symbol-file).")
+    optionParser.add_option('--symbol-file',
+                  action='store', type='string', dest='symbolFile', default=None,
+                  help="Read symbols from an ELF file or the output of 'nm' or 'nm -S'.")
+    optionParser.add_option('--flushed-only',
+                  action='store_true', dest='flushedOnly', default=False,
+                  help="Output only flushed ops.")
+    optionParser.add_option('--min-stall',
+                  action='store', type='int', dest='minStall', default=None,
+                  help="Output only ops that stall the specified cycles or more at once.")
+    optionParser.add_option('--stall-stage',
+                  action='store', type='choice', dest='stallStage',
+                  choices=KANATA_CONVERTER_STAGE_NAME_TABLE, default=None,
+                  help="Count only stalls in the specified stage for --min-stall.")
+    optionParser.add_option('--stages',
+                  action='store', type='string', dest='stages', default=None,
+                  help="Output only the specified comma-separated stages, such as Is,X,Cm.")
+    optionParser.add_option('--program',
+                  action='store', type='string', dest='program', default=None,
+                  help="Look up labels in a program image (an ELF file or code.hex).")
+    optionParser.add_option('--program-base',
+                  action='store', type='string', dest='programBase', default=None,
+                  help="A hexadecimal address of the head of code.hex "
+                       "(default: mapped with the RSD memory map).")
+    optionParser.add_option('--output-profile',
+                  action='store', type='choice', dest='outputProfile',
+                  choices=KANATA_GENERATOR_PROFILES, default=KANATA_GENERATOR_PROFILE_FULL,
+                  help="Kanata commands to output: %s" % ", ".join(KANATA_GENERATOR_PROFILES))
+    options, args = optionParser.parse_args()
+
+    if ( len(args) < 2 ):
+        print( "usage: %(exe)s [options] inputFileName outputFileName" % { 'exe': sys.argv[0] } )
+        exit(1)
+
+    sampler = None
+    if options.samplePeriod is not None or options.sampleLength is not None:
+        if options.samplePeriod is None or options.sampleLength is None:
+            print( "--sample-period and --sample-length must be specified together." )
+            exit(1)
+        try:
+            sampler = KanataSampleSchedule(
+                options.samplePeriod, options.sampleLength, options.sampleUnit, options.sampleOffset
+            )
+        except ValueError as err:
+            print( err )
+            exit(1)
+
+    opFilter = None
+    try:
+        pcRanges = None
+        if options.pcRanges or options.symbols:
+            pcRanges = []
+            for pcRange in options.pcRanges:
+                begin, _, end = pcRange.partition("-")
+                pcRanges.append((int(begin, 16), int(end, 16)))
+            if options.symbols:
+                if options.symbolFile is None:
+                    raise ValueError("--symbol requires --symbol-file.")
+                pcRanges += ReadSymbolRanges( options.symbolFile, options.symbols )
+        stages = None
+        if options.stages is not None:
+            stages = set()
+            for name in options.stages.split(","):
+                if name not in KANATA_CONVERTER_STAGE_NAME_TABLE:
+                    raise ValueError("An unknown stage: %s" % name)
+                stages.add( KANATA_CONVERTER_STAGE_NAME_TABLE.index(name) )
+        if options.stallStage is not None and options.minStall is None:
+            raise ValueError("--stall-stage requires --min-stall.")
+        stallStage = None
+        if options.stallStage is not None:
+            stallStage = KANATA_CONVERTER_STAGE_NAME_TABLE.index( options.stallStage )
+        if (pcRanges is not None or options.flushedOnly or
+            options.minStall is not None or stages is not None):
+            opFilter = RSD_OpFilter(
+                pcRanges, options.flushedOnly, options.minStall, stallStage, stages
+            )
+    except (ValueError, IOError, RSD_ProgramImageError) as err:
+        print( err )
         exit(1)
 
+    programImage = None
+    if options.program is not None:
+        try:
+            programBase = None
+            if options.programBase is not None:
+                programBase = int( options.programBase, 16 )
+            programImage = RSD_ProgramImage( options.program, programBase, options.symbolFile )
+        except (ValueError, IOError, RSD_ProgramImageError) as err:
+            print( err )
+            exit(1)
+
+    profiler = None
+    if options.profile or options.profileOutput is not None:
+        profiler = KanataConverterProfiler( options.progressInterval )
+
     kanataConverter = KanataConverter()
-    kanataConverter.Main( sys.argv[1], sys.argv[2] )
+    kanataConverter.Main(
+        args[0], args[1], options.jobs, options.fromCycle, options.toCycle, profiler,
+        options.follow, options.followTimeout if options.followTimeout > 0 else None,
+        sampler, options.sampleSegments, opFilter, options.threads, programImage,
+        options.outputProfile
+    )
+
+    if profiler is not None and profiler.IsFinished():
+        profiler.PrintSummary()
+        if options.profileOutput is not None:
+            profiler.Save( options.profileOutput )
@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+
+#
+# Measure the throughput of the tools in this directory with a synthetic
+# RSD log generated by RSD_LogSynthesizer.py.
+#
+# Benchmarks:
+#   parser:       RSD_Parser parses a log with a generator that does nothing.
+#   kanata:       KanataGenerator processes events recorded from a log.
+#   archState:    ArchitectureStateGenerator processes recorded events.
+#   disassembler: RISCV_Disassembler disassembles instruction words without
+#                 a cache.
+#
+# Each benchmark runs in a new process, and reports the best time of
+# repeated runs, lines/sec and events/sec. Peak RSS is measured in another
+# new process that runs a tool once while a log is parsed, so that it does
+# not include events recorded for the kanata and archState benchmarks.
+# Peak RSS is not reported on platforms without the 'resource' module.
+#
+# Results are saved to a JSON file with '--save', and compared with a
+# saved baseline with '--baseline'. When a benchmark is slower than a
+# baseline, or its peak RSS is larger, by more than '--threshold', it is
+# reported as a regression and this script exits with 1.
+#
+# Usage:
+#   python3 KanataConverterBenchmark.py [options]
+#
+
+import os
+import json
+import time
+import shutil
+import tempfile
+import multiprocessing
+from optparse import OptionParser
+
+from RSD_LogSynthesizer import RSD_LogSynthesizer
+from KanataConverterProfiler import GetPeakRSS
+
+#
+# Global constants
+#
+KANATA_CONVERTER_BENCHMARK_NAMES = ["parser", "kanata", "archState", "disassembler"]
+
+# The number of instruction words disassembled in a benchmark.
+KANATA_CONVERTER_BENCHMARK_DISASSEMBLER_WORDS = 200000
+
+
+class NullGenerator(object):
+    """ A generator that counts events. """
+
+    def __init__(self):
+        self.events = 0
+
+    def OnCycle(self, cycle):
+        pass
+
+    def OnEvent(self, event):
+        self.events += 1
+
+
+class RecordingGenerator(object):
+    """ A generator that records cycles and events to replay them. """
+
+    def __init__(self):
+        self.items = []
+
+    def OnCycle(self, cycle):
+        self.items.append(cycle)
+
+    def OnEvent(self, event):
+        self.items.append(event)
+
+
+def CountLines_(fileName):
+    with open(fileName, "rb") as file:
+        return sum(block.count(b"\n") for block in iter(lambda: file.read(1 << 20), b""))
+
+
+def RecordEvents_(logFileName):
+    from RSD_Parser import RSD_Parser
+    parser = RSD_Parser()
+    recorder = RecordingGenerator()
+    parser.Open(logFileName)
+    try:
+        parser.Parse(recorder)
+    finally:
+        parser.Close()
+    return recorder.items
+
+
+def Replay_(generator, items):
+    """ Pass recorded cycles and events to a generator. """
+    onCycle = generator.OnCycle
+    onEvent = generator.OnEvent
+    for item in items:
+        if type(item) is int:
+            onCycle(item)
+        else:
+            onEvent(item)
+
+
+def MeasurePeakRSS_(args):
+    """ Run a generator once while a log is parsed in a worker process, and
+    return the peak RSS of the process.
+    """
+    name, logFileName = args
+
+    import contextlib
+    from RSD_Parser import RSD_Parser
+    from KanataGenerator import KanataGenerator
+    from ArchitectureStateConverter import ArchitectureStateGenerator
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        if name == "kanata":
+            generator = KanataGenerator()
+        else:
+            generator = ArchitectureStateGenerator()
+        parser = RSD_Parser()
+        generator.Open(os.devnull)
+        parser.Open(logFileName)
+        try:
+            parser.Parse(generator)
+        finally:
+            parser.Close()
+            generator.Close()
+    return GetPeakRSS()
+
+
+def RunInNewProcess_(function, args):
+    """ Call a function in a new spawned process and return its result.
+    A spawned process does not inherit memory of this one, so that its
+    peak RSS is measured for the function alone.
+    """
+    pool = multiprocessing.get_context("spawn").Pool(1)
+    try:
+        return pool.apply(function, (args,))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def RunBenchmark_(args):
+    """ Run a benchmark in a worker process and return its result. """
+    name, logFileName, repeat = args
+
+    import contextlib
+    from RSD_Parser import RSD_Parser
+    from KanataGenerator import KanataGenerator
+    from ArchitectureStateConverter import ArchitectureStateGenerator
+    from RISCV_Disassembler import RISCV_Disassembler
+
+    lines = CountLines_(logFileName)
+    events = 0
+    times = []
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        if name == "parser":
+            for i in range(repeat):
+                parser = RSD_Parser()
+                generator = NullGenerator()
+                parser.Open(logFileName)
+                begin = time.perf_counter()
+                parser.Parse(generator)
+                times.append(time.perf_counter() - begin)
+                parser.Close()
+                events = generator.events
+
+        elif name in ("kanata", "archState"):
+            items = RecordEvents_(logFileName)
+            events = sum(1 for item in items if type(item) is not int)
+            for i in range(repeat):
+                if name == "kanata":
+                    generator = KanataGenerator()
+                else:
+                    generator = ArchitectureStateGenerator()
+                generator.Open(os.devnull)
+                begin = time.perf_counter()
+                Replay_(generator, items)
+                generator.Close()
+                times.append(time.perf_counter() - begin)
+
+        elif name == "disassembler":
+            # Words in a synthetic program and pseudo-random words.
+            words = [
+                "%08x" % ((i * 2654435761) & 0xffffffff)
+                for i in range(KANATA_CONVERTER_BENCHMARK_DISASSEMBLER_WORDS // 2)
+            ]
+            program = ["%08x" % code for code, kind in RSD_LogSynthesizer.INSN_TABLE]
+            words += program * (len(words) // len(program))
+            lines = len(words)
+            events = len(words)
+            for i in range(repeat):
+                disassembler = RISCV_Disassembler()
+                begin = time.perf_counter()
+                for word in words:
+                    disassembler.Disassemble(word)
+                times.append(time.perf_counter() - begin)
+
+    best = min(times)
+    return {
+        "seconds": best,
+        "linesPerSec": lines / best,
+        "eventsPerSec": events / best,
+        "peakRSS_KiB": GetPeakRSS(),
+    }
+
+
+class KanataConverterBenchmark(object):
+    """ Run benchmarks and compare them with a baseline. """
+
+    def __init__(self, cycles=20000, width=2, seed=1, repeat=3, flushRate=0.15, stallRate=0.05):
+        self.params_ = {
+            "cycles": cycles, "width": width, "seed": seed,
+            "flushRate": flushRate, "stallRate": stallRate,
+        }
+        self.repeat_ = repeat
+
+    def Main(self, names, saveFileName, baselineFileName, threshold):
+        """ The entry point of this class. Returns False on a regression. """
+        workDir = tempfile.mkdtemp()
+        try:
+            logFileName = os.path.join(workDir, "RSD.log")
+            synthesizer = RSD_LogSynthesizer(
+                seed=self.params_["seed"], width=self.params_["width"],
+                cycles=self.params_["cycles"], flushRate=self.params_["flushRate"],
+                stallRate=self.params_["stallRate"]
+            )
+            with open(logFileName, "w") as out:
+                synthesizer.Generate(out)
+
+            results = {}
+            for name in names:
+                results[name] = RunInNewProcess_(
+                    RunBenchmark_, (name, logFileName, self.repeat_)
+                )
+                if name in ("kanata", "archState"):
+                    # Events recorded for a benchmark are not counted.
+                    results[name]["peakRSS_KiB"] = RunInNewProcess_(
+                        MeasurePeakRSS_, (name, logFileName)
+                    )
+        finally:
+            shutil.rmtree(workDir)
+
+        report = {"params": self.params_, "results": results}
+        self.Print_(results)
+
+        if saveFileName is not None:
+            with open(saveFileName, "w") as file:
+                json.dump(report, file, indent=2, sort_keys=True)
+                file.write("\n")
+
+        if baselineFileName is not None:
+            with open(baselineFileName, "r") as file:
+                baseline = json.load(file)
+            return self.Compare_(report, baseline, threshold)
+        return True
+
+    def Print_(self, results):
+        print("%-14s %10s %14s %14s %12s" % ("benchmark", "seconds", "lines/sec", "events/sec", "peak RSS"))
+        for name, r in results.items():
+            rss = "-" if r["peakRSS_KiB"] is None else "%d KiB" % r["peakRSS_KiB"]
+            print(
+                "%-14s %10.3f %14.0f %14.0f %12s" %
+                (name, r["seconds"], r["linesPerSec"], r["eventsPerSec"], rss)
+            )
+
+    def Compare_(self, report, baseline, threshold):
+        """ Print ratios to a baseline and return False on a regression. """
+        if report["params"] != baseline["params"]:
+            print("Parameters differ from the baseline: %s" % baseline["params"])
+
+        passed = True
+        print("")
+        print("%-14s %10s %10s" % ("benchmark", "speed", "peak RSS"))
+        for name, r in report["results"].items():
+            base = baseline["results"].get(name)
+            if base is None:
+                continue
+            speed = base["seconds"] / r["seconds"]
+            rss = "-"
+            if r["peakRSS_KiB"] is not None and base["peakRSS_KiB"]:
+                rss = "%.2fx" % (float(r["peakRSS_KiB"]) / base["peakRSS_KiB"])
+            regression = speed < 1.0 / (1.0 + threshold)
+            if r["peakRSS_KiB"] is not None and base["peakRSS_KiB"]:
+                regression = regression or (
+                    r["peakRSS_KiB"] > base["peakRSS_KiB"] * (1.0 + threshold)
+                )
+            print(
+                "%-14s %9.2fx %10s%s" %
+                (name, speed, rss, "  REGRESSION" if regression else "")
+            )
+            passed = passed and not regression
+        return passed
+
+
+#
+# The entry point of this program.
+#
+if __name__ == '__main__':
+    optionParser = OptionParser( usage="%prog [options]" )
+    optionParser.add_option('-c', '--cycles',
+                  action='store', type='int', dest='cycles', default=20000,
+                  help="The number of cycles in a synthetic log.")
+    optionParser.add_option('-w', '--width',
+                  action='store', type='int', dest='width', default=2,
+                  help="The pipeline width of a synthetic log.")
+    optionParser.add_option('-f', '--flush-rate',
+                  action='store', type='float', dest='flushRate', default=0.15,
+                  help="The probability that a branch is mispredicted in a synthetic log.")
+    optionParser.add_option('-s', '--stall-rate',
+                  action='store', type='float', dest='stallRate', default=0.05,
+                  help="The probability that the front-end begins stalling in a cycle of a synthetic log.")
+    optionParser.add_option('--seed',
+                  action='store', type='int', dest='seed', default=1,
+                  help="A seed of a synthetic log.")
+    optionParser.add_option('-r', '--repeat',
+                  action='store', type='int', dest='repeat', default=3,
+                  help="Report the best time of the specified number of runs.")
+    optionParser.add_option('-b', '--benchmark',
+                  action='append', type='choice', dest='names',
+                  choices=KANATA_CONVERTER_BENCHMARK_NAMES, default=None,
+                  help="Run only the specified benchmark: %s" %
+                       ", ".join(KANATA_CONVERTER_BENCHMARK_NAMES))
+    optionParser.add_option('--save',
+                  action='store', type='string', dest='save', default=None,
+                  help="Save results to the specified JSON file.")
+    optionParser.add_option('--baseline',
+                  action='store', type='string', dest='baseline', default=None,
+                  help="Compare results with a baseline saved with --save.")
+    optionParser.add_option('--threshold',
+                  action='store', type='float', dest='threshold', default=0.1,
+                  help="A slowdown reported as a regression (0.1 = 10%).")
+    options, args = optionParser.parse_args()
+
+    benchmark = KanataConverterBenchmark(
+        options.cycles, options.width, options.seed, options.repeat,
+        options.flushRate, options.stallRate
+    )
+    passed = benchmark.Main(
+        options.names or KANATA_CONVERTER_BENCHMARK_NAMES,
+        options.save, options.baseline, options.threshold
+    )
+    exit(0 if passed else 1)
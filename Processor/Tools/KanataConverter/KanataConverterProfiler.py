@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+
+#
+# Profile a conversion by RSD_Parser and KanataGenerator.
+#
+# KanataConverterProfiler replaces methods of a parser and a generator with
+# wrappers that measure them, so that nothing is
+# measured when profiling is not enabled. Time spent in a method is
+# counted to one of the following phases, excluding time spent in the
+# other measured methods called from it:
+#
+#   read:        Reading blocks and splitting them into lines.
+#                RSD_Parser.ProcessBlocks_
+#   tokenize:    Tokenizing lines and tracking ops.
+#                RSD_Parser.ProcessLines_
+#   gid:         Creating gids. RSD_Parser.CreateGID_
+#   event:       Creating events and queuing them by cycle.
+#                RSD_Parser.AddEvent_
+#   sort:        Taking events in order of cycles. RSD_Parser.ProcessEvents_
+#   disassemble: Disassembling labels or looking them up in a program image.
+#                RSD_Parser.FormatLabel_
+#   generate:    Formatting Kanata commands.
+#                KanataGenerator.OnCycle and OnEvent
+#   write:       Writing formatted commands. KanataGenerator.Flush_
+#
+# Wrappers add their own cost to each call. It is estimated from call
+# counts and reported as 'profilerOverheadSec'.
+#
+# Progress is reported every 'interval' seconds with the number of bytes
+# read, a current cycle, lines/sec, the numbers of live entries in
+# RSD_Parser.ops_, events in RSD_Parser.events_, live entries in
+# KanataGenerator.opMap_, and peak RSS of this process.
+# Peak RSS is not reported on platforms without the 'resource' module.
+#
+# A summary is saved as JSON by Save().
+#
+
+import os
+import sys
+import json
+import time
+
+#
+# Global constants
+#
+
+# Phases in order of output.
+KANATA_CONVERTER_PROFILER_PHASES = [
+    "read", "tokenize", "gid", "event", "sort", "disassemble", "generate", "write"
+]
+
+# The default interval of progress reports in seconds.
+KANATA_CONVERTER_PROFILER_DEFAULT_INTERVAL = 10.0
+
+# Lines in a block are passed to RSD_Parser.ProcessLines_ in chunks of
+# this number of lines, so that the number of processed lines is updated
+# while a block is processed.
+KANATA_CONVERTER_PROFILER_CHUNK_LINES = 16 * 1024
+
+# Table sizes are sampled every this number of cycles to record their peaks.
+KANATA_CONVERTER_PROFILER_SAMPLE_CYCLES = 1024
+
+
+def GetPeakRSS():
+    """ Return peak RSS of this process in KiB, or None. """
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        rss //= 1024    # bytes on macOS
+    return rss
+
+
+class KanataConverterProfiler(object):
+    """ Measure phases of a conversion and report its progress. """
+
+    class Phase(object):
+        __slots__ = ("seconds", "calls")
+
+        def __init__(self):
+            self.seconds = 0.0
+            self.calls = 0
+
+    def __init__(self, interval=KANATA_CONVERTER_PROFILER_DEFAULT_INTERVAL):
+        self.interval_ = interval
+        self.phases_ = dict(
+            (name, KanataConverterProfiler.Phase()) for name in KANATA_CONVERTER_PROFILER_PHASES
+        )
+
+        # Time spent in measured methods called from a running method is
+        # accumulated at the top of this stack.
+        self.childTimes_ = []
+
+        self.parser_ = None
+        self.generator_ = None
+        self.inputSize_ = None
+
+        self.beginTime_ = None
+        self.endTime_ = None
+        self.bytesRead_ = None
+        self.nextReportTime_ = None
+        self.cycle_ = None
+        self.cycles_ = 0
+        self.peakTables_ = {"ops": 0, "events": 0, "opMap": 0}
+        self.callOverhead_ = self.Calibrate_()
+
+    #
+    # Instrumentation
+    #
+
+    def Instrument(self, parser, generator):
+        """ Wrap methods of a parser and a generator before parsing. """
+        self.parser_ = parser
+        self.generator_ = generator
+        try:
+            self.inputSize_ = os.fstat(parser.inputFile_.fileno()).st_size
+        except (AttributeError, OSError, ValueError):
+            self.inputSize_ = None
+
+        self.Wrap_(parser, "ProcessBlocks_", "read")
+        self.Wrap_(parser, "ProcessLines_", "tokenize")
+        self.Wrap_(parser, "CreateGID_", "gid")
+        self.Wrap_(parser, "AddEvent_", "event")
+        self.Wrap_(parser, "ProcessEvents_", "sort")
+        self.Wrap_(parser, "FormatLabel_", "disassemble")
+        self.Wrap_(generator, "OnCycle", "generate")
+        self.Wrap_(generator, "OnEvent", "generate")
+        self.Wrap_(generator, "Flush_", "write")
+
+        processLines = parser.ProcessLines_
+        def ProcessLines(lines):
+            n = KANATA_CONVERTER_PROFILER_CHUNK_LINES
+            for i in range(0, len(lines), n):
+                processLines(lines[i:i + n])
+        parser.ProcessLines_ = ProcessLines
+
+        # Progress is checked on each cycle.
+        onCycle = generator.OnCycle
+        def OnCycle(cycle):
+            onCycle(cycle)
+            self.OnCycle_(cycle)
+        generator.OnCycle = OnCycle
+
+    def Wrap_(self, obj, methodName, phaseName):
+        """ Replace a method of 'obj' with a wrapper that measures it. """
+        method = getattr(obj, methodName)
+        phase = self.phases_[phaseName]
+        childTimes = self.childTimes_
+        clock = time.perf_counter
+
+        def Wrapper(*args, **kwargs):
+            childTimes.append(0.0)
+            begin = clock()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = clock() - begin
+                phase.seconds += elapsed - childTimes.pop()
+                phase.calls += 1
+                if childTimes:
+                    childTimes[-1] += elapsed
+
+        setattr(obj, methodName, Wrapper)
+
+    def Calibrate_(self, n=100000):
+        """ Estimate the cost that a wrapper adds to a call. """
+        class Target(object):
+            def Method(self):
+                pass
+        target = Target()
+        phases = self.phases_
+        self.phases_ = {"calibration": KanataConverterProfiler.Phase()}
+        try:
+            method = target.Method
+            begin = time.perf_counter()
+            for i in range(n):
+                method()
+            direct = time.perf_counter() - begin
+
+            self.Wrap_(target, "Method", "calibration")
+            method = target.Method
+            begin = time.perf_counter()
+            for i in range(n):
+                method()
+            wrapped = time.perf_counter() - begin
+        finally:
+            self.phases_ = phases
+        return max(0.0, (wrapped - direct) / n)
+
+    #
+    # Measurement
+    #
+
+    def Begin(self):
+        self.beginTime_ = time.perf_counter()
+        self.nextReportTime_ = self.beginTime_ + self.interval_
+
+    def End(self):
+        """ Finish measurement. This does nothing if Begin is not called. """
+        if self.beginTime_ is not None and self.endTime_ is None:
+            self.endTime_ = time.perf_counter()
+            self.bytesRead_ = self.GetBytesRead_()
+            self.SampleTables_()
+
+    def IsFinished(self):
+        return self.endTime_ is not None
+
+    def OnCycle_(self, cycle):
+        if self.cycle_ is None or cycle > self.cycle_:
+            self.cycle_ = cycle
+            self.cycles_ += 1   # Cycles with events
+            if self.cycles_ % KANATA_CONVERTER_PROFILER_SAMPLE_CYCLES == 0:
+                self.SampleTables_()
+                if time.perf_counter() >= self.nextReportTime_:
+                    self.ReportProgress_()
+                    self.nextReportTime_ = time.perf_counter() + self.interval_
+
+    def GetTableSizes_(self):
+        parser = self.parser_
+        return {
+            "ops": sum(1 for op in parser.ops_ if op is not None),
+            "events": sum(len(events) for events in parser.events_.values()),
+            "opMap": sum(1 for op in self.generator_.opMap_ if op is not None),
+        }
+
+    def SampleTables_(self):
+        peaks = self.peakTables_
+        for name, size in self.GetTableSizes_().items():
+            if size > peaks[name]:
+                peaks[name] = size
+
+    def GetBytesRead_(self):
+        """ Return the number of bytes read from an input file, or None if
+        it is unknown, such as in a compressed stream.
+        """
+        try:
+            return self.parser_.inputFile_.buffer.tell()
+        except (AttributeError, OSError, ValueError):
+            return None
+
+    def ReportProgress_(self):
+        elapsed = time.perf_counter() - self.beginTime_
+        bytesRead = self.GetBytesRead_()
+        if bytesRead is None:
+            bytesStr = "-"
+        elif self.inputSize_:
+            bytesStr = "%d (%.1f%%)" % (bytesRead, 100.0 * bytesRead / self.inputSize_)
+        else:
+            bytesStr = "%d" % bytesRead
+        tables = self.GetTableSizes_()
+        rss = GetPeakRSS()
+        print(
+            "[%.0fs] bytes: %s, cycle: %d, cycles/sec: %.0f, lines/sec: %.0f, "
+            "ops: %d, events: %d, opMap: %d, peak RSS: %s" % (
+                elapsed, bytesStr, self.cycle_, self.cycle_ / elapsed,
+                self.parser_.lineNum_ / elapsed,
+                tables["ops"], tables["events"], tables["opMap"],
+                "-" if rss is None else "%d KiB" % rss
+            )
+        )
+
+    #
+    # Summary
+    #
+
+    def GetSummary(self):
+        """ Return a summary as a dictionary. """
+        wall = self.endTime_ - self.beginTime_
+        phases = dict(
+            (name, {"seconds": phase.seconds, "calls": phase.calls})
+            for name, phase in self.phases_.items()
+        )
+        measured = sum(phase.seconds for phase in self.phases_.values())
+        calls = sum(phase.calls for phase in self.phases_.values())
+        lines = self.parser_.lineNum_
+        return {
+            "wallSec": wall,
+            "phases": phases,
+            "otherSec": max(0.0, wall - measured),
+            "profilerOverheadSec": self.callOverhead_ * calls,
+            "bytes": self.bytesRead_,
+            "inputSize": self.inputSize_,
+            "lines": lines,
+            "linesPerSec": lines / wall if wall > 0 else None,
+            "cycle": self.cycle_,
+            "cyclesPerSec": self.cycle_ / wall if wall > 0 and self.cycle_ else None,
+            "committedOps": self.parser_.committedOpNum_,
+            "peakTables": dict(self.peakTables_),
+            "peakRSS_KiB": GetPeakRSS(),
+        }
+
+    def PrintSummary(self):
+        summary = self.GetSummary()
+        wall = summary["wallSec"]
+        print("%-12s %10s %7s %12s" % ("phase", "seconds", "%", "calls"))
+        for name in KANATA_CONVERTER_PROFILER_PHASES:
+            phase = summary["phases"][name]
+            print(
+                "%-12s %10.3f %6.1f%% %12d" %
+                (name, phase["seconds"], 100.0 * phase["seconds"] / wall, phase["calls"])
+            )
+        print("%-12s %10.3f %6.1f%%" % ("other", summary["otherSec"], 100.0 * summary["otherSec"] / wall))
+        print("%-12s %10.3f" % ("total", wall))
+        print(
+            "Wrappers are estimated to add %.3f seconds to the phases." %
+            summary["profilerOverheadSec"]
+        )
+        rss = summary["peakRSS_KiB"]
+        print(
+            "lines: %d, cycles: %d, lines/sec: %.0f, peak ops: %d, "
+            "peak events: %d, peak opMap: %d, peak RSS: %s" % (
+                summary["lines"], summary["cycle"] or 0, summary["linesPerSec"] or 0,
+                summary["peakTables"]["ops"], summary["peakTables"]["events"],
+                summary["peakTables"]["opMap"], "-" if rss is None else "%d KiB" % rss
+            )
+        )
+
+    def Save(self, fileName):
+        """ Save a summary as JSON. """
+        with open(fileName, "w") as file:
+            json.dump(self.GetSummary(), file, indent=2, sort_keys=True)
+            file.write("\n")
@@ -18,11 +18,23 @@
 #   rid: An unique id for each 'retired' micro op in a Kanata log.
 #        This id is generated from gid when output.
 #
+# An output profile selects commands to output:
+#   full:    All commands. A stage comment is output as both a detail label
+#            and a stage label, and each op has a detail label with its gid.
+#   compact: A stage comment is output only as a stage label, and an op has
+#            no gid label.
+#   minimal: Only ops, stages and retirement/flush. Labels, comments and
+#            stalls are not output.
+# Handlers of events that are not output are replaced when a generator is
+# constructed, so nothing is formatted for them.
+#
 
 import sys
+import time
 import pprint
 
 from RSD_Event import RSD_Event
+from CompressedStream import OpenOutputStream
 
 #
 # Global constants
@@ -32,6 +44,15 @@ KANATA_CONVERTER_STAGE_NAME_TABLE = [
 ]
 KANATA_CONVERTER_INITIAL_CYCLE = -1
 KANATA_CONVERTER_RETIREMENT_STAGE_ID = 14   # See constants in RSD_Parser.py
+KANATA_CONVERTER_GID_WRAP_AROUND = 2 ** 10 * 4  # See GID_WRAP_AROUND in RSD_Parser.py
+
+# Output profiles
+KANATA_GENERATOR_PROFILE_FULL = "full"
+KANATA_GENERATOR_PROFILE_COMPACT = "compact"
+KANATA_GENERATOR_PROFILE_MINIMAL = "minimal"
+KANATA_GENERATOR_PROFILES = [
+    KANATA_GENERATOR_PROFILE_FULL, KANATA_GENERATOR_PROFILE_COMPACT, KANATA_GENERATOR_PROFILE_MINIMAL
+]
 
 
 
@@ -72,17 +93,74 @@ class KanataGenerator(object):
 
     KNT_CMD_ARG_STALL = "stl"
 
+    # Output lines are buffered and written when the number of them
+    # exceeds this value.
+    KNT_BUFFER_LINES = 64 * 1024
+
+    # Templates of output lines. Constant arguments are embedded in them.
+    KNT_TEMPLATE_CYCLE = "%s\t%%d\n" % KNT_CMD_CYCLE
+    KNT_TEMPLATE_INIT = (
+        "%s\t%%d\t%%d\t%s\n" % (KNT_CMD_INIT, KNT_THREAD_ID) +
+        "%s\t%%d\t%s\t(g:%%d,c0)\\n\n" % (KNT_CMD_LABEL, KNT_CMD_ARG_LABEL_TYPE_DETAIL)
+    )
+    KNT_TEMPLATE_INIT_WITHOUT_GID = "%s\t%%d\t%%d\t%s\n" % (KNT_CMD_INIT, KNT_THREAD_ID)
+    KNT_TEMPLATE_STALL_BEGIN = "%s\t%%d\t%s\t%s\n" % (
+        KNT_CMD_STAGE_BEGIN, KNT_LANE_STALL, KNT_CMD_ARG_STALL
+    )
+    KNT_TEMPLATE_STALL_END = "%s\t%%d\t%s\t%s\n" % (
+        KNT_CMD_STAGE_END, KNT_LANE_STALL, KNT_CMD_ARG_STALL
+    )
+    KNT_TEMPLATE_RETIRE = "%s\t%%d\t%%d\t%s\n" % (KNT_CMD_RETIRE, KNT_CMD_ARG_RETIRE)
+    KNT_TEMPLATE_FLUSH = "%s\t%%d\t0\t%s\n" % (KNT_CMD_RETIRE, KNT_CMD_ARG_FLUSH)
+    KNT_TEMPLATE_COMMENT = (
+        "%s\t%%d\t%s\t%%s\n" % (KNT_CMD_LABEL, KNT_CMD_ARG_LABEL_TYPE_DETAIL) +
+        "%s\t%%d\t%s\t%%s\n" % (KNT_CMD_LABEL, KNT_CMD_ARG_LABEL_TYPE_STAGE)
+    )
+    KNT_TEMPLATE_STAGE_COMMENT = "%s\t%%d\t%s\t%%s\n" % (
+        KNT_CMD_LABEL, KNT_CMD_ARG_LABEL_TYPE_STAGE
+    )
+    KNT_TEMPLATE_LABEL = "%s\t%%d\t%s\t%%s\n" % (
+        KNT_CMD_LABEL, KNT_CMD_ARG_LABEL_TYPE_ABSTRACT
+    )
+
     class Op(object):
         """ It has information about an op. """
-        def __init__(self, sid):
+        __slots__ = ("gid", "sid")
+
+        def __init__(self, gid, sid):
+            self.gid = gid
             self.sid = sid
 
 
-    def __init__(self):
+    def __init__(self, profile=KANATA_GENERATOR_PROFILE_FULL):
+        if profile not in KANATA_GENERATOR_PROFILES:
+            raise ValueError("An unknown output profile: %s" % profile)
+        self.profile_ = profile
+        # Whether to output gid labels, detail/stage labels of comments,
+        # labels and stalls. See the output profiles in the header.
+        self.gidLabels_ = profile == KANATA_GENERATOR_PROFILE_FULL
+        self.detailComments_ = profile == KANATA_GENERATOR_PROFILE_FULL
+        self.stageComments_ = profile != KANATA_GENERATOR_PROFILE_MINIMAL
+        self.labels_ = profile != KANATA_GENERATOR_PROFILE_MINIMAL
+        self.stalls_ = profile != KANATA_GENERATOR_PROFILE_MINIMAL
+
         self.outputFileName_ = ""
         self.outputFile_ = None
 
-        self.opMap_ = {}    # gid -> op information
+        # Output lines not yet written to an output file.
+        self.buffer_ = []
+
+        # Buffered lines are also written every this number of seconds when
+        # it is not None. See SetFlushInterval.
+        self.flushInterval_ = None
+        self.nextFlushTime_ = None
+
+        # gid -> op information.
+        # Ops are stored in a window indexed by gid % GID_WRAP_AROUND.
+        self.opMap_ = [None] * KANATA_CONVERTER_GID_WRAP_AROUND
+        # Ops older than this gid are disposed.
+        # See opsWatermark_ in RSD_Parser.py
+        self.opMapWatermark_ = -KANATA_CONVERTER_GID_WRAP_AROUND
 
         self.nextSID_ = 0
         self.lastGID_ = 0
@@ -90,20 +168,65 @@ class KanataGenerator(object):
 
         self.currentCycle_ = KANATA_CONVERTER_INITIAL_CYCLE
 
+        # Templates of stage begin/end indexed by a stage id.
+        self.stageBeginTemplates_ = [
+            "%s\t%%d\t%s\t%s\n" % (self.KNT_CMD_STAGE_BEGIN, self.KNT_LANE_DEFAULT, name)
+            for name in KANATA_CONVERTER_STAGE_NAME_TABLE
+        ]
+        self.stageEndTemplates_ = [
+            "%s\t%%d\t%s\t%s\n" % (self.KNT_CMD_STAGE_END, self.KNT_LANE_DEFAULT, name)
+            for name in KANATA_CONVERTER_STAGE_NAME_TABLE
+        ]
+
+        # Event handlers indexed by an event type.
+        handlers = {
+            RSD_Event.INIT: self.OnKNT_Initialize_,
+            RSD_Event.STAGE_BEGIN: self.OnKNT_StageBegin_,
+            RSD_Event.STAGE_END: self.OnKNT_StageEnd_,
+            RSD_Event.STALL_BEGIN: self.OnKNT_StallBegin_,
+            RSD_Event.STALL_END: self.OnKNT_StallEnd_,
+            RSD_Event.RETIRE: self.OnKNT_Retire_,
+            RSD_Event.FLUSH: self.OnKNT_Flush_,
+            RSD_Event.LABEL: self.OnKNT_Label_,
+        }
+        if not self.labels_:
+            handlers[RSD_Event.LABEL] = self.OnKNT_Ignore_
+        if not self.stalls_:
+            handlers[RSD_Event.STALL_BEGIN] = self.OnKNT_Ignore_
+            handlers[RSD_Event.STALL_END] = self.OnKNT_Ignore_
+        self.eventHandlers_ = [handlers[type] for type in range(len(handlers))]
+
     #
     # File open/close
     #
-    def Open(self, fileName):
+    def Open(self, fileName, outputHeader=True):
         self.outputFileName_ = fileName
-        self.outputFile_ = open(self.outputFileName_, "w")
-        self.OutputHeader_()
+        self.outputFile_ = OpenOutputStream(self.outputFileName_)
+        if outputHeader:
+            self.OutputHeader_()
 
     def Close(self):
         if self.outputFile_ is not None :
+            self.Flush_()
             self.outputFile_.close()
 
+    def SetFlushInterval(self, seconds):
+        """ Write buffered lines every 'seconds' seconds, so that an output
+        file grows while a log is converted from a pipe or a followed file.
+        """
+        self.flushInterval_ = seconds
+        self.nextFlushTime_ = time.time() + seconds
+
     def Write_(self, str):
-        self.outputFile_.write(str)
+        self.buffer_.append(str)
+
+    def Flush_(self):
+        """ Write buffered lines to an output file as a block. """
+        self.outputFile_.write("".join(self.buffer_))
+        del self.buffer_[:]
+        if self.flushInterval_ is not None:
+            self.outputFile_.flush()
+            self.nextFlushTime_ = time.time() + self.flushInterval_
 
 
     def OutputHeader_(self):
@@ -111,187 +234,182 @@ class KanataGenerator(object):
         self.Write_(self.KNT_HEADER)
         self.Write_("C=\t%s\n" % KANATA_CONVERTER_INITIAL_CYCLE)
 
-    def OutputEvent_(self, event):
-        """ Output an event to an output file.
-        This method dispatches an event to a corresponding handler.
-        """
-        type = event.type
-        if(type == RSD_Event.INIT):
-            self.OnKNT_Initialize_(event)
-        elif(type == RSD_Event.STAGE_BEGIN):
-            self.OnKNT_StageBegin_(event)
-        elif(type == RSD_Event.STAGE_END):
-            self.OnKNT_StageEnd_(event)
-        elif(type == RSD_Event.STALL_BEGIN):
-            self.OnKNT_StallBegin_(event)
-        elif(type == RSD_Event.STALL_END):
-            self.OnKNT_StallEnd_(event)
-        elif(type == RSD_Event.RETIRE):
-            self.OnKNT_Retire_(event)
-        elif(type == RSD_Event.FLUSH):
-            self.OnKNT_Flush_(event)
-        elif(type == RSD_Event.LABEL):
-            self.OnKNT_Label_(event)
-
 
     def OnCycle(self, cycle):
         """ This method is called from RSD_Parser """
         # Write a cycle-update command.
         if cycle > self.currentCycle_:
-            self.Write_("%s\t%s\n" % (self.KNT_CMD_CYCLE, cycle - self.currentCycle_))
+            self.buffer_.append(self.KNT_TEMPLATE_CYCLE % (cycle - self.currentCycle_))
+            if len(self.buffer_) >= self.KNT_BUFFER_LINES:
+                self.Flush_()
+            elif self.flushInterval_ is not None and time.time() >= self.nextFlushTime_:
+                self.Flush_()
         self.currentCycle_ = cycle
 
     def OnEvent(self, event):
         """ This method is called from RSD_Parser """
-        if event.gid in self.opMap_ or event.type == RSD_Event.INIT:
-            self.OutputEvent_(event)
+        gid = event.gid
+        op = self.opMap_[gid % KANATA_CONVERTER_GID_WRAP_AROUND]
+        if op is not None and op.gid == gid:
+            # Dispatch an event to a corresponding handler.
+            self.eventHandlers_[event.type](event, op)
+        elif event.type == RSD_Event.INIT:
+            self.OnKNT_Initialize_(event, None)
         else:
-            print("Unknown gid:%d is in an event" % event.gid)
+            print("Unknown gid:%d is in an event" % gid)
 
 
     def GetStageName_(self, id):
         return KANATA_CONVERTER_STAGE_NAME_TABLE[id]
 
     def GetSID_(self, gid):
-        return self.opMap_[gid].sid
-
+        return self.opMap_[gid % KANATA_CONVERTER_GID_WRAP_AROUND].sid
+
+    def GetOp_(self, gid):
+        """ Return op information of 'gid', or None. """
+        op = self.opMap_[gid % KANATA_CONVERTER_GID_WRAP_AROUND]
+        if op is not None and op.gid == gid:
+            return op
+        return None
+
+    def DisposeOps_(self, gid):
+        """ Delete op information older than 'gid'.
+        Each slot is swept once while the watermark passes over it.
+        """
+        W = KANATA_CONVERTER_GID_WRAP_AROUND
+        opMap = self.opMap_
+        for g in range(max(self.opMapWatermark_, gid - W), gid):
+            op = opMap[g % W]
+            if op is not None and op.gid < gid:
+                opMap[g % W] = None
+        self.opMapWatermark_ = max(self.opMapWatermark_, gid)
+
+
+    def OutputsLabels(self):
+        """ Return whether labels are output. When it is False, a parser
+        need not generate label events. See RSD_Parser.SetLabelOutput
+        """
+        return self.labels_
+
+    def FormatInit_(self, sid, gid):
+        """ Return commands to initialize an op. """
+        if self.gidLabels_:
+            return self.KNT_TEMPLATE_INIT % (sid, gid, sid, gid)
+        return self.KNT_TEMPLATE_INIT_WITHOUT_GID % (sid, gid)
+
+    def FormatComment_(self, sid, comment):
+        """ Return label commands of a stage comment. """
+        if self.detailComments_:
+            return self.KNT_TEMPLATE_COMMENT % (sid, comment, sid, comment)
+        if self.stageComments_:
+            return self.KNT_TEMPLATE_STAGE_COMMENT % (sid, comment)
+        return ""
 
     def AddNewGID_(self, gid):
         """ Register a specified gid and generates a new sid """
-        if gid in self.opMap_:
+        if self.GetOp_(gid) is not None:
             print("gid:%d is re-defined." % (gid))
         else:
-            genOp = KanataGenerator.Op(self.nextSID_)
-            self.opMap_[gid] = genOp
+            genOp = KanataGenerator.Op(gid, self.nextSID_)
+            self.opMap_[gid % KANATA_CONVERTER_GID_WRAP_AROUND] = genOp
             self.nextSID_ += 1
 
         if self.lastGID_ > gid:
             print("lastGID:%d is greater than added gid:%d in AddNewGID" % (self.lastGID_, gid))
         self.lastGID_ = gid 
 
+    #
+    # Event handlers
+    # 'op' is op information of an event. It is None when INIT adds a new op.
+    #
 
-    def OnKNT_Initialize_(self, event):
+    def OnKNT_Initialize_(self, event, op):
         """ Output an initializing event. """
         gid = event.gid
         self.AddNewGID_(gid) # sid is created in this method
         sid = self.GetSID_(gid)
+        self.buffer_.append(self.FormatInit_(sid, gid))
 
-        self.Write_(
-            "%s\t%s\t%s\t%s\n" %
-            (self.KNT_CMD_INIT, sid, gid, self.KNT_THREAD_ID)
-        )
-        self.Write_(
-            "%s\t%s\t%s\t%s\\n\n" % (
-                self.KNT_CMD_LABEL,
-                sid,
-                self.KNT_CMD_ARG_LABEL_TYPE_DETAIL,
-                "(g:%d,c0)" % (gid)
-            )
-        )
-
-    def OnKNT_StageBegin_(self, event):
+    def OnKNT_StageBegin_(self, event, op):
         """ Output a stage begin event. """
-        self.Write_(
-            "%s\t%s\t%s\t%s\n" % (
-                self.KNT_CMD_STAGE_BEGIN,
-                self.GetSID_(event.gid),
-                self.KNT_LANE_DEFAULT,
-                self.GetStageName_(event.stageID )
+        comment = event.comment
+        if comment == "" or not self.stageComments_:
+            self.buffer_.append(self.stageBeginTemplates_[event.stageID] % op.sid)
+        else:
+            # A comment is output with label commands. See FormatComment_.
+            self.buffer_.append(
+                self.stageBeginTemplates_[event.stageID] % op.sid +
+                self.FormatComment_(op.sid, comment)
             )
-        )
-        if event.comment != "":
-            self.OnKNT_Comment(event )
 
-    def OnKNT_StageEnd_(self, event):
+    def OnKNT_StageEnd_(self, event, op):
         """ Output a stage end event. """
-        self.Write_(
-            "%s\t%s\t%s\t%s\n" % (
-                self.KNT_CMD_STAGE_END,
-                self.GetSID_(event.gid),
-                self.KNT_LANE_DEFAULT,
-                self.GetStageName_(event.stageID )
-            )
-        )
+        self.buffer_.append(self.stageEndTemplates_[event.stageID] % op.sid)
 
-    def OnKNT_StallBegin_(self, event):
+    def OnKNT_StallBegin_(self, event, op):
         """ Output a stall begin event. """
-        self.Write_(
-            "%s\t%s\t%s\t%s\n" % (
-                self.KNT_CMD_STAGE_BEGIN,
-                self.GetSID_(event.gid),
-                self.KNT_LANE_STALL,
-                self.KNT_CMD_ARG_STALL
-            )
-        )
+        self.buffer_.append(self.KNT_TEMPLATE_STALL_BEGIN % op.sid)
 
-    def OnKNT_StallEnd_(self, event):
+    def OnKNT_StallEnd_(self, event, op):
         """ Output a stall end event. """
-        self.Write_(
-            "%s\t%s\t%s\t%s\n" % (
-                self.KNT_CMD_STAGE_END,
-                self.GetSID_(event.gid),
-                self.KNT_LANE_STALL,
-                self.KNT_CMD_ARG_STALL
-            )
-        )
+        self.buffer_.append(self.KNT_TEMPLATE_STALL_END % op.sid)
 
-    def OnKNT_Retire_(self, event):
+    def OnKNT_Retire_(self, event, op):
         """ Output a retirement event. """
-        self.Write_(
-            "%s\t%s\t%s\t%s\n" % (
-                self.KNT_CMD_RETIRE,
-                self.GetSID_(event.gid),
-                self.nextRID_,
-                self.KNT_CMD_ARG_RETIRE
-            )
-        )
-
+        self.buffer_.append(self.KNT_TEMPLATE_RETIRE % (op.sid, self.nextRID_))
         self.nextRID_ += 1
-        del self.opMap_[event.gid]
-        
+
         # GC
-        if event.gid % 64 == 0:
-            for gid in list(self.opMap_.keys()):
-                if gid < event.gid:
-                    del self.opMap_[gid]
+        # Delete a retired op and ops older than it.
+        self.DisposeOps_(event.gid + 1)
 
-    def OnKNT_Flush_(self, event):
+    def OnKNT_Flush_(self, event, op):
         """ Output a flush event. """
-        self.Write_(
-            "%s\t%s\t%s\t%s\n" % (
-                self.KNT_CMD_RETIRE,
-                self.GetSID_(event.gid),
-                0,
-                self.KNT_CMD_ARG_FLUSH
-            )
-        )
-
-    def OnKNT_Comment(self, event):
-        """ Output a comment event using a label command. """
-        self.Write_(
-            "%s\t%s\t%s\t%s\n" % (
-                self.KNT_CMD_LABEL,
-                self.GetSID_(event.gid),
-                self.KNT_CMD_ARG_LABEL_TYPE_DETAIL,
-                event.comment
-            )
-        )
-        self.Write_(
-            "%s\t%s\t%s\t%s\n" % (
-                self.KNT_CMD_LABEL,
-                self.GetSID_(event.gid),
-                self.KNT_CMD_ARG_LABEL_TYPE_STAGE,
-                event.comment
-            )
-        )
+        self.buffer_.append(self.KNT_TEMPLATE_FLUSH % op.sid)
 
-    def OnKNT_Label_(self, event):
+    def OnKNT_Label_(self, event, op):
         """ Output a label event using a label command. """
-        self.Write_(
-            "%s\t%s\t%s\t%s\n" % (
-                self.KNT_CMD_LABEL,
-                self.GetSID_(event.gid),
-                self.KNT_CMD_ARG_LABEL_TYPE_ABSTRACT,
-                event.comment
-            )
-        )
+        self.buffer_.append(self.KNT_TEMPLATE_LABEL % (op.sid, event.comment))
+
+    def OnKNT_Ignore_(self, event, op):
+        """ Ignore an event not output in a profile. """
+        pass
+
+    #
+    # Generator state
+    # See SaveState in RSD_Parser.py
+    #
+    def SaveState(self):
+        """ Return a picklable snapshot of a generator state. """
+        return {
+            "cycle": self.currentCycle_,
+            "ops": sorted((op.gid, op.sid) for op in self.opMap_ if op is not None),
+            "opMapWatermark": self.opMapWatermark_,
+            "nextSID": self.nextSID_,
+            "lastGID": self.lastGID_,
+            "nextRID": self.nextRID_,
+        }
+
+    def LoadState(self, state):
+        """ Restore a generator state saved by SaveState. """
+        W = KANATA_CONVERTER_GID_WRAP_AROUND
+        self.currentCycle_ = state["cycle"]
+        self.opMap_ = [None] * W
+        for gid, sid in state["ops"]:
+            self.opMap_[gid % W] = KanataGenerator.Op(gid, sid)
+        self.opMapWatermark_ = state["opMapWatermark"]
+        self.nextSID_ = state["nextSID"]
+        self.lastGID_ = state["lastGID"]
+        self.nextRID_ = state["nextRID"]
+
+    @staticmethod
+    def RelocateState(state, gidOffset, cycleOffset, sidOffset, ridOffset):
+        """ Shift gids, cycles, sids and rids in a state saved by SaveState. """
+        return {
+            "cycle": state["cycle"] + cycleOffset,
+            "ops": [(gid + gidOffset, sid + sidOffset) for gid, sid in state["ops"]],
+            "opMapWatermark": state["opMapWatermark"] + gidOffset,
+            "nextSID": state["nextSID"] + sidOffset,
+            "lastGID": state["lastGID"] + gidOffset,
+            "nextRID": state["nextRID"] + ridOffset,
+        }
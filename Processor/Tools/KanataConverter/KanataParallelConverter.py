@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+
+#
+# This script converts a RSD log to a Kanata log with multiple processes.
+#
+# An input log is split into chunks at 'C' (cycle) lines, and the chunks
+# are processed in 2 passes:
+#   1: Each chunk is parsed in a process pool with KanataStateGenerator,
+#      which tracks sid/rid but writes nothing. Before its own range, each
+#      process parses a warm-up range preceding the chunk to rebuild
+#      in-flight ops, pending events and the wrap-around base of gid.
+#      The state rebuilt at the beginning of a chunk is compared with the
+#      state at the end of the previous chunk. Since gids, cycles, sids and
+#      rids are relative in each process, they are relocated before the
+#      comparison. When the states do not match, the chunk is parsed again
+#      from the state at the end of the previous chunk.
+#   2: Each chunk is parsed again from the exact state at its beginning and
+#      converted to a part of a Kanata log. The parts are concatenated, so
+#      the output is identical to that of the serial converter.
+#
+
+import os
+import io
+import sys
+import shutil
+import contextlib
+import multiprocessing
+
+from RSD_Parser import RSD_Parser
+from KanataGenerator import KanataGenerator, KANATA_GENERATOR_PROFILE_FULL
+
+
+class KanataStateGenerator(KanataGenerator):
+    """ Track sid/rid like KanataGenerator without writing anything. """
+
+    def Flush_(self):
+        del self.buffer_[:]
+
+
+def ScanChunk_(args):
+    """ Pass 1: parse a chunk and return its states at the beginning/end.
+    When 'state' is None, the state at the beginning is rebuilt by parsing
+    a warm-up range [warmUpBegin, begin).
+    """
+    inputFileName, warmUpBegin, begin, end, state, profile = args
+    parser = RSD_Parser()
+    generator = KanataStateGenerator(profile)
+    parser.SetLabelOutput(generator.OutputsLabels())
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        try:
+            parser.Open(inputFileName)
+            if state is not None:
+                parser.LoadState(state[0])
+                generator.LoadState(state[1])
+            elif warmUpBegin < begin:
+                parser.ParseRange(generator, warmUpBegin, begin, False)
+
+            beginState = (parser.SaveState(), generator.SaveState())
+            parser.ParseRange(generator, begin, end, False)
+            endState = (parser.SaveState(), generator.SaveState())
+        finally:
+            parser.Close()
+
+    return beginState, endState
+
+
+def ConvertChunk_(args):
+    """ Pass 2: convert a chunk from an exact state to a part file.
+    Messages printed while parsing are returned as a string, so that they
+    are printed in the same order as the serial converter.
+    """
+    inputFileName, partFileName, begin, end, state, dispose, programImage, profile = args
+    parser = RSD_Parser()
+    if programImage is not None:
+        parser.SetProgramImage(programImage)
+    generator = KanataGenerator(profile)
+    parser.SetLabelOutput(generator.OutputsLabels())
+    messages = io.StringIO()
+
+    with contextlib.redirect_stdout(messages):
+        try:
+            parser.Open(inputFileName)
+            generator.Open(partFileName, outputHeader=(state is None))
+            if state is not None:
+                parser.LoadState(state[0])
+                generator.LoadState(state[1])
+            parser.ParseRange(generator, begin, end, dispose)
+        finally:
+            parser.Close()
+            generator.Close()
+
+    return messages.getvalue()
+
+
+class KanataParallelConverter(object):
+    """ Convert a RSD log to a Kanata log in a process pool. """
+
+    # The size of a warm-up range parsed before each chunk.
+    WARM_UP_SIZE = 4 * 1024 * 1024
+
+    # Chunks are not split smaller than this size.
+    MIN_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, jobs, warmUpSize=WARM_UP_SIZE, minChunkSize=MIN_CHUNK_SIZE):
+        self.jobs_ = jobs
+        self.warmUpSize_ = warmUpSize
+        self.minChunkSize_ = minChunkSize
+
+    def Main(
+        self, inputFileName, outputFileName, programImage=None,
+        profile=KANATA_GENERATOR_PROFILE_FULL
+    ):
+        """ The entry point of this class.
+        When 'programImage' is a RSD_ProgramImage, labels are looked up in it.
+        'profile' is an output profile of KanataGenerator.
+        """
+
+        boundaries, warmUpBegins = self.Split_(inputFileName)
+        chunkNum = len(boundaries) - 1
+        lastChunk = chunkNum - 1
+
+        pool = multiprocessing.Pool(min(self.jobs_, chunkNum))
+        try:
+            # Pass 1: the last chunk is not scanned because no chunk follows it.
+            scans = pool.map(
+                ScanChunk_,
+                [
+                    (inputFileName, warmUpBegins[i], boundaries[i], boundaries[i + 1], None,
+                     profile)
+                    for i in range(lastChunk)
+                ]
+            )
+            states = [None] + self.ResolveStates_(inputFileName, boundaries, scans, profile)
+
+            # Pass 2
+            # Parts keep the extension of the output file, so compressed parts
+            # are concatenated into a valid multi-member stream.
+            root, ext = os.path.splitext(outputFileName)
+            partFileNames = [
+                "%s.part%d%s" % (root, i, ext) for i in range(chunkNum)
+            ]
+            messages = pool.map(
+                ConvertChunk_,
+                [
+                    (inputFileName, partFileNames[i], boundaries[i], boundaries[i + 1],
+                     states[i], i == lastChunk, programImage, profile)
+                    for i in range(chunkNum)
+                ]
+            )
+        finally:
+            pool.close()
+            pool.join()
+
+        for message in messages:
+            sys.stdout.write(message)
+
+        with open(outputFileName, "wb") as outputFile:
+            for partFileName in partFileNames:
+                with open(partFileName, "rb") as partFile:
+                    shutil.copyfileobj(partFile, outputFile)
+                os.remove(partFileName)
+
+    def Split_(self, inputFileName):
+        """ Split an input file into chunks at 'C' lines.
+        Returns byte offsets of chunk boundaries and warm-up begins.
+        """
+        size = os.path.getsize(inputFileName)
+        chunkSize = max(size // self.jobs_, self.minChunkSize_)
+
+        boundaries = [0]
+        warmUpBegins = [0]
+        with open(inputFileName, "rb") as file:
+            pos = chunkSize
+            while pos < size:
+                boundary = self.FindCycleLine_(file, pos)
+                if boundary >= size:
+                    break
+                boundaries.append(boundary)
+                if boundary <= self.warmUpSize_:
+                    warmUpBegins.append(0)
+                else:
+                    warmUpBegins.append(
+                        self.FindCycleLine_(file, boundary - self.warmUpSize_)
+                    )
+                pos = boundary + chunkSize
+        boundaries.append(size)
+        return boundaries, warmUpBegins
+
+    def FindCycleLine_(self, file, pos):
+        """ Return an offset of the first 'C' line at or after 'pos'. """
+        file.seek(pos - 1)
+        file.readline()     # Skip the rest of a line including 'pos - 1'.
+        while True:
+            offset = file.tell()
+            line = file.readline()
+            if line == b"" or line.startswith(b"C\t"):
+                return offset
+
+    def ResolveStates_(self, inputFileName, boundaries, scans, profile):
+        """ Determine exact states at the beginning of chunks 1..N-1. """
+        if not scans:
+            return []
+        states = []
+        exactEnd = scans[0][1]     # Chunk 0 is parsed from the file head.
+
+        for i in range(1, len(scans)):
+            states.append(exactEnd)
+            beginState, endState = scans[i]
+            offsets = self.GetOffsets_(beginState, exactEnd)
+            if offsets is not None and self.IsSameState_(
+                self.Relocate_(beginState, offsets), exactEnd
+            ):
+                exactEnd = self.Relocate_(endState, offsets)
+            else:
+                # The warm-up range was too short to rebuild the state.
+                beginState, exactEnd = ScanChunk_(
+                    (inputFileName, boundaries[i], boundaries[i], boundaries[i + 1], exactEnd,
+                     profile)
+                )
+
+        states.append(exactEnd)
+        return states
+
+    def GetOffsets_(self, state, exactState):
+        """ Calculate offsets from a relative 'state' to 'exactState'. """
+        parserState, generatorState = state
+        exactParserState, exactGeneratorState = exactState
+
+        gidOffset = exactParserState["maxRetiredOp"] - parserState["maxRetiredOp"]
+        if gidOffset % RSD_Parser.GID_WRAP_AROUND != 0:
+            return None
+        return (
+            gidOffset,
+            exactParserState["cycle"] - parserState["cycle"],
+            exactGeneratorState["nextSID"] - generatorState["nextSID"],
+            exactGeneratorState["nextRID"] - generatorState["nextRID"],
+            exactParserState["committedOpNum"] - parserState["committedOpNum"],
+            exactParserState["lineNum"] - parserState["lineNum"],
+        )
+
+    def Relocate_(self, state, offsets):
+        """ Relocate a relative state with offsets from GetOffsets_. """
+        gidOffset, cycleOffset, sidOffset, ridOffset, committedOffset, lineOffset = offsets
+        parserState = RSD_Parser.RelocateState(state[0], gidOffset, cycleOffset)
+        parserState["committedOpNum"] += committedOffset
+        parserState["lineNum"] += lineOffset
+        generatorState = KanataGenerator.RelocateState(
+            state[1], gidOffset, cycleOffset, sidOffset, ridOffset
+        )
+        return parserState, generatorState
+
+    def IsSameState_(self, state, exactState):
+        """ Compare states.
+        'lastGID' is ignored because it is used only for a warning and ops
+        fetched before a warm-up range can change it.
+        """
+        generatorState = dict(state[1], lastGID=exactState[1]["lastGID"])
+        return state[0] == exactState[0] and generatorState == exactState[1]
@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+
+#
+# Convert samples of a RSD log to a Kanata log.
+#
+# A very long log is converted as samples of 'length' out of every
+# 'period', so that Konata can load a representative part of it. A period
+# and a length are counted in cycles, or in committed ops when samples are
+# aligned to commit counts. The i-th sample begins at 'offset + i * period'.
+#
+# A log is parsed in 2 modes by KanataSampleParser:
+#   fast-forward: Only cycles and retirements are tracked to keep the gid
+#                 base (see RSD_Parser.CreateGID_) and the number of committed
+#                 ops. Ops are not tracked and no event is generated.
+#   full:         A log is parsed as usual. This begins 'warm-up' before a
+#                 sample to rebuild ops in flight, and continues 'drain'
+#                 cycles after it so that ops in a sample complete.
+# When parsing switches from fast-forward to full, the parser is reset to
+# the state without ops like a checkpoint of a cycle index.
+# See KanataWindowConverter.py and RSD_LogIndex.py
+#
+# KanataSampleGenerator outputs ops in flight at the beginning of a sample
+# as if they were fetched at its first cycle. After a sample, only ops
+# already output are converted, and ops that do not complete in 'drain'
+# cycles are output as flushed.
+#
+# Samples are output to a single stitched file, in which sids and rids are
+# numbered through samples and cycles are the same as those in a whole log.
+# With 'segments', each sample is output to its own Kanata log named like
+# 'Kanata.0000.log', in which sids and rids are numbered from 0.
+#
+
+import os
+from collections import deque
+
+from RSD_Parser import RSD_Parser, RSD_ParserError, RSD_PARSER_RETIREMENT_STAGE_ID
+from KanataGenerator import KanataGenerator, KANATA_CONVERTER_GID_WRAP_AROUND
+from KanataGenerator import KANATA_GENERATOR_PROFILE_FULL
+from KanataWindowConverter import KanataWindowGenerator, KanataWindowConverter
+
+#
+# Global constants
+#
+KANATA_SAMPLE_UNIT_CYCLES = "cycles"
+KANATA_SAMPLE_UNIT_COMMITS = "commits"
+KANATA_SAMPLE_UNITS = [KANATA_SAMPLE_UNIT_CYCLES, KANATA_SAMPLE_UNIT_COMMITS]
+
+# A retirement stage in a text log. See RSD_Parser.OnRSD_Stage_
+KANATA_SAMPLE_RETIREMENT_STAGE = str(RSD_PARSER_RETIREMENT_STAGE_ID)
+
+
+def GetSegmentFileName(fileName, index):
+    """ Return a file name of the 'index'-th segment, such as
+    'Kanata.0001.log.gz' for 'Kanata.log.gz'.
+    """
+    dirName, baseName = os.path.split(fileName)
+    stem, dot, ext = baseName.partition(".")
+    return os.path.join(dirName, "%s.%04d%s%s" % (stem, index, dot, ext))
+
+
+class KanataSampleSchedule(object):
+    """ Decide samples of a log.
+    IsFull is called from KanataSampleParser on each cycle, and GetWindow
+    and IsDraining are called from KanataSampleGenerator, which receives
+    cycles later than the parser.
+    """
+
+    def __init__(
+        self, period, length, unit=KANATA_SAMPLE_UNIT_CYCLES, offset=0,
+        warmUp=KanataWindowConverter.WARM_UP_CYCLES,
+        drain=KanataWindowConverter.WARM_UP_CYCLES
+    ):
+        if length <= 0 or length >= period:
+            raise ValueError("A sample length must be positive and shorter than a period.")
+        if unit not in KANATA_SAMPLE_UNITS:
+            raise ValueError("An unknown sample unit: %s" % unit)
+        self.period_ = period
+        self.length_ = length
+        self.unit_ = unit
+        self.offset_ = offset
+        self.warmUp_ = warmUp   # in 'unit'
+        self.drain_ = drain     # in cycles
+
+        # Samples aligned to commit counts are recorded while a log is
+        # parsed as [index, first cycle, last cycle, committed ops].
+        # The last cycle is None while a sample continues.
+        self.nextSample_ = 0
+        self.openSample_ = None
+        self.samples_ = deque()
+        self.drainEnd_ = None   # The last cycle fully parsed after a sample
+        self.lastEnd_ = None    # The last cycle of a sample passed by a generator
+
+    def IsFull(self, cycle, committedOpNum):
+        """ Return whether a log is fully parsed in 'cycle'.
+        'committedOpNum' is the number of ops committed before 'cycle'.
+        """
+        if self.unit_ == KANATA_SAMPLE_UNIT_CYCLES:
+            if cycle < self.offset_ - self.warmUp_:
+                return False
+            r = (cycle - self.offset_) % self.period_
+            return r < self.length_ + self.drain_ or r >= self.period_ - self.warmUp_
+
+        sample = self.openSample_
+        if sample is None:
+            if committedOpNum >= self.offset_ + self.nextSample_ * self.period_:
+                sample = [self.nextSample_, cycle, None, committedOpNum]
+                self.openSample_ = sample
+                self.samples_.append(sample)
+        elif committedOpNum >= sample[3] + self.length_:
+            # 'length' ops are committed by the last cycle.
+            sample[2] = cycle - 1
+            self.openSample_ = None
+            self.nextSample_ += 1
+            self.drainEnd_ = cycle - 1 + self.drain_
+
+        return (
+            self.openSample_ is not None or
+            (self.drainEnd_ is not None and cycle <= self.drainEnd_) or
+            committedOpNum >= self.offset_ + self.nextSample_ * self.period_ - self.warmUp_
+        )
+
+    def GetWindow(self, cycle):
+        """ Return the index of a sample including 'cycle', or None. """
+        if self.unit_ == KANATA_SAMPLE_UNIT_CYCLES:
+            if cycle < self.offset_:
+                return None
+            index, r = divmod(cycle - self.offset_, self.period_)
+            return index if r < self.length_ else None
+
+        samples = self.samples_
+        while samples and samples[0][2] is not None and samples[0][2] < cycle:
+            self.lastEnd_ = samples.popleft()[2]
+        if samples and samples[0][1] <= cycle:
+            return samples[0][0]
+        return None
+
+    def IsDraining(self, cycle):
+        """ Return whether 'cycle' is in 'drain' cycles after a sample.
+        This must be called after GetWindow with the same cycle.
+        """
+        if self.unit_ == KANATA_SAMPLE_UNIT_CYCLES:
+            if cycle < self.offset_:
+                return False
+            return (cycle - self.offset_) % self.period_ < self.length_ + self.drain_
+        return self.lastEnd_ is not None and cycle <= self.lastEnd_ + self.drain_
+
+
+class KanataSampleParser(RSD_Parser):
+    """ Parse a log fully only around samples, and fast-forward the rest. """
+
+    def __init__(self, schedule):
+        RSD_Parser.__init__(self)
+        self.schedule_ = schedule
+        self.fastForward_ = False
+
+    def OnRSD_Stage_(self, words):
+        if self.fastForward_:
+            # Only retirement is tracked, without converting the other fields.
+            if words[1] == KANATA_SAMPLE_RETIREMENT_STAGE and words[2] == "1":
+                try:
+                    iid, mid = int(words[5]), int(words[6])
+                except (ValueError, IndexError) as err:
+                    raise RSD_ParserError("A broken stage record: %s" % err)
+                self.FastForwardRetire_(iid, mid)
+            return
+        RSD_Parser.OnRSD_Stage_(self, words)
+
+    def OnStage_(self, stageID, stall, clear, iid, mid, comment):
+        if self.fastForward_:
+            if stageID == RSD_PARSER_RETIREMENT_STAGE_ID:
+                self.FastForwardRetire_(iid, mid)
+            return
+        if stageID == RSD_PARSER_RETIREMENT_STAGE_ID:
+            # An op dumped first on a retirement stage after fast-forwarding
+            # is not counted by RSD_Parser, because it looks like a new op.
+            gid = self.CreateGID_(iid, mid)
+            if gid > self.maxRetiredOp_ and self.GetOp_(gid) is None:
+                self.FastForwardRetire_(iid, mid)
+        RSD_Parser.OnStage_(self, stageID, stall, clear, iid, mid, comment)
+
+    def OnRSD_Label_(self, words):
+        if not self.fastForward_:
+            RSD_Parser.OnRSD_Label_(self, words)
+
+    def OnLabel_(self, iid, mid, pc, code):
+        if not self.fastForward_:
+            RSD_Parser.OnLabel_(self, iid, mid, pc, code)
+
+    def OnCycle_(self, increment):
+        self.currentCycle_ += increment
+        full = self.schedule_.IsFull(self.currentCycle_, self.committedOpNum_)
+        if self.fastForward_:
+            if not full:
+                return
+            self.EndFastForward_()
+        elif not full:
+            self.BeginFastForward_()
+            return
+        self.ProcessEvents_(dispose=False)
+
+    def FastForwardRetire_(self, iid, mid):
+        """ Count an op on a retirement stage. An op stays on the stage for
+        a cycle or more, so it is counted only when its gid is new.
+        See OnStage_ in RSD_Parser.py
+        """
+        gid = self.CreateGID_(iid, mid)
+        if gid > self.maxRetiredOp_ or self.committedOpNum_ == 0:
+            self.maxRetiredOp_ = gid
+            self.committedOpNum_ += 1
+
+    def BeginFastForward_(self):
+        # Events of ops tracked so far are output before fast-forwarding.
+        self.ProcessEvents_(dispose=True)
+        self.fastForward_ = True
+
+    def EndFastForward_(self):
+        """ Reset a state to the one without ops before full parsing. Ops in
+        flight are rebuilt from a warm-up range like KanataWindowConverter.
+        """
+        self.LoadState({
+            "cycle": self.currentCycle_,
+            "ops": [],
+            "opsWatermark": self.maxRetiredOp_ + 1,
+            "events": [],
+            "flushed": [],
+            "maxRetiredOp": self.maxRetiredOp_,
+            "committedOpNum": self.committedOpNum_,
+            "lineNum": self.lineNum_,
+        })
+        self.fastForward_ = False
+
+
+class KanataSampleGenerator(KanataWindowGenerator):
+    """ Generate Kanata log data in samples decided by a KanataSampleSchedule. """
+
+    def __init__(self, schedule, segments=False, profile=KANATA_GENERATOR_PROFILE_FULL):
+        KanataWindowGenerator.__init__(self, None, None, profile)
+        self.schedule_ = schedule
+        self.segments_ = segments
+        self.baseFileName_ = None
+        self.window_ = None     # The index of the last sample
+        self.draining_ = False
+        self.samples_ = 0       # The number of output samples
+
+    def Open(self, fileName, outputHeader=True):
+        self.baseFileName_ = fileName
+        if not self.segments_:
+            # A header is output when the first sample begins.
+            KanataGenerator.Open(self, fileName, outputHeader=False)
+
+    def Close(self):
+        if self.segments_:
+            if self.samples_ == 0:
+                print("No sample is found in a log.")
+            else:
+                self.EndDrain_()
+        elif self.samples_ == 0:
+            self.OutputHeader_()
+        KanataGenerator.Close(self)
+
+    def OnCycle(self, cycle):
+        """ This method is called from RSD_Parser """
+        window = self.schedule_.GetWindow(cycle)
+        if window is not None:
+            if window != self.window_:
+                self.BeginSample_(cycle, window)
+            KanataGenerator.OnCycle(self, cycle)
+            return
+        if self.inWindow_:
+            self.inWindow_ = False
+            self.draining_ = True
+        if self.draining_:
+            if self.schedule_.IsDraining(cycle) and self.HasOutputOps_():
+                KanataGenerator.OnCycle(self, cycle)
+            else:
+                self.EndDrain_()
+
+    def OnEvent(self, event):
+        """ This method is called from RSD_Parser """
+        self.TrackEvent_(event)
+        if self.inWindow_:
+            KanataGenerator.OnEvent(self, event)
+        elif self.draining_ and self.GetOp_(event.gid) is not None:
+            KanataGenerator.OnEvent(self, event)
+
+    def BeginSample_(self, cycle, window):
+        """ Output ops in flight at the beginning of a sample. """
+        if self.segments_:
+            if self.samples_ > 0:
+                self.EndDrain_()
+                KanataGenerator.Close(self)
+            KanataGenerator.Open(
+                self, GetSegmentFileName(self.baseFileName_, self.samples_), outputHeader=False
+            )
+            W = KANATA_CONVERTER_GID_WRAP_AROUND
+            self.opMap_ = [None] * W
+            self.opMapWatermark_ = -W
+            self.nextSID_ = 0
+            self.lastGID_ = 0
+            self.nextRID_ = 0
+
+        if self.segments_ or self.samples_ == 0:
+            self.Write_(self.KNT_HEADER)
+            self.Write_("C=\t%d\n" % cycle)
+            self.currentCycle_ = cycle
+        else:
+            KanataGenerator.OnCycle(self, cycle)
+
+        # Ops still output from a previous sample are continued.
+        for gid in sorted(self.liveOps_):
+            if self.GetOp_(gid) is None:
+                self.OutputLiveOp_(gid)
+
+        self.window_ = window
+        self.inWindow_ = True
+        self.draining_ = False
+        self.samples_ += 1
+
+    def HasOutputOps_(self):
+        for gid in self.liveOps_:
+            if self.GetOp_(gid) is not None:
+                return True
+        return False
+
+    def EndDrain_(self):
+        """ Output ops that do not complete after a sample as flushed. """
+        for gid in sorted(self.liveOps_):
+            op = self.GetOp_(gid)
+            if op is None:
+                continue
+            stageID = self.liveOps_[gid][0]
+            if stageID is not None:
+                self.Write_(self.stageEndTemplates_[stageID] % op.sid)
+            self.Write_(self.KNT_TEMPLATE_FLUSH % op.sid)
+            self.opMap_[gid % KANATA_CONVERTER_GID_WRAP_AROUND] = None
+        self.inWindow_ = False
+        self.draining_ = False
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+#
+# This script converts a cycle window of a RSD log to a Kanata log.
+#
+# A window [fromCycle, toCycle] is converted as follows:
+#   1: The last checkpoint before 'fromCycle - warm-up cycles' is looked up
+#      in a cycle index of a log (see RSD_LogIndex.py), and RSD_Parser
+#      restores the gid base at the checkpoint.
+#   2: A warm-up range from the checkpoint to 'fromCycle' is parsed.
+#      KanataWindowGenerator tracks in-flight ops without writing anything,
+#      and messages printed in this range are discarded.
+#   3: The window is parsed. When it begins, ops in flight are output as if
+#      they were fetched at 'fromCycle', and events after 'toCycle' are
+#      ignored.
+#
+# sids and rids are numbered from 0 in a window, and cycles in an output
+# log are the same as those in the whole log.
+#
+
+import os
+import contextlib
+
+from RSD_Parser import RSD_Parser
+from RSD_Event import RSD_Event
+from RSD_LogIndex import RSD_LogIndex
+from RSD_BinaryTrace import IsBinaryTraceFile
+from KanataGenerator import KanataGenerator, KANATA_GENERATOR_PROFILE_FULL
+import CompressedStream
+
+
+class KanataWindowGenerator(KanataGenerator):
+    """ Generate Kanata log data in a cycle window [fromCycle, toCycle]. """
+
+    def __init__(self, fromCycle, toCycle, profile=KANATA_GENERATOR_PROFILE_FULL):
+        KanataGenerator.__init__(self, profile)
+        self.fromCycle_ = fromCycle
+        self.toCycle_ = toCycle
+        self.inWindow_ = False
+        self.finished_ = False
+
+        # gid -> [stage id, stall, label, comment] of an op in flight
+        # before a window.
+        self.liveOps_ = {}
+
+    def Open(self, fileName, outputHeader=True):
+        # A header is output when a window begins, because it includes the
+        # first cycle.
+        KanataGenerator.Open(self, fileName, outputHeader=False)
+
+    def Close(self):
+        if self.outputFile_ is not None and not self.inWindow_:
+            # An empty window
+            self.OutputHeader_()
+        KanataGenerator.Close(self)
+
+    def OnCycle(self, cycle):
+        """ This method is called from RSD_Parser """
+        if not self.inWindow_:
+            if cycle < self.fromCycle_:
+                return
+            self.BeginWindow_(cycle)
+        if self.toCycle_ is not None and cycle > self.toCycle_:
+            self.finished_ = True
+            return
+        KanataGenerator.OnCycle(self, cycle)
+
+    def OnEvent(self, event):
+        """ This method is called from RSD_Parser """
+        if self.finished_:
+            return
+        if self.inWindow_:
+            KanataGenerator.OnEvent(self, event)
+            return
+        self.TrackEvent_(event)
+
+    def TrackEvent_(self, event):
+        """ Track ops in flight before a window in 'liveOps_'. """
+        gid = event.gid
+        type = event.type
+        if type == RSD_Event.INIT:
+            self.liveOps_[gid] = [None, False, None, ""]
+            return
+        op = self.liveOps_.get(gid)
+        if op is None:
+            return
+        if type == RSD_Event.STAGE_BEGIN:
+            op[0] = event.stageID
+            op[3] = event.comment
+        elif type == RSD_Event.STAGE_END:
+            if op[0] == event.stageID:
+                op[0] = None
+        elif type == RSD_Event.STALL_BEGIN:
+            op[1] = True
+        elif type == RSD_Event.STALL_END:
+            op[1] = False
+        elif type == RSD_Event.LABEL:
+            op[2] = event.comment
+        elif type == RSD_Event.FLUSH:
+            del self.liveOps_[gid]
+        elif type == RSD_Event.RETIRE:
+            # A retired op and ops older than it are disposed.
+            for g in [g for g in self.liveOps_ if g <= gid]:
+                del self.liveOps_[g]
+
+    def BeginWindow_(self, cycle):
+        """ Output a header and ops in flight at the beginning of a window. """
+        self.inWindow_ = True
+        self.Write_(self.KNT_HEADER)
+        self.Write_("C=\t%d\n" % cycle)
+        self.currentCycle_ = cycle
+
+        for gid in sorted(self.liveOps_):
+            self.OutputLiveOp_(gid)
+        self.liveOps_ = {}
+
+    def OutputLiveOp_(self, gid):
+        """ Output an op in 'liveOps_' as if it is fetched at a current cycle. """
+        stageID, stall, label, comment = self.liveOps_[gid]
+        self.AddNewGID_(gid)
+        sid = self.GetSID_(gid)
+        self.Write_(self.FormatInit_(sid, gid))
+        if label is not None and self.labels_:
+            self.Write_(self.KNT_TEMPLATE_LABEL % (sid, label))
+        if stageID is not None:
+            self.Write_(self.stageBeginTemplates_[stageID] % sid)
+            if comment != "":
+                self.Write_(self.FormatComment_(sid, comment))
+        if stall and self.stalls_:
+            self.Write_(self.KNT_TEMPLATE_STALL_BEGIN % sid)
+
+
+class KanataWindowConverter(object):
+    """ Convert a cycle window of a RSD log to a Kanata log. """
+
+    # Cycles parsed before a window to rebuild ops in flight.
+    # This must be longer than the lifetime of ops.
+    WARM_UP_CYCLES = 1000
+
+    def __init__(self, warmUpCycles=WARM_UP_CYCLES):
+        self.warmUpCycles_ = warmUpCycles
+
+    def Main(
+        self, inputFileName, outputFileName, fromCycle, toCycle, programImage=None,
+        profile=KANATA_GENERATOR_PROFILE_FULL
+    ):
+        """ The entry point of this class.
+        'toCycle' is None when a window continues to the end of a log.
+        When 'programImage' is a RSD_ProgramImage, labels are looked up in it.
+        'profile' is an output profile of KanataGenerator.
+        """
+        parser = RSD_Parser()
+        if programImage is not None:
+            parser.SetProgramImage(programImage)
+        generator = KanataWindowGenerator(fromCycle, toCycle, profile)
+        parser.SetLabelOutput(generator.OutputsLabels())
+
+        try:
+            parser.Open(inputFileName)
+            generator.Open(outputFileName)
+
+            if (CompressedStream.IsStream(inputFileName) or
+                CompressedStream.IsCompressed(inputFileName) or
+                IsBinaryTraceFile(inputFileName)):
+                # A stream, a compressed stream or a binary trace cannot be seeked.
+                print("A stream, a compressed or binary log is parsed from its head.")
+                parser.Parse(generator)
+                return
+
+            index = RSD_LogIndex.Open(inputFileName)
+            checkpoint = index.FindCheckpoint(fromCycle - self.warmUpCycles_)
+            fromOffset = index.FindCycleLine(fromCycle)
+            if toCycle is None:
+                toOffset = os.path.getsize(inputFileName)
+            else:
+                toOffset = index.FindCycleLine(toCycle + 1)
+
+            if checkpoint.offset > 0:
+                parser.LoadState(index.GetParserState(checkpoint))
+            # Messages in a warm-up range are caused by ops fetched before
+            # a checkpoint, and they are not printed.
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                parser.ParseRange(generator, checkpoint.offset, fromOffset, False)
+            parser.ParseRange(generator, fromOffset, max(fromOffset, toOffset), True)
+
+        finally:
+            parser.Close()
+            generator.Close()
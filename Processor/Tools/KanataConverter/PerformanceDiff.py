@@ -0,0 +1,541 @@
+# -*- coding: utf-8 -*-
+
+#
+# This script compares the performance of two RSD logs instruction by
+# instruction.
+#
+# Both logs are processed as follows:
+#   1: Each log is parsed by RSD_Parser in its own process. RetiredOpGenerator
+#      tracks in-flight ops and passes each retired op to the main process
+#      through a bounded queue as (label, latency, stall cycles):
+#        label:        A label of an op ("PC: disassembly").
+#        latency:      Cycles from its first stage to its retirement.
+#        stall cycles: Total cycles the op stalls.
+#      Flushed ops are counted for each label in the process.
+#   2: The main process aligns the two sequences of retired ops on their
+#      labels. When they diverge, for example in polling loops whose trip
+#      counts depend on timing, the nearest point where both sequences
+#      match again is searched within PERFORMANCE_DIFF_LOOKAHEAD ops, and
+#      skipped ops are counted as unmatched.
+#   3: Differences of aligned ops are summed for each label and for each
+#      region of PCs, and the top regressions and improvements are
+#      reported.
+#
+# Memory is bounded by the lookahead window, the queues and the number of
+# distinct labels in a program, so long runs such as Coremark can be
+# compared.
+#
+# With '--output', all results are written as JSON, or as CSV rows when an
+# output file name ends with '.csv'.
+#
+# Usage:
+#   python3 PerformanceDiff.py [options] baseFileName newFileName
+#
+
+import os
+import sys
+import csv
+import json
+import queue
+import contextlib
+import collections
+import multiprocessing
+from optparse import OptionParser
+
+from RSD_Event import RSD_Event
+from KanataGenerator import KANATA_CONVERTER_GID_WRAP_AROUND
+
+#
+# Global constants
+#
+
+# The number of retired ops passed to the main process at once.
+PERFORMANCE_DIFF_BATCH_SIZE = 4096
+
+# The max number of batches queued for the main process.
+PERFORMANCE_DIFF_QUEUE_DEPTH = 16
+
+# Seconds to wait for a batch before checking whether a child process is alive.
+PERFORMANCE_DIFF_POLL_INTERVAL = 1.0
+
+# The number of ops searched to align diverged sequences again.
+PERFORMANCE_DIFF_LOOKAHEAD = 512
+
+# The number of ops that must match at a point where sequences are aligned.
+PERFORMANCE_DIFF_CONFIRM_OPS = 8
+
+PERFORMANCE_DIFF_DEFAULT_REGION_SIZE = 256
+PERFORMANCE_DIFF_DEFAULT_TOP = 20
+
+
+class RetiredOpGenerator(object):
+    """ Pass retired ops to a function in order of retirement. """
+
+    class Op(object):
+        __slots__ = ("gid", "label", "initCycle", "stallBegin", "stallCycles")
+
+        def __init__(self, gid, cycle):
+            self.gid = gid
+            self.label = None
+            self.initCycle = cycle
+            self.stallBegin = None
+            self.stallCycles = 0
+
+    def __init__(self, output):
+        """ 'output' is called with a list of (label, latency, stall cycles). """
+        self.output_ = output
+        self.batch_ = []
+
+        # gid -> Op. See opMap_ in KanataGenerator.py
+        self.ops_ = [None] * KANATA_CONVERTER_GID_WRAP_AROUND
+        self.opsWatermark_ = -KANATA_CONVERTER_GID_WRAP_AROUND
+
+        self.currentCycle_ = None
+        self.retiredOps_ = []   # Ops retired in a current cycle
+        self.retired_ = 0
+        self.flushes_ = collections.Counter()   # label -> flushed ops
+
+    def Close(self):
+        self.OutputRetiredOps_()
+        if self.batch_:
+            self.output_(self.batch_)
+            self.batch_ = []
+
+    def GetSummary(self):
+        return {
+            "cycles": self.currentCycle_ if self.currentCycle_ is not None else 0,
+            "retired": self.retired_,
+            "flushes": dict(self.flushes_),
+        }
+
+    #
+    # Interface for RSD_Parser
+    #
+    def OnCycle(self, cycle):
+        """ This method is called from RSD_Parser """
+        self.OutputRetiredOps_()
+        self.currentCycle_ = cycle
+
+    def OnEvent(self, event):
+        """ This method is called from RSD_Parser """
+        type = event.type
+        gid = event.gid
+        i = gid % KANATA_CONVERTER_GID_WRAP_AROUND
+        if type == RSD_Event.INIT:
+            self.ops_[i] = self.Op(gid, self.currentCycle_)
+            return
+        op = self.ops_[i]
+        if op is None or op.gid != gid:
+            return
+        if type == RSD_Event.LABEL:
+            op.label = event.comment
+        elif type == RSD_Event.STALL_BEGIN:
+            op.stallBegin = self.currentCycle_
+        elif type == RSD_Event.STALL_END:
+            if op.stallBegin is not None:
+                op.stallCycles += self.currentCycle_ - op.stallBegin
+                op.stallBegin = None
+        elif type == RSD_Event.RETIRE:
+            self.retiredOps_.append(op)
+            self.DisposeOps_(gid + 1)
+        elif type == RSD_Event.FLUSH:
+            self.flushes_[op.label] += 1
+            self.ops_[i] = None
+
+    def DisposeOps_(self, gid):
+        """ Delete ops older than 'gid'. See DisposeOps_ in KanataGenerator.py """
+        W = KANATA_CONVERTER_GID_WRAP_AROUND
+        ops = self.ops_
+        for g in range(max(self.opsWatermark_, gid - W), gid):
+            op = ops[g % W]
+            if op is not None and op.gid < gid:
+                ops[g % W] = None
+        self.opsWatermark_ = max(self.opsWatermark_, gid)
+
+    def OutputRetiredOps_(self):
+        """ Output ops retired in a current cycle in order of gid. """
+        if not self.retiredOps_:
+            return
+        self.retiredOps_.sort(key=lambda op: op.gid)
+        cycle = self.currentCycle_
+        batch = self.batch_
+        for op in self.retiredOps_:
+            batch.append((op.label, cycle - op.initCycle, op.stallCycles))
+        self.retired_ += len(self.retiredOps_)
+        self.retiredOps_ = []
+        if len(batch) >= PERFORMANCE_DIFF_BATCH_SIZE:
+            self.output_(batch)
+            self.batch_ = []
+
+
+def ParseRetiredOps_(fileName, outputQueue):
+    """ Parse a log in a child process and put batches of retired ops to
+    'outputQueue'. It ends with ("summary", summary) or ("error", message).
+    """
+    from RSD_Parser import RSD_Parser, RSD_ParserError
+
+    parser = RSD_Parser()
+    generator = RetiredOpGenerator(outputQueue.put)
+    # Messages of the parser would be mixed with a report.
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        try:
+            parser.Open(fileName)
+            parser.Parse(generator)
+            generator.Close()
+            outputQueue.put(("summary", generator.GetSummary()))
+        except (IOError, RSD_ParserError) as err:
+            outputQueue.put(("error", "%s: %s" % (fileName, err)))
+        except Exception as err:
+            # Any error must reach the main process, which waits for the end.
+            outputQueue.put(("error", "%s: %s: %s" % (fileName, type(err).__name__, err)))
+        finally:
+            parser.Close()
+
+
+class RetiredOpStream(object):
+    """ Iterate retired ops of a log parsed in a child process. """
+
+    def __init__(self, fileName):
+        self.fileName_ = fileName
+        self.queue_ = multiprocessing.Queue(PERFORMANCE_DIFF_QUEUE_DEPTH)
+        self.process_ = multiprocessing.Process(
+            target=ParseRetiredOps_, args=(fileName, self.queue_)
+        )
+        self.process_.daemon = True
+        self.process_.start()
+        self.summary = None
+
+    def Get_(self):
+        """ Return an item from a child process. An error is raised when
+        it exits without ending its items, e.g. when it is killed.
+        """
+        while True:
+            try:
+                return self.queue_.get(timeout=PERFORMANCE_DIFF_POLL_INTERVAL)
+            except queue.Empty:
+                if not self.process_.is_alive():
+                    break
+        # Items put just before an exit may still be in transit.
+        try:
+            return self.queue_.get(timeout=PERFORMANCE_DIFF_POLL_INTERVAL)
+        except queue.Empty:
+            raise IOError(
+                "%s: A parser process exited with %s." %
+                (self.fileName_, self.process_.exitcode)
+            )
+
+    def __iter__(self):
+        while True:
+            item = self.Get_()
+            if isinstance(item, tuple):
+                kind, value = item
+                if kind == "error":
+                    raise IOError(value)
+                self.summary = value
+                return
+            for op in item:
+                yield op
+
+    def Close(self):
+        if self.process_.is_alive():
+            self.process_.terminate()
+        self.process_.join()
+
+
+class PerformanceDiff(object):
+    """ Align retired ops of two logs and compare them. """
+
+    class Entry(object):
+        """ Differences of aligned ops with a label. """
+        __slots__ = ("count", "baseLatency", "newLatency", "baseStall", "newStall")
+
+        def __init__(self):
+            self.count = 0
+            self.baseLatency = 0
+            self.newLatency = 0
+            self.baseStall = 0
+            self.newStall = 0
+
+    def __init__(self, lookahead=PERFORMANCE_DIFF_LOOKAHEAD):
+        self.lookahead_ = lookahead
+        self.entries_ = {}  # label -> Entry
+        self.matched_ = 0
+        self.unmatched_ = [0, 0]
+        self.resyncs_ = 0
+        self.summaries_ = [None, None]
+
+    #
+    # Alignment
+    #
+    def Compare(self, baseFileName, newFileName):
+        streams = [RetiredOpStream(baseFileName), RetiredOpStream(newFileName)]
+        try:
+            self.Align_(iter(streams[0]), iter(streams[1]))
+            self.summaries_ = [streams[0].summary, streams[1].summary]
+        finally:
+            for stream in streams:
+                stream.Close()
+
+    def Align_(self, baseOps, newOps):
+        base = collections.deque()
+        new = collections.deque()
+        sources = [baseOps, newOps]
+        windows = [base, new]
+        lookahead = self.lookahead_
+        entries = self.entries_
+        Entry = PerformanceDiff.Entry
+
+        while True:
+            # Fill windows.
+            for k in (0, 1):
+                window = windows[k]
+                source = sources[k]
+                while source is not None and len(window) < lookahead:
+                    op = next(source, None)
+                    if op is None:
+                        sources[k] = source = None
+                    else:
+                        window.append(op)
+            if not base or not new:
+                break
+
+            # Compare aligned ops until a window runs low.
+            while base and new and (
+                (len(base) > lookahead // 2 or sources[0] is None) and
+                (len(new) > lookahead // 2 or sources[1] is None)
+            ):
+                b = base[0]
+                n = new[0]
+                if b[0] != n[0]:
+                    self.Resync_(base, new)
+                    continue
+                base.popleft()
+                new.popleft()
+                entry = entries.get(b[0])
+                if entry is None:
+                    entry = entries[b[0]] = Entry()
+                entry.count += 1
+                entry.baseLatency += b[1]
+                entry.newLatency += n[1]
+                entry.baseStall += b[2]
+                entry.newStall += n[2]
+                self.matched_ += 1
+
+        self.unmatched_[0] += len(base)
+        self.unmatched_[1] += len(new)
+        for k in (0, 1):
+            if sources[k] is not None:
+                self.unmatched_[k] += sum(1 for op in sources[k])
+
+    def Resync_(self, base, new):
+        """ Skip ops to the nearest point where both windows match. """
+        self.resyncs_ += 1
+        positions = {}
+        for j, op in enumerate(new):
+            positions.setdefault(op[0], []).append(j)
+
+        best = None
+        for i, op in enumerate(base):
+            if best is not None and i >= best[0] + best[1]:
+                break
+            for j in positions.get(op[0], ()):
+                if best is not None and i + j >= best[0] + best[1]:
+                    break
+                if self.IsAligned_(base, new, i, j):
+                    best = (i, j)
+                    break
+
+        # When no point is found, both first ops are skipped.
+        skipBase, skipNew = best if best is not None else (1, 1)
+        for i in range(skipBase):
+            base.popleft()
+        for j in range(skipNew):
+            new.popleft()
+        self.unmatched_[0] += skipBase
+        self.unmatched_[1] += skipNew
+
+    def IsAligned_(self, base, new, i, j):
+        n = min(PERFORMANCE_DIFF_CONFIRM_OPS, len(base) - i, len(new) - j)
+        for k in range(n):
+            if base[i + k][0] != new[j + k][0]:
+                return False
+        return True
+
+    #
+    # Results
+    #
+    def GetPC_(self, label):
+        """ Return a PC in a label, or None. """
+        if label is None:
+            return None
+        try:
+            return int(label.partition(":")[0], 16)
+        except ValueError:
+            return None
+
+    def GetResults(self, regionSize=PERFORMANCE_DIFF_DEFAULT_REGION_SIZE):
+        """ Return results as a dictionary. Labels and regions are sorted
+        by the total difference of latencies, from regressions to
+        improvements.
+        """
+        baseFlushes = self.summaries_[0]["flushes"]
+        newFlushes = self.summaries_[1]["flushes"]
+
+        labels = []
+        regions = {}
+        for label in set(self.entries_) | set(baseFlushes) | set(newFlushes):
+            entry = self.entries_.get(label, PerformanceDiff.Entry())
+            row = collections.OrderedDict([
+                ("pc", self.GetPC_(label)),
+                ("label", label),
+                ("count", entry.count),
+                ("baseLatency", float(entry.baseLatency) / entry.count if entry.count else 0.0),
+                ("newLatency", float(entry.newLatency) / entry.count if entry.count else 0.0),
+                ("latencyDelta", entry.newLatency - entry.baseLatency),
+                ("stallDelta", entry.newStall - entry.baseStall),
+                ("baseFlushes", baseFlushes.get(label, 0)),
+                ("newFlushes", newFlushes.get(label, 0)),
+            ])
+            labels.append(row)
+
+            pc = row["pc"]
+            region = pc - pc % regionSize if pc is not None else None
+            r = regions.get(region)
+            if r is None:
+                r = regions[region] = collections.OrderedDict([
+                    ("region", region), ("count", 0), ("latencyDelta", 0),
+                    ("stallDelta", 0), ("baseFlushes", 0), ("newFlushes", 0),
+                ])
+            for key in ("count", "latencyDelta", "stallDelta", "baseFlushes", "newFlushes"):
+                r[key] += row[key]
+
+        key = lambda row: (-row["latencyDelta"], -row["stallDelta"], row["pc"] or 0)
+        labels.sort(key=key)
+        regions = sorted(regions.values(), key=lambda r: (-r["latencyDelta"], r["region"] or 0))
+
+        summary = collections.OrderedDict()
+        for name, s in zip(("base", "new"), self.summaries_):
+            summary[name] = collections.OrderedDict([
+                ("cycles", s["cycles"]),
+                ("retired", s["retired"]),
+                ("flushes", sum(s["flushes"].values())),
+            ])
+        summary["matched"] = self.matched_
+        summary["unmatchedBase"] = self.unmatched_[0]
+        summary["unmatchedNew"] = self.unmatched_[1]
+        summary["resyncs"] = self.resyncs_
+
+        return collections.OrderedDict([
+            ("summary", summary),
+            ("regionSize", regionSize),
+            ("labels", labels),
+            ("regions", regions),
+        ])
+
+    def Print(self, results, top=PERFORMANCE_DIFF_DEFAULT_TOP):
+        summary = results["summary"]
+        print("%-8s %12s %12s %12s" % ("", "cycles", "retired", "flushes"))
+        for name in ("base", "new"):
+            s = summary[name]
+            print("%-8s %12d %12d %12d" % (name, s["cycles"], s["retired"], s["flushes"]))
+        print(
+            "matched: %d, unmatched: %d (base) %d (new), resyncs: %d" % (
+                summary["matched"], summary["unmatchedBase"],
+                summary["unmatchedNew"], summary["resyncs"]
+            )
+        )
+
+        labels = results["labels"]
+        regressions = [row for row in labels if row["latencyDelta"] > 0][:top]
+        improvements = [row for row in reversed(labels) if row["latencyDelta"] < 0][:top]
+        for title, rows in (("Top regressions", regressions), ("Top improvements", improvements)):
+            print("")
+            print("%s (latency in cycles from fetch to commit):" % title)
+            print(
+                "%10s %8s %8s %8s %10s %10s %9s  %s" % (
+                    "PC", "count", "base", "new", "delta", "stall", "flushes", "instruction"
+                )
+            )
+            for row in rows:
+                print(
+                    "%10s %8d %8.2f %8.2f %+10d %+10d %+9d  %s" % (
+                        "-" if row["pc"] is None else "%08x" % row["pc"],
+                        row["count"], row["baseLatency"], row["newLatency"],
+                        row["latencyDelta"], row["stallDelta"],
+                        row["newFlushes"] - row["baseFlushes"],
+                        (row["label"] or "").partition(": ")[2]
+                    )
+                )
+
+        print("")
+        print("Top regions (%d bytes):" % results["regionSize"])
+        print("%10s %8s %10s %10s %9s" % ("region", "count", "delta", "stall", "flushes"))
+        for r in results["regions"][:top]:
+            print(
+                "%10s %8d %+10d %+10d %+9d" % (
+                    "-" if r["region"] is None else "%08x" % r["region"],
+                    r["count"], r["latencyDelta"], r["stallDelta"],
+                    r["newFlushes"] - r["baseFlushes"]
+                )
+            )
+
+    def Write(self, fileName, results):
+        """ Write results as JSON, or as CSV when 'fileName' ends with '.csv'. """
+        with open(fileName, "w") as file:
+            if not fileName.lower().endswith(".csv"):
+                json.dump(results, file, indent=2)
+                file.write("\n")
+                return
+            writer = csv.writer(file, lineterminator="\n")
+            columns = [
+                "count", "latencyDelta", "stallDelta", "baseFlushes", "newFlushes"
+            ]
+            writer.writerow(["scope", "pc", "label", "baseLatency", "newLatency"] + columns)
+            for row in results["labels"]:
+                writer.writerow(
+                    ["pc", row["pc"], row["label"], row["baseLatency"], row["newLatency"]] +
+                    [row[key] for key in columns]
+                )
+            for r in results["regions"]:
+                writer.writerow(
+                    ["region", r["region"], "", "", ""] + [r[key] for key in columns]
+                )
+
+
+#
+# The entry point of this program.
+#
+if __name__ == '__main__':
+    optionParser = OptionParser( usage="%prog [options] baseFileName newFileName" )
+    optionParser.add_option('-o', '--output',
+                  action='store', type='string', dest='output', default=None,
+                  help="Write all results to the specified file (.json or .csv).")
+    optionParser.add_option('-t', '--top',
+                  action='store', type='int', dest='top',
+                  default=PERFORMANCE_DIFF_DEFAULT_TOP,
+                  help="Report the specified number of top regressions.")
+    optionParser.add_option('-r', '--region-size',
+                  action='store', type='int', dest='regionSize',
+                  default=PERFORMANCE_DIFF_DEFAULT_REGION_SIZE,
+                  help="Sum differences in regions of the specified bytes of PCs.")
+    optionParser.add_option('-l', '--lookahead',
+                  action='store', type='int', dest='lookahead',
+                  default=PERFORMANCE_DIFF_LOOKAHEAD,
+                  help="Search the specified number of ops to align diverged logs.")
+    options, args = optionParser.parse_args()
+
+    if ( len(args) < 2 ):
+        print( "usage: %(exe)s [options] baseFileName newFileName" % { 'exe': sys.argv[0] } )
+        exit(1)
+
+    diff = PerformanceDiff( options.lookahead )
+    try:
+        diff.Compare( args[0], args[1] )
+    except IOError as err:
+        print("I/O error: %s" % err)
+        exit(1)
+
+    results = diff.GetResults( options.regionSize )
+    diff.Print( results, options.top )
+    if options.output is not None:
+        diff.Write( options.output, results )
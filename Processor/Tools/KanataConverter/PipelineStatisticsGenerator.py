@@ -0,0 +1,360 @@
+# -*- coding: utf-8 -*-
+
+#
+# This script computes pipeline statistics from a RSD log.
+#
+# PipelineStatisticsGenerator has the same OnCycle/OnEvent interface as
+# KanataGenerator, and is driven by RSD_Parser in the same way. It computes:
+#
+#   cycles, retired, ipc:
+#       The number of cycles, retired ops and IPC of a whole log.
+#   ipcWindows:
+#       IPC in sliding windows of 'window' cycles, stepped by 'step'
+#       cycles. The number of windows and the minimum and maximum IPC of
+#       them are kept. With '--ipc-series', each window is also written as
+#       a CSV row of (the first cycle of a window, IPC) when it is closed,
+#       so that a series of a long log is not held in memory.
+#   stages:
+#       Statistics for each stage in KANATA_CONVERTER_STAGE_NAME_TABLE:
+#         occupancy:      The average number of ops in a stage per cycle.
+#         latency:        The average cycles an op stays in a stage.
+#         stallCycles:    The total cycles ops stall in a stage.
+#         stallHistogram: The number of stalls by their cycles. Cycles are
+#                         binned by powers of 2 ("1", "2-3", "4-7", ...).
+#                         A stall that ends in the cycle it begins, e.g.
+#                         by a flush, is counted in "0".
+#         flushes:        The number of ops flushed in a stage.
+#   flushes:
+#       The number of flushed ops.
+#   renameToCommitCycles:
+#       The average cycles from Rn to Cm of retired ops.
+#
+# Results are written as JSON, or as CSV rows of (metric, stage, key, value)
+# when an output file name ends with '.csv'.
+#
+# Usage:
+#   python3 PipelineStatisticsGenerator.py [options] inputFileName outputFileName
+#
+
+import sys
+import csv
+import json
+import collections
+from optparse import OptionParser
+
+from RSD_Event import RSD_Event
+from KanataGenerator import KANATA_CONVERTER_STAGE_NAME_TABLE
+from KanataGenerator import KANATA_CONVERTER_GID_WRAP_AROUND
+from KanataGenerator import KANATA_CONVERTER_RETIREMENT_STAGE_ID
+
+#
+# Global constants
+#
+PIPELINE_STATISTICS_RENAME_STAGE_ID = KANATA_CONVERTER_STAGE_NAME_TABLE.index("Rn")
+PIPELINE_STATISTICS_COMMIT_STAGE_ID = KANATA_CONVERTER_RETIREMENT_STAGE_ID
+
+PIPELINE_STATISTICS_DEFAULT_IPC_WINDOW = 1000
+PIPELINE_STATISTICS_DEFAULT_IPC_STEP = 100
+
+
+class PipelineStatisticsGenerator(object):
+    """ Compute pipeline statistics from parsed results. """
+
+    class Op(object):
+        """ A state of an in-flight op. """
+        __slots__ = ("gid", "stageID", "stageBegin", "stallStageID", "stallBegin", "renameCycle")
+
+        def __init__(self, gid):
+            self.gid = gid
+            self.stageID = None
+            self.stageBegin = None
+            self.stallStageID = None
+            self.stallBegin = None
+            self.renameCycle = None
+
+    def __init__(self, ipcWindow=PIPELINE_STATISTICS_DEFAULT_IPC_WINDOW,
+                 ipcStep=PIPELINE_STATISTICS_DEFAULT_IPC_STEP):
+        self.outputFileName_ = ""
+
+        # gid -> Op. See opMap_ in KanataGenerator.py
+        self.ops_ = [None] * KANATA_CONVERTER_GID_WRAP_AROUND
+        self.opsWatermark_ = -KANATA_CONVERTER_GID_WRAP_AROUND
+
+        self.firstCycle_ = None
+        self.currentCycle_ = None
+        self.retired_ = 0
+        self.flushes_ = 0
+        self.renameToCommitCycles_ = 0
+        self.renameToCommitOps_ = 0
+
+        stageNum = len(KANATA_CONVERTER_STAGE_NAME_TABLE)
+        self.stageCycles_ = [0] * stageNum
+        self.stageVisits_ = [0] * stageNum
+        self.stallCycles_ = [0] * stageNum
+        self.stallHistograms_ = [collections.Counter() for i in range(stageNum)]
+        self.stageFlushes_ = [0] * stageNum
+
+        # IPC windows consist of buckets of 'ipcStep' cycles.
+        if ipcWindow < ipcStep or ipcWindow % ipcStep != 0:
+            raise ValueError("An IPC window must be a multiple of its step.")
+        self.ipcWindow_ = ipcWindow
+        self.ipcStep_ = ipcStep
+        self.ipcBuckets_ = collections.deque(maxlen=ipcWindow // ipcStep)
+        self.ipcBucketSum_ = 0
+        self.ipcBucket_ = None      # An index of a current bucket
+        self.ipcBucketRetired_ = 0
+        self.ipcWindowNum_ = 0
+        self.ipcMin_ = None
+        self.ipcMax_ = None
+        self.ipcSeriesFile_ = None
+        self.ipcSeriesWriter_ = None
+
+        # Event handlers indexed by an event type.
+        handlers = {
+            RSD_Event.INIT: self.OnInitialize_,
+            RSD_Event.STAGE_BEGIN: self.OnStageBegin_,
+            RSD_Event.STAGE_END: self.OnStageEnd_,
+            RSD_Event.STALL_BEGIN: self.OnStallBegin_,
+            RSD_Event.STALL_END: self.OnStallEnd_,
+            RSD_Event.RETIRE: self.OnRetire_,
+            RSD_Event.FLUSH: self.OnFlush_,
+            RSD_Event.LABEL: None,
+        }
+        self.eventHandlers_ = [handlers[type] for type in range(len(handlers))]
+
+    #
+    # File open/close
+    # Results are written when a generator is closed. An IPC series is
+    # written while a log is parsed.
+    #
+    def Open(self, fileName, ipcSeriesFileName=None):
+        self.outputFileName_ = fileName
+        if ipcSeriesFileName is not None:
+            self.ipcSeriesFile_ = open(ipcSeriesFileName, "w")
+            self.ipcSeriesWriter_ = csv.writer(self.ipcSeriesFile_, lineterminator="\n")
+            self.ipcSeriesWriter_.writerow(["cycle", "ipc"])
+
+    def Close(self):
+        if self.ipcSeriesFile_ is not None:
+            self.ipcSeriesFile_.close()
+            self.ipcSeriesFile_ = None
+            self.ipcSeriesWriter_ = None
+        if self.outputFileName_ == "":
+            return
+        results = self.GetResults()
+        with open(self.outputFileName_, "w") as file:
+            if self.outputFileName_.lower().endswith(".csv"):
+                self.WriteCSV_(file, results)
+            else:
+                json.dump(results, file, indent=2)
+                file.write("\n")
+        self.outputFileName_ = ""
+
+    #
+    # Interface for RSD_Parser
+    #
+    def OnCycle(self, cycle):
+        """ This method is called from RSD_Parser """
+        if self.firstCycle_ is None:
+            self.firstCycle_ = cycle
+            self.ipcBucket_ = cycle // self.ipcStep_
+        bucket = cycle // self.ipcStep_
+        while self.ipcBucket_ < bucket:
+            self.CloseIPC_Bucket_()
+        self.currentCycle_ = cycle
+
+    def OnEvent(self, event):
+        """ This method is called from RSD_Parser """
+        handler = self.eventHandlers_[event.type]
+        if handler is None:
+            return
+        op = self.ops_[event.gid % KANATA_CONVERTER_GID_WRAP_AROUND]
+        if op is not None and op.gid == event.gid:
+            handler(event, op)
+        elif event.type == RSD_Event.INIT:
+            handler(event, None)
+
+    def CloseIPC_Bucket_(self):
+        """ Close a current bucket and an IPC window ending with it. """
+        buckets = self.ipcBuckets_
+        if len(buckets) == buckets.maxlen:
+            self.ipcBucketSum_ -= buckets[0]
+        buckets.append(self.ipcBucketRetired_)
+        self.ipcBucketSum_ += self.ipcBucketRetired_
+        self.ipcBucketRetired_ = 0
+        self.ipcBucket_ += 1
+        if len(buckets) == buckets.maxlen:
+            ipc = float(self.ipcBucketSum_) / self.ipcWindow_
+            self.ipcWindowNum_ += 1
+            if self.ipcMin_ is None or ipc < self.ipcMin_:
+                self.ipcMin_ = ipc
+            if self.ipcMax_ is None or ipc > self.ipcMax_:
+                self.ipcMax_ = ipc
+            if self.ipcSeriesWriter_ is not None:
+                self.ipcSeriesWriter_.writerow(
+                    [self.ipcBucket_ * self.ipcStep_ - self.ipcWindow_, ipc]
+                )
+
+    def DisposeOps_(self, gid):
+        """ Delete ops older than 'gid'. See DisposeOps_ in KanataGenerator.py """
+        W = KANATA_CONVERTER_GID_WRAP_AROUND
+        ops = self.ops_
+        for g in range(max(self.opsWatermark_, gid - W), gid):
+            op = ops[g % W]
+            if op is not None and op.gid < gid:
+                ops[g % W] = None
+        self.opsWatermark_ = max(self.opsWatermark_, gid)
+
+    #
+    # Event handlers
+    # 'op' is a state of an event op. It is None when INIT adds a new op.
+    #
+    def OnInitialize_(self, event, op):
+        self.ops_[event.gid % KANATA_CONVERTER_GID_WRAP_AROUND] = self.Op(event.gid)
+
+    def OnStageBegin_(self, event, op):
+        stageID = event.stageID
+        cycle = self.currentCycle_
+        if op.stageID != stageID:
+            # A stage is ended and begun again when stalling ends, and it is
+            # not counted as a new visit.
+            self.stageVisits_[stageID] += 1
+            if stageID == PIPELINE_STATISTICS_RENAME_STAGE_ID:
+                op.renameCycle = cycle
+            elif stageID == PIPELINE_STATISTICS_COMMIT_STAGE_ID and op.renameCycle is not None:
+                self.renameToCommitCycles_ += cycle - op.renameCycle
+                self.renameToCommitOps_ += 1
+        op.stageID = stageID
+        op.stageBegin = cycle
+
+    def OnStageEnd_(self, event, op):
+        if op.stageBegin is not None:
+            self.stageCycles_[event.stageID] += self.currentCycle_ - op.stageBegin
+            op.stageBegin = None
+
+    def OnStallBegin_(self, event, op):
+        op.stallStageID = event.stageID
+        op.stallBegin = self.currentCycle_
+
+    def OnStallEnd_(self, event, op):
+        if op.stallBegin is not None:
+            cycles = self.currentCycle_ - op.stallBegin
+            self.stallCycles_[op.stallStageID] += cycles
+            self.stallHistograms_[op.stallStageID][cycles.bit_length()] += 1
+            op.stallBegin = None
+
+    def OnRetire_(self, event, op):
+        self.retired_ += 1
+        self.ipcBucketRetired_ += 1
+        self.DisposeOps_(event.gid + 1)
+
+    def OnFlush_(self, event, op):
+        self.flushes_ += 1
+        self.stageFlushes_[event.stageID] += 1
+        # A stall is ended by a flush.
+        self.OnStallEnd_(event, op)
+        self.ops_[event.gid % KANATA_CONVERTER_GID_WRAP_AROUND] = None
+
+    #
+    # Results
+    #
+    def GetResults(self):
+        """ Return results as a dictionary. """
+        if self.firstCycle_ is None:
+            cycles = 0
+        else:
+            cycles = self.currentCycle_ - self.firstCycle_ + 1
+
+        stages = collections.OrderedDict()
+        for i, name in enumerate(KANATA_CONVERTER_STAGE_NAME_TABLE):
+            stages[name] = collections.OrderedDict([
+                ("occupancy", self.Divide_(self.stageCycles_[i], cycles)),
+                ("latency", self.Divide_(self.stageCycles_[i], self.stageVisits_[i])),
+                ("stallCycles", self.stallCycles_[i]),
+                ("stallHistogram", collections.OrderedDict(
+                    (self.GetBinName_(bin), self.stallHistograms_[i][bin])
+                    for bin in sorted(self.stallHistograms_[i])
+                )),
+                ("flushes", self.stageFlushes_[i]),
+            ])
+
+        return collections.OrderedDict([
+            ("cycles", cycles),
+            ("retired", self.retired_),
+            ("ipc", self.Divide_(self.retired_, cycles)),
+            ("ipcWindows", collections.OrderedDict([
+                ("window", self.ipcWindow_),
+                ("step", self.ipcStep_),
+                ("windows", self.ipcWindowNum_),
+                ("min", self.ipcMin_),
+                ("max", self.ipcMax_),
+            ])),
+            ("stages", stages),
+            ("flushes", self.flushes_),
+            ("renameToCommitCycles",
+             self.Divide_(self.renameToCommitCycles_, self.renameToCommitOps_)),
+        ])
+
+    def Divide_(self, a, b):
+        return float(a) / b if b != 0 else 0.0
+
+    def GetBinName_(self, bin):
+        """ Return a name of a histogram bin of cycles with 'bin' bits. """
+        if bin == 0:
+            return "0"  # A stall of 0 cycles
+        low = 1 << (bin - 1)
+        high = (1 << bin) - 1
+        return "%d" % low if low == high else "%d-%d" % (low, high)
+
+    def WriteCSV_(self, file, results):
+        """ Write results as rows of (metric, stage, key, value). """
+        writer = csv.writer(file, lineterminator="\n")
+        writer.writerow(["metric", "stage", "key", "value"])
+        for metric in ("cycles", "retired", "ipc", "flushes", "renameToCommitCycles"):
+            writer.writerow([metric, "", "", results[metric]])
+        for key in ("window", "step", "windows", "min", "max"):
+            writer.writerow(["ipcWindows", "", key, results["ipcWindows"][key]])
+        for name, stage in results["stages"].items():
+            for metric in ("occupancy", "latency", "stallCycles", "flushes"):
+                writer.writerow([metric, name, "", stage[metric]])
+            for bin, count in stage["stallHistogram"].items():
+                writer.writerow(["stallHistogram", name, bin, count])
+
+
+#
+# The entry point of this program.
+#
+if __name__ == '__main__':
+    from RSD_Parser import RSD_Parser, RSD_ParserError
+
+    optionParser = OptionParser( usage="%prog [options] inputFileName outputFileName" )
+    optionParser.add_option('-w', '--ipc-window',
+                  action='store', type='int', dest='ipcWindow',
+                  default=PIPELINE_STATISTICS_DEFAULT_IPC_WINDOW,
+                  help="Compute IPC in windows of the specified number of cycles.")
+    optionParser.add_option('-s', '--ipc-step',
+                  action='store', type='int', dest='ipcStep',
+                  default=PIPELINE_STATISTICS_DEFAULT_IPC_STEP,
+                  help="Slide IPC windows by the specified number of cycles.")
+    optionParser.add_option('-i', '--ipc-series',
+                  action='store', type='string', dest='ipcSeries', default=None,
+                  help="Write IPC of each window to the specified CSV file.")
+    options, args = optionParser.parse_args()
+
+    if ( len(args) < 2 ):
+        print( "usage: %(exe)s [options] inputFileName outputFileName" % { 'exe': sys.argv[0] } )
+        exit(1)
+
+    parser = RSD_Parser()
+    generator = PipelineStatisticsGenerator( options.ipcWindow, options.ipcStep )
+    try:
+        parser.Open( args[0] )
+        generator.Open( args[1], options.ipcSeries )
+        parser.Parse( generator )
+    except IOError as err:
+        print("I/O error: %s" % err)
+    except RSD_ParserError as err:
+        print(err)
+    finally:
+        parser.Close()
+        generator.Close()
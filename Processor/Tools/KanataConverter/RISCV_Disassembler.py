@@ -1,12 +1,262 @@
 # -*- coding: utf-8 -*-
 
+#
+# A table-driven RISC-V (RV32IMF) disassembler.
+#
+# An instruction word is decoded into a RISCV_Instruction record by looking
+# up tables keyed by opcode/funct3/funct7, which are built at import time.
+# Records can be used to classify instructions as well as to print them.
+#
+
 import sys
 import re
 import pprint
+import collections
+
+
+# A decoded instruction.
+#   mnemonic: 'addi', 'lw', ... or 'Unknown'/'unknown ...' for invalid words.
+#   layout:   An operand layout (RISCV_LAYOUT_*), which determines
+#             operands and their register files in the text.
+#   rd, rs1, rs2, rs3: Register numbers. They are decoded for any layout.
+#   imm:      A sign-extended immediate. It is a CSR number for CSR
+#             instructions, pred/succ bits for fence, and a whole word for
+#             an unknown opcode.
+RISCV_Instruction = collections.namedtuple(
+    "RISCV_Instruction", ["mnemonic", "layout", "rd", "rs1", "rs2", "rs3", "imm"]
+)
+
+#
+# Operand layouts
+#
+RISCV_LAYOUT_NONE = 0           # ecall
+RISCV_LAYOUT_UNKNOWN = 1        # unknown <word>
+RISCV_LAYOUT_LOAD = 2           # lw rd, imm(rs1)
+RISCV_LAYOUT_STORE = 3          # sw rs2, imm(rs1)
+RISCV_LAYOUT_BRANCH = 4         # beq rs1, rs2, imm
+RISCV_LAYOUT_RD_IMM = 5         # lui rd, imm
+RISCV_LAYOUT_RD_RS1_IMM = 6     # addi rd, rs1, imm
+RISCV_LAYOUT_RD_RS1_RS2 = 7     # add rd, rs1, rs2
+RISCV_LAYOUT_RS1_RS2 = 8        # sfence.vma rs1, rs2
+RISCV_LAYOUT_FENCE = 9          # fence <pred/succ bits>
+RISCV_LAYOUT_CSR = 10           # csrrw rd, csr, rs1
+RISCV_LAYOUT_CSR_IMM = 11       # csrrwi rd, csr, zimm
+RISCV_LAYOUT_F_LOAD = 12        # flw frd, imm(rs1)
+RISCV_LAYOUT_F_STORE = 13       # fsw frs2, imm(rs1)
+RISCV_LAYOUT_FRD_FRS1 = 14      # fsqrt.s frd, frs1
+RISCV_LAYOUT_FRD_FRS1_FRS2 = 15 # fadd.s frd, frs1, frs2
+RISCV_LAYOUT_FRD_FRS1_FRS2_FRS3 = 16    # fmadd.s frd, frs1, frs2, frs3
+RISCV_LAYOUT_RD_FRS1 = 17       # fmv.x.w rd, frs1
+RISCV_LAYOUT_RD_FRS1_FRS2 = 18  # feq.s rd, frs1, frs2
+RISCV_LAYOUT_FRD_RS1 = 19       # fmv.w.x frd, rs1
+
+#
+# Opcodes
+#
+RISCV_OC_LOAD     = 0b0000011
+RISCV_OC_STORE    = 0b0100011
+RISCV_OC_BRANCH   = 0b1100011
+RISCV_OC_JALR     = 0b1100111
+RISCV_OC_JAL      = 0b1101111
+RISCV_OC_OP_IMM   = 0b0010011
+RISCV_OC_OP       = 0b0110011
+RISCV_OC_AUIPC    = 0b0010111
+RISCV_OC_LUI      = 0b0110111
+RISCV_OC_MISC_MEM = 0b0001111
+RISCV_OC_SYSTEM   = 0b1110011
+RISCV_OC_F_LOAD   = 0b0000111
+RISCV_OC_F_STORE  = 0b0100111
+RISCV_OC_F_OP     = 0b1010011
+RISCV_OC_F_FMADD  = 0b1000011
+RISCV_OC_F_FMSUB  = 0b1000111
+RISCV_OC_F_FNMSUB = 0b1001011
+RISCV_OC_F_FNMADD = 0b1001111
+
+#
+# Immediate formats
+#
+RISCV_IMM_NONE = 0
+RISCV_IMM_I = 1
+RISCV_IMM_S = 2
+RISCV_IMM_B = 3
+RISCV_IMM_U = 4
+RISCV_IMM_J = 5
+RISCV_IMM_SHAMT = 6     # shamt[4:0]
+RISCV_IMM_CSR = 7       # csr[11:0]
+RISCV_IMM_FENCE = 8     # pred/succ[7:0]
+
+# Decoding rules.
+# (opcode, funct3, funct7, rs2, mnemonic, layout, immediate)
+# None in funct3/funct7/rs2 matches any value. A rule overrides preceding
+# rules that match the same words, so each opcode begins with a default.
+# funct7 of R4-type instructions includes rs3, and rs2 of SYSTEM includes
+# the lower bits of funct12.
+RISCV_DECODE_RULES = [
+    (RISCV_OC_LOAD, None, None, None, "Unknown", RISCV_LAYOUT_LOAD, RISCV_IMM_I),
+    (RISCV_OC_LOAD, 0b000, None, None, "lb", RISCV_LAYOUT_LOAD, RISCV_IMM_I),
+    (RISCV_OC_LOAD, 0b001, None, None, "lh", RISCV_LAYOUT_LOAD, RISCV_IMM_I),
+    (RISCV_OC_LOAD, 0b010, None, None, "lw", RISCV_LAYOUT_LOAD, RISCV_IMM_I),
+    (RISCV_OC_LOAD, 0b100, None, None, "lbu", RISCV_LAYOUT_LOAD, RISCV_IMM_I),
+    (RISCV_OC_LOAD, 0b101, None, None, "lhu", RISCV_LAYOUT_LOAD, RISCV_IMM_I),
+    (RISCV_OC_LOAD, 0b110, None, None, "lwu", RISCV_LAYOUT_LOAD, RISCV_IMM_I),
+
+    (RISCV_OC_STORE, None, None, None, "Unknown", RISCV_LAYOUT_STORE, RISCV_IMM_S),
+    (RISCV_OC_STORE, 0b000, None, None, "sb", RISCV_LAYOUT_STORE, RISCV_IMM_S),
+    (RISCV_OC_STORE, 0b001, None, None, "sh", RISCV_LAYOUT_STORE, RISCV_IMM_S),
+    (RISCV_OC_STORE, 0b010, None, None, "sw", RISCV_LAYOUT_STORE, RISCV_IMM_S),
+
+    (RISCV_OC_BRANCH, None, None, None, "Unknown", RISCV_LAYOUT_BRANCH, RISCV_IMM_B),
+    (RISCV_OC_BRANCH, 0b000, None, None, "beq", RISCV_LAYOUT_BRANCH, RISCV_IMM_B),
+    (RISCV_OC_BRANCH, 0b001, None, None, "bne", RISCV_LAYOUT_BRANCH, RISCV_IMM_B),
+    (RISCV_OC_BRANCH, 0b100, None, None, "blt", RISCV_LAYOUT_BRANCH, RISCV_IMM_B),
+    (RISCV_OC_BRANCH, 0b101, None, None, "bge", RISCV_LAYOUT_BRANCH, RISCV_IMM_B),
+    (RISCV_OC_BRANCH, 0b110, None, None, "bltu", RISCV_LAYOUT_BRANCH, RISCV_IMM_B),
+    (RISCV_OC_BRANCH, 0b111, None, None, "bgeu", RISCV_LAYOUT_BRANCH, RISCV_IMM_B),
+
+    (RISCV_OC_JALR, None, None, None, "jalr", RISCV_LAYOUT_LOAD, RISCV_IMM_I),
+    (RISCV_OC_JAL, None, None, None, "jal", RISCV_LAYOUT_RD_IMM, RISCV_IMM_J),
+
+    (RISCV_OC_OP_IMM, None, None, None, "Unknown", RISCV_LAYOUT_RD_RS1_IMM, RISCV_IMM_I),
+    (RISCV_OC_OP_IMM, 0b000, None, None, "addi", RISCV_LAYOUT_RD_RS1_IMM, RISCV_IMM_I),
+    (RISCV_OC_OP_IMM, 0b010, None, None, "slti", RISCV_LAYOUT_RD_RS1_IMM, RISCV_IMM_I),
+    (RISCV_OC_OP_IMM, 0b011, None, None, "sltiu", RISCV_LAYOUT_RD_RS1_IMM, RISCV_IMM_I),
+    (RISCV_OC_OP_IMM, 0b100, None, None, "xori", RISCV_LAYOUT_RD_RS1_IMM, RISCV_IMM_I),
+    (RISCV_OC_OP_IMM, 0b110, None, None, "ori", RISCV_LAYOUT_RD_RS1_IMM, RISCV_IMM_I),
+    (RISCV_OC_OP_IMM, 0b111, None, None, "andi", RISCV_LAYOUT_RD_RS1_IMM, RISCV_IMM_I),
+    (RISCV_OC_OP_IMM, 0b001, 0b0000000, None, "slli", RISCV_LAYOUT_RD_RS1_IMM, RISCV_IMM_SHAMT),
+    (RISCV_OC_OP_IMM, 0b101, 0b0000000, None, "srli", RISCV_LAYOUT_RD_RS1_IMM, RISCV_IMM_SHAMT),
+    (RISCV_OC_OP_IMM, 0b101, 0b0100000, None, "srai", RISCV_LAYOUT_RD_RS1_IMM, RISCV_IMM_SHAMT),
+
+    (RISCV_OC_OP, None, None, None, "Unknown", RISCV_LAYOUT_RD_RS1_RS2, RISCV_IMM_NONE),
+    (RISCV_OC_OP, 0b000, 0b0000000, None, "add", RISCV_LAYOUT_RD_RS1_RS2, RISCV_IMM_NONE),
+    (RISCV_OC_OP, 0b000, 0b0100000, None, "sub", RISCV_LAYOUT_RD_RS1_RS2, RISCV_IMM_NONE),
+    (RISCV_OC_OP, 0b001, 0b0000000, None, "sll", RISCV_LAYOUT_RD_RS1_RS2, RISCV_IMM_NONE),
+    (RISCV_OC_OP, 0b010, 0b0000000, None, "slt", RISCV_LAYOUT_RD_RS1_RS2, RISCV_IMM_NONE),
+    (RISCV_OC_OP, 0b011, 0b0000000, None, "sltu", RISCV_LAYOUT_RD_RS1_RS2, RISCV_IMM_NONE),
+    (RISCV_OC_OP, 0b100, 0b0000000, None, "xor", RISCV_LAYOUT_RD_RS1_RS2, RISCV_IMM_NONE),
+    (RISCV_OC_OP, 0b101, 0b0000000, None, "srl", RISCV_LAYOUT_RD_RS1_RS2, RISCV_IMM_NONE),
+    (RISCV_OC_OP, 0b101, 0b0100000, None, "sra", RISCV_LAYOUT_RD_RS1_RS2, RISCV_IMM_NONE),
+    (RISCV_OC_OP, 0b110, 0b0000000, None, "or", RISCV_LAYOUT_RD_RS1_RS2, RISCV_IMM_NONE),
+    (RISCV_OC_OP, 0b111, 0b0000000, None, "and", RISCV_LAYOUT_RD_RS1_RS2, RISCV_IMM_NONE),
+    (RISCV_OC_OP, 0b000, 0b0000001, None, "mul", RISCV_LAYOUT_RD_RS1_RS2, RISCV_IMM_NONE),
+    (RISCV_OC_OP, 0b001, 0b0000001, None, "mulh", RISCV_LAYOUT_RD_RS1_RS2, RISCV_IMM_NONE),
+    (RISCV_OC_OP, 0b010, 0b0000001, None, "mulhsu", RISCV_LAYOUT_RD_RS1_RS2, RISCV_IMM_NONE),
+    (RISCV_OC_OP, 0b011, 0b0000001, None, "mulhu", RISCV_LAYOUT_RD_RS1_RS2, RISCV_IMM_NONE),
+    (RISCV_OC_OP, 0b100, 0b0000001, None, "div", RISCV_LAYOUT_RD_RS1_RS2, RISCV_IMM_NONE),
+    (RISCV_OC_OP, 0b101, 0b0000001, None, "divu", RISCV_LAYOUT_RD_RS1_RS2, RISCV_IMM_NONE),
+    (RISCV_OC_OP, 0b110, 0b0000001, None, "rem", RISCV_LAYOUT_RD_RS1_RS2, RISCV_IMM_NONE),
+    (RISCV_OC_OP, 0b111, 0b0000001, None, "remu", RISCV_LAYOUT_RD_RS1_RS2, RISCV_IMM_NONE),
+
+    (RISCV_OC_AUIPC, None, None, None, "auipc", RISCV_LAYOUT_RD_IMM, RISCV_IMM_U),
+    (RISCV_OC_LUI, None, None, None, "lui", RISCV_LAYOUT_RD_IMM, RISCV_IMM_U),
+
+    (RISCV_OC_MISC_MEM, None, None, None, "unknown misc mem", RISCV_LAYOUT_NONE, RISCV_IMM_NONE),
+    (RISCV_OC_MISC_MEM, 0b000, None, None, "fence", RISCV_LAYOUT_FENCE, RISCV_IMM_FENCE),
+    (RISCV_OC_MISC_MEM, 0b001, None, None, "fence.i", RISCV_LAYOUT_NONE, RISCV_IMM_NONE),
+
+    (RISCV_OC_SYSTEM, None, None, None, "unknown system", RISCV_LAYOUT_NONE, RISCV_IMM_NONE),
+    (RISCV_OC_SYSTEM, 0b000, 0b0000000, 0b00000, "ecall", RISCV_LAYOUT_NONE, RISCV_IMM_NONE),
+    (RISCV_OC_SYSTEM, 0b000, 0b0000000, 0b00001, "ebreak", RISCV_LAYOUT_NONE, RISCV_IMM_NONE),
+    (RISCV_OC_SYSTEM, 0b000, 0b0000000, 0b00010, "uret", RISCV_LAYOUT_NONE, RISCV_IMM_NONE),
+    (RISCV_OC_SYSTEM, 0b000, 0b0001000, 0b00010, "sret", RISCV_LAYOUT_NONE, RISCV_IMM_NONE),
+    (RISCV_OC_SYSTEM, 0b000, 0b0011000, 0b00010, "mret", RISCV_LAYOUT_NONE, RISCV_IMM_NONE),
+    (RISCV_OC_SYSTEM, 0b000, 0b0001000, 0b00101, "wfi", RISCV_LAYOUT_NONE, RISCV_IMM_NONE),
+    (RISCV_OC_SYSTEM, 0b000, 0b0001001, None, "sfence.vma", RISCV_LAYOUT_RS1_RS2, RISCV_IMM_NONE),
+    (RISCV_OC_SYSTEM, 0b001, None, None, "csrrw", RISCV_LAYOUT_CSR, RISCV_IMM_CSR),
+    (RISCV_OC_SYSTEM, 0b010, None, None, "csrrs", RISCV_LAYOUT_CSR, RISCV_IMM_CSR),
+    (RISCV_OC_SYSTEM, 0b011, None, None, "csrrc", RISCV_LAYOUT_CSR, RISCV_IMM_CSR),
+    (RISCV_OC_SYSTEM, 0b101, None, None, "csrrwi", RISCV_LAYOUT_CSR_IMM, RISCV_IMM_CSR),
+    (RISCV_OC_SYSTEM, 0b110, None, None, "csrrsi", RISCV_LAYOUT_CSR_IMM, RISCV_IMM_CSR),
+    (RISCV_OC_SYSTEM, 0b111, None, None, "csrrci", RISCV_LAYOUT_CSR_IMM, RISCV_IMM_CSR),
+
+    (RISCV_OC_F_LOAD, None, None, None, "Unknown", RISCV_LAYOUT_F_LOAD, RISCV_IMM_I),
+    (RISCV_OC_F_LOAD, 0b010, None, None, "flw", RISCV_LAYOUT_F_LOAD, RISCV_IMM_I),
+    (RISCV_OC_F_STORE, None, None, None, "Unknown", RISCV_LAYOUT_F_STORE, RISCV_IMM_S),
+    (RISCV_OC_F_STORE, 0b010, None, None, "fsw", RISCV_LAYOUT_F_STORE, RISCV_IMM_S),
+
+    (RISCV_OC_F_OP, None, None, None, "unknown fop", RISCV_LAYOUT_FRD_FRS1_FRS2, RISCV_IMM_NONE),
+    (RISCV_OC_F_OP, None, 0b0000000, None, "fadd.s", RISCV_LAYOUT_FRD_FRS1_FRS2, RISCV_IMM_NONE),
+    (RISCV_OC_F_OP, None, 0b0000100, None, "fsub.s", RISCV_LAYOUT_FRD_FRS1_FRS2, RISCV_IMM_NONE),
+    (RISCV_OC_F_OP, None, 0b0001000, None, "fmul.s", RISCV_LAYOUT_FRD_FRS1_FRS2, RISCV_IMM_NONE),
+    (RISCV_OC_F_OP, None, 0b0001100, None, "fdiv.s", RISCV_LAYOUT_FRD_FRS1_FRS2, RISCV_IMM_NONE),
+    (RISCV_OC_F_OP, None, 0b0101100, None, "fsqrt.s", RISCV_LAYOUT_FRD_FRS1, RISCV_IMM_NONE),
+    (RISCV_OC_F_OP, 0b000, 0b0010000, None, "fsgnj.s", RISCV_LAYOUT_FRD_FRS1_FRS2, RISCV_IMM_NONE),
+    (RISCV_OC_F_OP, 0b001, 0b0010000, None, "fsgnjn.s", RISCV_LAYOUT_FRD_FRS1_FRS2, RISCV_IMM_NONE),
+    (RISCV_OC_F_OP, 0b010, 0b0010000, None, "fsgnjx.s", RISCV_LAYOUT_FRD_FRS1_FRS2, RISCV_IMM_NONE),
+    (RISCV_OC_F_OP, 0b000, 0b0010100, None, "fmin.s", RISCV_LAYOUT_FRD_FRS1_FRS2, RISCV_IMM_NONE),
+    (RISCV_OC_F_OP, 0b001, 0b0010100, None, "fmax.s", RISCV_LAYOUT_FRD_FRS1_FRS2, RISCV_IMM_NONE),
+    (RISCV_OC_F_OP, None, 0b1100000, None, "unknoen fop", RISCV_LAYOUT_RD_FRS1, RISCV_IMM_NONE),
+    (RISCV_OC_F_OP, None, 0b1100000, 0b00000, "fcvt.w.s", RISCV_LAYOUT_RD_FRS1, RISCV_IMM_NONE),
+    (RISCV_OC_F_OP, None, 0b1100000, 0b00001, "fcvt.wu.s", RISCV_LAYOUT_RD_FRS1, RISCV_IMM_NONE),
+    (RISCV_OC_F_OP, None, 0b1110000, None, "unknown fop", RISCV_LAYOUT_RD_FRS1, RISCV_IMM_NONE),
+    (RISCV_OC_F_OP, 0b000, 0b1110000, None, "fmv.x.w", RISCV_LAYOUT_RD_FRS1, RISCV_IMM_NONE),
+    (RISCV_OC_F_OP, 0b001, 0b1110000, None, "fclass.s", RISCV_LAYOUT_RD_FRS1, RISCV_IMM_NONE),
+    (RISCV_OC_F_OP, None, 0b1010000, None, "unknown fop", RISCV_LAYOUT_RD_FRS1_FRS2, RISCV_IMM_NONE),
+    (RISCV_OC_F_OP, 0b010, 0b1010000, None, "feq.s", RISCV_LAYOUT_RD_FRS1_FRS2, RISCV_IMM_NONE),
+    (RISCV_OC_F_OP, 0b001, 0b1010000, None, "flt.s", RISCV_LAYOUT_RD_FRS1_FRS2, RISCV_IMM_NONE),
+    (RISCV_OC_F_OP, 0b000, 0b1010000, None, "fle.s", RISCV_LAYOUT_RD_FRS1_FRS2, RISCV_IMM_NONE),
+    (RISCV_OC_F_OP, None, 0b1101000, None, "unknown fop", RISCV_LAYOUT_FRD_RS1, RISCV_IMM_NONE),
+    (RISCV_OC_F_OP, None, 0b1101000, 0b00000, "fcvt.s.w", RISCV_LAYOUT_FRD_RS1, RISCV_IMM_NONE),
+    (RISCV_OC_F_OP, None, 0b1101000, 0b00001, "fcvt.s.wu", RISCV_LAYOUT_FRD_RS1, RISCV_IMM_NONE),
+    (RISCV_OC_F_OP, None, 0b1111000, None, "fmv.w.x", RISCV_LAYOUT_FRD_RS1, RISCV_IMM_NONE),
+]
+
+# R4-type instructions are valid when funct2 (the lower 2 bits of funct7) is 0.
+for opcode, mnemonic in [
+    (RISCV_OC_F_FMADD, "fmadd.s"), (RISCV_OC_F_FMSUB, "fmsub.s"),
+    (RISCV_OC_F_FNMSUB, "fnmsub.s"), (RISCV_OC_F_FNMADD, "fnmadd.s")
+]:
+    RISCV_DECODE_RULES.append(
+        (opcode, None, None, None, "Unknown", RISCV_LAYOUT_FRD_FRS1_FRS2_FRS3, RISCV_IMM_NONE)
+    )
+    for rs3 in range(32):
+        RISCV_DECODE_RULES.append(
+            (opcode, None, rs3 << 2, None, mnemonic, RISCV_LAYOUT_FRD_FRS1_FRS2_FRS3, RISCV_IMM_NONE)
+        )
+
+
+def BuildDecodeTable_(rules):
+    """ Build a decode table from RISCV_DECODE_RULES.
+    The table is indexed by (funct7 << 10 | funct3 << 7 | opcode). An entry
+    is (mnemonic, layout, immediate), or a list of such tuples indexed by
+    rs2 when rs2 distinguishes instructions.
+    """
+    table = [None] * (1 << 17)
+    for opcode, funct3, funct7, rs2, mnemonic, layout, imm in rules:
+        entry = (mnemonic, layout, imm)
+        for f7 in range(128) if funct7 is None else (funct7,):
+            for f3 in range(8) if funct3 is None else (funct3,):
+                index = f7 << 10 | f3 << 7 | opcode
+                if rs2 is None:
+                    table[index] = entry
+                else:
+                    subTable = table[index]
+                    if not isinstance(subTable, list):
+                        # The entry is used for rs2 not in the rules.
+                        subTable = [subTable] * 32
+                        table[index] = subTable
+                    subTable[rs2] = entry
+    return table
+
+RISCV_DECODE_TABLE = BuildDecodeTable_(RISCV_DECODE_RULES)
 
 
 class RISCV_Disassembler( object ):
     """ 32bit RISCV disassembler """
+
+    intRegName = ['zero', 'ra', 'sp', 'gp', 'tp', 't0', 't1', 't2',
+                      's0/fp', 's1', 'a0', 'a1', 'a2', 'a3', 'a4', 'a5',
+                      'a6', 'a7', 's2', 's3', 's4', 's5', 's6', 's7',
+                      's8', 's9', 's10', 's11', 't3', 't4', 't5', 't6']
+
+    floatRegName = ['ft0', 'ft1', 'ft2', 'ft3', 'ft4', 'ft5', 'ft6', 'ft7',
+                      'fs0', 'fs1', 'fa0', 'fa1', 'fa2', 'fa3', 'fa4', 'fa5',
+                      'fa6', 'fa7', 'fs2', 'fs3', 'fs4', 'fs5', 'fs6', 'fs7',
+                      'fs8', 'fs9', 'fs10', 'fs11', 'ft8', 'ft9', 'ft10', 'ft11']
+
+    # Mnemonics printed differently from 'mnemonic + " "' before operands.
+    opTypeTable = { 'Unknown': 'Unknown', 'fence.i': 'fence.i ' }
+
     def __init__( self ):
         pass
 
@@ -16,646 +266,161 @@ class RISCV_Disassembler( object ):
                 return "invalid:" + codeStr
 
             code = int( codeStr, 16 )
-
-            common = self.InstructionCommon( code )
-            insn = common
-
-            if common.IsLoad():
-                insn = self.InstructionLoad( code )
-            elif common.IsStore():
-                insn = self.InstructionStore( code )
-            elif common.IsBranch():
-                insn = self.InstructionBranch( code )
-            elif common.IsJALR():
-                insn = self.InstructionJALR( code )
-            elif common.IsJAL():
-                insn = self.InstructionJAL( code )
-            elif common.IsOpImm():
-                insn = self.InstructionOpImm( code )
-            elif common.IsOp():
-                insn = self.InstructionOp( code )
-            elif common.IsAUIPC():
-                insn = self.InstructionAUIPC( code )
-            elif common.IsLUI():
-                insn = self.InstructionLUI( code )
-            elif common.IsMiscMem():
-                insn = self.InstructionMiscMem( code )
-            elif common.IsSystem():
-                insn = self.InstructionSystem( code )
-            elif common.IsFLoad():
-                insn = self.InstructionFLoad( code )
-            elif common.IsFStore():
-                insn = self.InstructionFStore( code )
-            elif common.IsFOp():
-                insn = self.InstructionFOp( code )
-            elif common.IsFMADD():
-                insn = self.InstructionFMADD( code )
-            elif common.IsFMSUB():
-                insn = self.InstructionFMSUB( code )
-            elif common.IsFNMSUB():
-                insn = self.InstructionFNMSUB( code )
-            elif common.IsFNMADD():
-                insn = self.InstructionFNMADD( code )
-            return insn.__str__()
+            return self.Format( self.Decode( code ) )
 
         except ValueError:
             return "invalid: %s" % codeStr
 
+    def Decode( self, code ):
+        """ Decode an instruction word to a RISCV_Instruction. """
+        word = code & 0xffffffff
+        rs2 = (word >> 20) & 0x1f
+        entry = RISCV_DECODE_TABLE[
+            (word >> 15) & 0x1fc00 | (word >> 5) & 0x380 | word & 0x7f
+        ]
+        if entry is None:
+            return RISCV_Instruction(
+                "unknown", RISCV_LAYOUT_UNKNOWN, 0, 0, 0, 0, code
+            )
+        if isinstance( entry, list ):
+            entry = entry[ rs2 ]
+        mnemonic, layout, immType = entry
+
+        if immType == RISCV_IMM_NONE:
+            imm = 0
+        elif immType == RISCV_IMM_I or immType == RISCV_IMM_CSR:
+            imm = word >> 20
+        elif immType == RISCV_IMM_S:
+            imm = (word >> 20) & 0xfe0 | (word >> 7) & 0x1f
+        elif immType == RISCV_IMM_B:
+            imm = (
+                (word >> 19) & 0x1000 | (word << 4) & 0x800 |
+                (word >> 20) & 0x7e0 | (word >> 7) & 0x1e
+            )
+        elif immType == RISCV_IMM_U:
+            imm = word & 0xfffff000
+        elif immType == RISCV_IMM_J:
+            imm = (
+                (word >> 11) & 0x100000 | word & 0xff000 |
+                (word >> 9) & 0x800 | (word >> 20) & 0x7fe
+            )
+        elif immType == RISCV_IMM_SHAMT:
+            imm = rs2
+        else:   # RISCV_IMM_FENCE
+            imm = (word >> 20) & 0xff
+
+        # Sign extension
+        if immType in (RISCV_IMM_I, RISCV_IMM_S) and imm & 0x800:
+            imm -= 0x1000
+        elif immType == RISCV_IMM_B and imm & 0x1000:
+            imm -= 0x2000
+        elif immType == RISCV_IMM_U and imm & 0x80000000:
+            imm -= 0x100000000
+        elif immType == RISCV_IMM_J and imm & 0x100000:
+            imm -= 0x200000
+
+        return RISCV_Instruction(
+            mnemonic, layout,
+            (word >> 7) & 0x1f, (word >> 15) & 0x1f, rs2, word >> 27, imm
+        )
+
+    def Format( self, insn ):
+        """ Convert a RISCV_Instruction to an assembly string. """
+        layout = insn.layout
+        if layout == RISCV_LAYOUT_UNKNOWN:
+            return "unknown %x" % insn.imm
+
+        opType = self.opTypeTable.get( insn.mnemonic )
+        if layout == RISCV_LAYOUT_NONE:
+            return insn.mnemonic if opType is None else opType
+        if opType is None:
+            opType = insn.mnemonic + ' '
+        if layout == RISCV_LAYOUT_FENCE:
+            return opType + "{0:08b}".format( insn.imm )
+
+        intReg = self.intRegName
+        floatReg = self.floatRegName
+        imm = hex( insn.imm & 0xffffffff )
+
+        if layout == RISCV_LAYOUT_LOAD:
+            operands = (intReg[ insn.rd ], ', ', imm, '(', intReg[ insn.rs1 ], ')')
+        elif layout == RISCV_LAYOUT_STORE:
+            operands = (intReg[ insn.rs2 ], ', ', imm, '(', intReg[ insn.rs1 ], ')')
+        elif layout == RISCV_LAYOUT_BRANCH:
+            operands = (intReg[ insn.rs1 ], ', ', intReg[ insn.rs2 ], ', ', imm)
+        elif layout == RISCV_LAYOUT_RD_IMM:
+            operands = (intReg[ insn.rd ], ', ', imm)
+        elif layout == RISCV_LAYOUT_RD_RS1_IMM:
+            operands = (intReg[ insn.rd ], ', ', intReg[ insn.rs1 ], ', ', imm)
+        elif layout == RISCV_LAYOUT_RD_RS1_RS2:
+            operands = (intReg[ insn.rd ], ', ', intReg[ insn.rs1 ], ', ', intReg[ insn.rs2 ])
+        elif layout == RISCV_LAYOUT_RS1_RS2:
+            operands = (intReg[ insn.rs1 ], ', ', intReg[ insn.rs2 ])
+        elif layout == RISCV_LAYOUT_CSR:
+            operands = (
+                intReg[ insn.rd ], ', ', "0x{0:03x}".format( insn.imm ), ', ',
+                intReg[ insn.rs1 ]
+            )
+        elif layout == RISCV_LAYOUT_CSR_IMM:
+            operands = (
+                intReg[ insn.rd ], ', ', "0x{0:03x}".format( insn.imm ), ', ',
+                "0x{0:03x}".format( insn.rs1 )
+            )
+        elif layout == RISCV_LAYOUT_F_LOAD:
+            operands = (floatReg[ insn.rd ], ', ', imm, '(', intReg[ insn.rs1 ], ')')
+        elif layout == RISCV_LAYOUT_F_STORE:
+            operands = (floatReg[ insn.rs2 ], ', ', imm, '(', intReg[ insn.rs1 ], ')')
+        elif layout == RISCV_LAYOUT_FRD_FRS1:
+            operands = (floatReg[ insn.rd ], ', ', floatReg[ insn.rs1 ])
+        elif layout == RISCV_LAYOUT_FRD_FRS1_FRS2:
+            operands = (
+                floatReg[ insn.rd ], ', ', floatReg[ insn.rs1 ], ', ', floatReg[ insn.rs2 ]
+            )
+        elif layout == RISCV_LAYOUT_FRD_FRS1_FRS2_FRS3:
+            operands = (
+                floatReg[ insn.rd ], ', ', floatReg[ insn.rs1 ], ', ',
+                floatReg[ insn.rs2 ], ', ', floatReg[ insn.rs3 ]
+            )
+        elif layout == RISCV_LAYOUT_RD_FRS1:
+            operands = (intReg[ insn.rd ], ', ', floatReg[ insn.rs1 ])
+        elif layout == RISCV_LAYOUT_RD_FRS1_FRS2:
+            operands = (
+                intReg[ insn.rd ], ', ', floatReg[ insn.rs1 ], ', ', floatReg[ insn.rs2 ]
+            )
+        else:   # RISCV_LAYOUT_FRD_RS1
+            operands = (floatReg[ insn.rd ], ', ', intReg[ insn.rs1 ])
+
+        return opType + ''.join( operands )
+
+
+class RISCV_DisassemblyCache( object ):
+    """ A bounded LRU cache of disassembled instruction words.
+    Hot loops disassemble the same few hundred words many times.
+    """
+
+    # The max number of cached instruction words.
+    DEFAULT_SIZE = 16 * 1024
+
+    def __init__( self, disassembler, size=DEFAULT_SIZE ):
+        self.disasm_ = disassembler
+        self.size_ = size
+        self.cache_ = collections.OrderedDict()  # code string -> assembly
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
 
-    class InstructionBase( object ):
-        """ RISCV distribution """
-        RV32I = True
-        RV64I = False
-        RV32M = True
-        RV64M = False
-        RV32A = False
-        RV64A = False
-        RV32F = True
-        RV64F = False
-        RV32D = False
-        RV64D = False
-
-        def __init__( self, code ):
-            self.code = code
-
-        def Bits( self, source, higherPosition, lowerPosition ):
-            """ Extract bits from source data. """
-            length = higherPosition - lowerPosition + 1
-            mask = (1 << length) - 1
-            return (source >> lowerPosition) & mask
-
-        def __str__( self ):
-            return "unknown %x" % self.code
-
-
-    class InstructionCommon( InstructionBase ):
-        """ Common instruction """
-
-        OC_LOAD     = "0000011"
-        OC_STORE    = "0100011"
-        OC_BRANCH   = "1100011"
-        OC_JALR     = "1100111"
-        OC_JAL      = "1101111"
-        OC_OP_IMM   = "0010011"
-        OC_OP       = "0110011"
-        OC_AUIPC    = "0010111"
-        OC_LUI      = "0110111"
-        OC_MISC_MEM = "0001111"
-        OC_SYSTEM   = "1110011"
-        OC_F_LOAD   = "0000111"
-        OC_F_STORE  = "0100111"
-        OC_F_OP     = "1010011"
-        OC_F_FMADD  = "1000011"
-        OC_F_FMSUB  = "1000111"
-        OC_F_FNMSUB = "1001011"
-        OC_F_FNMADD = "1001111"
-
-
-        intRegName = ['zero', 'ra', 'sp', 'gp', 'tp', 't0', 't1', 't2',
-                          's0/fp', 's1', 'a0', 'a1', 'a2', 'a3', 'a4', 'a5',
-                          'a6', 'a7', 's2', 's3', 's4', 's5', 's6', 's7',
-                          's8', 's9', 's10', 's11', 't3', 't4', 't5', 't6']
-
-        floatRegName = ['ft0', 'ft1', 'ft2', 'ft3', 'ft4', 'ft5', 'ft6', 'ft7',
-                          'fs0', 'fs1', 'fa0', 'fa1', 'fa2', 'fa3', 'fa4', 'fa5',
-                          'fa6', 'fa7', 'fs2', 'fs3', 'fs4', 'fs5', 'fs6', 'fs7',
-                          'fs8', 'fs9', 'fs10', 'fs11', 'ft8', 'ft9', 'ft10', 'ft11']
-
-
-        def __init__( self, code ):
-            RISCV_Disassembler.InstructionBase.__init__( self, code )
-
-            inst = "{0:032b}".format(self.Bits(code, 31, 0))
-
-            self.opCode = inst[-7:]
-            self.funct2 = inst[-27:-25]
-            self.funct3 = inst[-15:-12]
-            self.funct7 = inst[-32:-25]
-            self.funct6 = inst[-32:-26]
-            self.funct5 = inst[-25:-20]
-            self.funct12 = inst[-32:-20]
-            self.rd  = self.intRegName[int(inst[-12:-7], 2)]
-            self.rs1 = self.intRegName[int(inst[-20:-15], 2)]
-            self.rs2 = self.intRegName[int(inst[-25:-20], 2)]
-            self.rd  = self.intRegName[int(inst[-12:-7], 2)]
-            self.frs1 = self.floatRegName[int(inst[-20:-15], 2)]
-            self.frs2 = self.floatRegName[int(inst[-25:-20], 2)]
-            self.frs3 = self.floatRegName[int(inst[-32:-27], 2)]
-            self.frd  = self.floatRegName[int(inst[-12:-7], 2)]
-
-            # Hex Style
-            self.shamt5 = str(hex(int(inst[-25:-20], 2)))
-            self.shamt6 = str(hex(int(inst[-26:-20], 2)))
-            self.I_Imm = str(hex(int(inst[-32] * 21 + inst[-31:-20], 2)))
-            self.S_Imm = str(hex(int(inst[-32] * 21 + inst[-31:-25] + inst[-12:-7], 2)))
-            self.B_Imm = str(hex(int(inst[-32] * 20 + inst[-8] + inst[-31:-25]
-                                + inst[-12:-8] + '0', 2)))
-            self.U_Imm = str(hex(int(inst[-32] + inst[-31:-20] + inst[-20:-12]
-                                + '0' * 12, 2)))
-            self.J_Imm = str(hex(int(inst[-32] * 12 + inst[-20:-12] + inst[-21]
-                                + inst[-31:-21] + '0', 2)))
-
-        def IsLoad( self ):
-            return self.opCode == self.OC_LOAD
-
-        def IsStore( self ):
-            return self.opCode == self.OC_STORE
-
-        def IsBranch( self ):
-            return self.opCode == self.OC_BRANCH
-
-        def IsJALR( self ):
-            return self.opCode == self.OC_JALR
-
-        def IsJAL( self ):
-            return self.opCode == self.OC_JAL
-
-        def IsOpImm( self ):
-            return self.opCode == self.OC_OP_IMM
-
-        def IsOp( self ):
-            return self.opCode == self.OC_OP
-
-        def IsAUIPC( self ):
-            return self.opCode == self.OC_AUIPC
-
-        def IsLUI( self ):
-            return self.opCode == self.OC_LUI
-
-        def IsMiscMem( self ):
-            return self.opCode == self.OC_MISC_MEM
-
-        def IsSystem( self ):
-            return self.opCode == self.OC_SYSTEM
-
-        def IsFLoad(self):
-            return self.opCode == self.OC_F_LOAD
-
-        def IsFStore(self):
-            return self.opCode == self.OC_F_STORE
-
-        def IsFOp(self):
-            return self.opCode == self.OC_F_OP
-
-        def IsFMADD(self):
-            return self.opCode == self.OC_F_FMADD
-
-        def IsFMSUB(self):
-            return self.opCode == self.OC_F_FMSUB
-
-        def IsFNMSUB(self):
-            return self.opCode == self.OC_F_FNMSUB
-
-        def IsFNMADD(self):
-            return self.opCode == self.OC_F_FNMADD
-
-    class InstructionLoad( InstructionCommon ):
-        """ Load instruction """
-
-        def __init__( self, code ):
-            RISCV_Disassembler.InstructionCommon.__init__( self, code )
-
-        def __str__( self ):
-            if self.funct3 == '000' and self.RV32I:
-                opType = 'lb '
-            elif self.funct3 == '001' and self.RV32I:
-                opType = 'lh '
-            elif self.funct3 == '010' and self.RV32I:
-                opType = 'lw '
-            elif self.funct3 == '011' and self.RV64I:
-                opType = 'ld '  # self.RV64I
-            elif self.funct3 == '100' and self.RV32I:
-                opType = 'lbu '
-            elif self.funct3 == '101' and self.RV32I:
-                opType = 'lhu '
-            elif self.funct3 == '110' and self.RV32I:
-                opType = 'lwu '
-            else:
-                opType = 'Unknown'
-            asmStr = opType + self.rd + ', ' + self.I_Imm + '(' + self.rs1 + ')'
-            return asmStr
-
-
-    class InstructionStore( InstructionCommon ):
-        """ Store instruction """
-
-        def __init__( self, code ):
-            RISCV_Disassembler.InstructionCommon.__init__( self, code )
-
-        def __str__( self ):
-            if self.funct3 == '000' and self.RV32I:
-                opType = 'sb '
-            elif self.funct3 == '001' and self.RV32I:
-                opType = 'sh '
-            elif self.funct3 == '010' and self.RV32I:
-                opType = 'sw '
-            elif self.funct3 == '011' and self.RV64I:
-                opType = 'sd '
-            else:
-                opType = 'Unknown'
-            asmStr = opType + self.rs2 + ', ' + self.S_Imm + '(' + self.rs1 + ')'
-            return asmStr
-
-    class InstructionBranch( InstructionCommon ):
-        """ Branch instruction """
-
-        def __init__( self, code ):
-            RISCV_Disassembler.InstructionCommon.__init__( self, code )
-
-        def __str__( self ):
-            if self.funct3 == '000':
-                opType = 'beq '
-            elif self.funct3 == '001':
-                opType = 'bne '
-            elif self.funct3 == '100':
-                opType = 'blt '
-            elif self.funct3 == '101':
-                opType = 'bge '
-            elif self.funct3 == '110':
-                opType = 'bltu '
-            elif self.funct3 == '111':
-                opType = 'bgeu '
-            else:
-                opType = 'Unknown'
-            asmStr = opType + self.rs1 + ', ' + self.rs2 + ', ' + self.B_Imm
-            return asmStr
-
-    class InstructionJALR( InstructionCommon ):
-        """ JALR instruction """
-
-        def __init__( self, code ):
-            RISCV_Disassembler.InstructionCommon.__init__( self, code )
-
-        def __str__( self ):
-            opType = 'jalr '
-            asmStr = opType + self.rd + ', ' + self.I_Imm + '(' + self.rs1 + ')'
-            return asmStr
-
-    class InstructionJAL( InstructionCommon ):
-        """ JAL instruction """
-
-        def __init__( self, code ):
-            RISCV_Disassembler.InstructionCommon.__init__( self, code )
-
-        def __str__( self ):
-            opType = 'jal '
-            asmStr = opType + self.rd + ', ' + self.J_Imm
-            return asmStr
-
-    class InstructionOpImm( InstructionCommon ):
-        """ OpImm instruction """
-
-        def __init__( self, code ):
-            RISCV_Disassembler.InstructionCommon.__init__( self, code )
-
-        def __str__( self ):
-            imm = self.I_Imm
-            if self.funct3 == '000' and self.RV32I:
-                opType = 'addi '
-            elif self.funct3 == '001':
-                if self.funct6 == '000000' and self.RV64I:
-                    opType = 'slli '
-                    imm = self.shamt6
-                elif self.funct7 == '0000000' and self.RV32I:
-                    opType = 'slli '
-                    imm = self.shamt5
-                else:
-                    opType = 'Unknown'
-            elif self.funct3 == '101':
-                if self.funct6 == '000000' and self.RV64I:
-                    opType = 'srli '
-                    imm = self.shamt6
-                elif self.funct6 == '010000' and self.RV64I:
-                    opType = 'srai '
-                    imm = self.shamt6
-                elif self.funct7 == '0000000' and self.RV32I:
-                    opType = 'srli '
-                    imm = self.shamt5
-                elif self.funct7 == '0100000' and self.RV32I:
-                    opType = 'srai '
-                    imm = self.shamt5
-                else:
-                    opType = 'Unknown'
-            elif self.funct3 == '010' and self.RV32I:
-                opType = 'slti '
-            elif self.funct3 == '011' and self.RV32I:
-                opType = 'sltiu '
-            elif self.funct3 == '100' and self.RV32I:
-                opType = 'xori '
-            elif self.funct3 == '110' and self.RV32I:
-                opType = 'ori '
-            elif self.funct3 == '111' and self.RV32I:
-                opType = 'andi '
-            else:
-                opType = 'Unknown'
-            asmStr = opType + self.rd + ', ' + self.rs1 + ', ' + imm
-            return asmStr
-
-
-    class InstructionOp( InstructionCommon ):
-        """ Op instruction """
-
-        def __init__( self, code ):
-            RISCV_Disassembler.InstructionCommon.__init__( self, code )
-
-        def __str__( self ):
-            if self.funct7 == '0000001' and self.RV32M:
-                if self.funct3 == '000':
-                    opType = 'mul '
-                elif self.funct3 == '001':
-                    opType = 'mulh '
-                elif self.funct3 == '010':
-                    opType = 'mulhsu '
-                elif self.funct3 == '011':
-                    opType = 'mulhu '
-                elif self.funct3 == '100':
-                    opType = 'div '
-                elif self.funct3 == '101':
-                    opType = 'divu '
-                elif self.funct3 == '110':
-                    opType = 'rem '
-                elif self.funct3 == '111':
-                    opType = 'remu '
-                else:
-                    opType = 'Unknown'
-            elif self.RV32I:
-                if self.funct3 == '000' and self.funct7 == '0000000':
-                    opType = 'add '
-                elif self.funct3 == '000' and self.funct7 == '0100000':
-                    opType = 'sub '
-                elif self.funct3 == '001' and self.funct7 == '0000000':
-                    opType = 'sll '
-                elif self.funct3 == '010' and self.funct7 == '0000000':
-                    opType = 'slt '
-                elif self.funct3 == '011' and self.funct7 == '0000000':
-                    opType = 'sltu '
-                elif self.funct3 == '100' and self.funct7 == '0000000':
-                    opType = 'xor '
-                elif self.funct3 == '101' and self.funct7 == '0000000':
-                    opType = 'srl '
-                elif self.funct3 == '101' and self.funct7 == '0100000':
-                    opType = 'sra '
-                elif self.funct3 == '110' and self.funct7 == '0000000':
-                    opType = 'or '
-                elif self.funct3 == '111' and self.funct7 == '0000000':
-                    opType = 'and '
-                else:
-                    opType = 'Unknown'
-            else:
-                opType = 'Unknown'
-
-            asmStr = opType + self.rd + ', ' + self.rs1 + ', ' + self.rs2
-            return asmStr
-
-
-    class InstructionAUIPC( InstructionCommon ):
-        """ AUIPC instruction """
-
-        def __init__( self, code ):
-            RISCV_Disassembler.InstructionCommon.__init__( self, code )
-
-        def __str__( self ):
-            opType = 'auipc '
-            asmStr = opType + self.rd + ', ' + self.U_Imm
-            return asmStr
-
-
-    class InstructionLUI( InstructionCommon ):
-        """ Load instruction """
-
-        def __init__( self, code ):
-            RISCV_Disassembler.InstructionCommon.__init__( self, code )
-
-        def __str__( self ):
-            opType = 'lui '
-            asmStr = opType + self.rd + ', ' + self.U_Imm
-            return asmStr
-
-    class InstructionMiscMem( InstructionCommon ):
-        """ Misc Memory instruction """
-
-        def __init__( self, code ):
-            RISCV_Disassembler.InstructionCommon.__init__( self, code )
-
-        def __str__( self ):
-            if self.funct3 == "000":
-                opType = 'fence ' + "{0:08b}".format(self.Bits(self.code, 27, 20))
-            elif self.funct3 == "001":
-                opType = 'fence.i '
-            else:
-                opType = 'unknown misc mem'
-            asmStr = opType
-            return asmStr
-
-    class InstructionSystem( InstructionCommon ):
-        """ Misc Memory instruction """
-
-        def __init__( self, code ):
-            RISCV_Disassembler.InstructionCommon.__init__( self, code )
-
-        def __str__( self ):
-            csr =  "0x{0:03x}".format(self.Bits(self.code, 31, 20))
-            zimm = "0x{0:03x}".format(self.Bits(self.code, 19, 15))
-
-            if self.funct3 == '000':
-                if self.funct12 == '000000000000':
-                    opType = 'ecall'
-                elif self.funct12 == '000000000001':
-                    opType = 'ebreak'
-                elif self.funct12 == '000000000010':
-                    opType = 'uret'
-                elif self.funct12 == '000100000010':
-                    opType = 'sret'
-                elif self.funct12 == '001100000010':
-                    opType = 'mret'
-                elif self.funct12 == '000100000101':
-                    opType = 'wfi'
-                elif self.funct12[0:7] == '0001001':
-                    opType = 'sfence.vma ' + self.rs1 + ', ' + self.rs2
-                else:
-                    opType = 'unknown system'
-            elif self.funct3 == "001":
-                opType = 'csrrw ' + self.rd + ', ' + csr + ', ' + self.rs1
-            elif self.funct3 == "010":
-                opType = 'csrrs ' + self.rd + ', ' + csr + ', ' + self.rs1
-            elif self.funct3 == "011":
-                opType = 'csrrc ' + self.rd + ', ' + csr + ', ' + self.rs1
-            elif self.funct3 == "101":
-                opType = 'csrrwi ' + self.rd + ', ' + csr + ', ' + zimm
-            elif self.funct3 == "110":
-                opType = 'csrrsi ' + self.rd + ', ' + csr + ', ' + zimm
-            elif self.funct3 == "111":
-                opType = 'csrrci ' + self.rd + ', ' + csr + ', ' + zimm
-            else:
-                opType = 'unknown system'
-            asmStr = opType
-            return asmStr
-
-    class InstructionFOp( InstructionCommon ):
-        """ FP Op instruction """
-
-        def __init__( self, code ):
-            RISCV_Disassembler.InstructionCommon.__init__( self, code )
-
-        def __str__( self ):
-            if self.funct7 == '0000000' and self.RV32F:
-                opType = 'fadd.s '
-                asmStr = opType + self.frd + ', ' + self.frs1 + ', ' + self.frs2
-            elif self.funct7 == '0000100' and self.RV32F:
-                opType = 'fsub.s '
-                asmStr = opType + self.frd + ', ' + self.frs1 + ', ' + self.frs2
-            elif self.funct7 == '0001000' and self.RV32F:
-                opType = 'fmul.s '
-                asmStr = opType + self.frd + ', ' + self.frs1 + ', ' + self.frs2
-            elif self.funct7 == '0001100' and self.RV32F:
-                opType = 'fdiv.s '
-                asmStr = opType + self.frd + ', ' + self.frs1 + ', ' + self.frs2
-            elif self.funct7 == '0101100' and self.RV32F:
-                opType = 'fsqrt.s '
-                asmStr = opType + self.frd + ', ' + self.frs1
-            elif self.funct7 == '0010000' and self.RV32F:
-                if self.funct3 == '000':
-                    opType = 'fsgnj.s '
-                elif self.funct3 == '001':
-                    opType = 'fsgnjn.s '
-                elif self.funct3 == '010':
-                    opType = 'fsgnjx.s '
-                else:
-                    opType == 'unknown fop '
-                asmStr = opType + self.frd + ', ' + self.frs1 + ', ' + self.frs2
-            elif self.funct7 == '0010100' and self.RV32F:
-                if self.funct3 == '000':
-                    opType = 'fmin.s '
-                elif self.funct3 == '001':
-                    opType = 'fmax.s '
-                else:
-                    opType = 'unknown fop '
-                asmStr = opType + self.frd + ', ' + self.frs1 + ', ' + self.frs2
-            elif self.funct7 == '1100000' and self.RV32F:
-                if self.funct5 == '00000':
-                    opType = 'fcvt.w.s '
-                elif self.funct5 == '00001':
-                    opType = 'fcvt.wu.s '
-                else:
-                    opType = 'unknoen fop '
-                asmStr = opType + self.rd + ', ' + self.frs1
-            elif self.funct7 == '1110000' and self.RV32F:
-                if self.funct3 == '000':
-                    opType = 'fmv.x.w '
-                elif self.funct3 == '001':
-                    opType = 'fclass.s '
-                else:
-                    opType = 'unknown fop '
-                asmStr = opType + self.rd + ', ' + self.frs1
-            elif self.funct7 == '1010000' and self.RV32F:
-                if self.funct3 == '010':
-                    opType = 'feq.s '
-                elif self.funct3 == '001':
-                    opType = 'flt.s '
-                elif self.funct3 == '000':
-                    opType = 'fle.s '
-                else:
-                    opType = 'unknown fop '
-                asmStr = opType + self.rd + ', ' + self.frs1 + ', ' + self.frs2
-            elif self.funct7 == '1101000' and self.RV32F:
-                if self.funct5 == '00000':
-                    opType = 'fcvt.s.w '
-                elif self.funct5 == '00001':
-                    opType = 'fcvt.s.wu '
-                else:
-                    opType = 'unknown fop '
-                asmStr = opType + self.frd + ', ' + self.rs1
-            elif self.funct7 == '1111000' and self.RV32F:
-                opType = 'fmv.w.x '
-                asmStr = opType + self.frd + ', ' + self.rs1
-            else:
-                opType = 'unknown fop '
-                asmStr = opType + self.frd + ', ' + self.frs1 + ', ' + self.frs2
-            
-            return asmStr
-
-    class InstructionFLoad( InstructionCommon ):
-        """ FP Load instruction """
-
-        def __init__( self, code ):
-            RISCV_Disassembler.InstructionCommon.__init__( self, code )
-
-        def __str__( self ):
-            if self.funct3 == '010' and self.RV32F:
-                opType = 'flw '
-            else:
-                opType = 'Unknown'
-            asmStr = opType + self.frd + ', ' + self.I_Imm + '(' + self.rs1 + ')'
-            return asmStr
-
-
-    class InstructionFStore( InstructionCommon ):
-        """ FP Store instruction """
-
-        def __init__( self, code ):
-            RISCV_Disassembler.InstructionCommon.__init__( self, code )
-
-        def __str__( self ):
-            if self.funct3 == '010' and self.RV32F:
-                opType = 'fsw '
-            else:
-                opType = 'Unknown'
-            asmStr = opType + self.frs2 + ', ' + self.S_Imm + '(' + self.rs1 + ')'
+    def Disassemble( self, codeStr ):
+        cache = self.cache_
+        asmStr = cache.get( codeStr )
+        if asmStr is not None:
+            self.hits += 1
+            cache.move_to_end( codeStr )
             return asmStr
 
-
-    class InstructionFMADD( InstructionCommon ):
-        """ FP FMADD instruction """
-
-        def __init__( self, code ):
-            RISCV_Disassembler.InstructionCommon.__init__( self, code )
-
-        def __str__( self ):
-            if self.funct2 == '00' and self.RV32F:
-                opType = 'fmadd.s '
-            else:
-                opType = 'Unknown'
-            asmStr = opType + self.frd + ', ' + self.frs1 + ', ' + self.frs2 + ', ' + self.frs3
-            return asmStr
-    
-    class InstructionFMSUB( InstructionCommon ):
-        """ FP FMSUB instruction """
-
-        def __init__( self, code ):
-            RISCV_Disassembler.InstructionCommon.__init__( self, code )
-
-        def __str__( self ):
-            if self.funct2 == '00' and self.RV32F:
-                opType = 'fmsub.s '
-            else:
-                opType = 'Unknown'
-            asmStr = opType + self.frd + ', ' + self.frs1 + ', ' + self.frs2 + ', ' + self.frs3
-            return asmStr
-    
-    class InstructionFNMSUB( InstructionCommon ):
-        """ FP FNMSUB instruction """
-
-        def __init__( self, code ):
-            RISCV_Disassembler.InstructionCommon.__init__( self, code )
-
-        def __str__( self ):
-            if self.funct2 == '00' and self.RV32F:
-                opType = 'fnmsub.s '
-            else:
-                opType = 'Unknown'
-            asmStr = opType + self.frd + ', ' + self.frs1 + ', ' + self.frs2 + ', ' + self.frs3
-            return asmStr
-    
-    class InstructionFNMADD( InstructionCommon ):
-        """ FP FNMADD instruction """
-
-        def __init__( self, code ):
-            RISCV_Disassembler.InstructionCommon.__init__( self, code )
-
-        def __str__( self ):
-            if self.funct2 == '00' and self.RV32F:
-                opType = 'fnmadd.s '
-            else:
-                opType = 'Unknown'
-            asmStr = opType + self.frd + ', ' + self.frs1 + ', ' + self.frs2 + ', ' + self.frs3
-            return asmStr
\ No newline at end of file
+        self.misses += 1
+        asmStr = self.disasm_.Disassemble( codeStr )
+        cache[ codeStr ] = asmStr
+        if len( cache ) > self.size_:
+            cache.popitem( last=False )
+        return asmStr
@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+
+#
+# Read and write a compact binary RSD trace.
+#
+# A binary trace has the same contents as a text RSD log that
+# Verification/Dumper.sv writes, except comment lines.
+# The Verilator simulator writes it directly with RSD_LOG_BINARY=1.
+# It begins with RSD_BINARY_TRACE_MAGIC and a version byte, and records
+# follow it. Each record begins with a tag byte:
+#
+#   0x80:     A cycle record ('C'). Followed by a varint of an increment.
+#   0x81:     A run of stage records ('S'). Followed by a varint of the
+#             number of records and the records. Each record has a fixed
+#             size (RSD_BINARY_TRACE_STAGE), so that a run is unpacked at
+#             once:
+#               uint8: 0VSCssss, V/S/C: valid/stall/clear, ssss: a stage id
+#               uint16: iid
+#               uint8: mid
+#               uint16: a comment string index
+#   0x90:     A label record ('L').
+#             Followed by varints of iid and mid, and a PC and an
+#             instruction code in 32-bit little endian.
+#   0x91:     A label record with a PC and a code that are not 8-digit
+#             hexadecimal numbers, such as 'xxxxxxxx'.
+#             Followed by varints of iid, mid and string indices of them.
+#   0xA0:     A string record. Followed by a varint of a length and UTF-8
+#             bytes. Strings are indexed from 1 in order of appearance,
+#             and index 0 is an empty string.
+#   0xA1:     A string table reset. Strings defined before it are
+#             discarded. A writer resets a table when it is full, because
+#             comments can include unique values.
+#
+# Multi-byte numbers are little endian.
+# A varint is an unsigned LEB128 number.
+#
+# This script also transcodes a text RSD log to a binary trace:
+#   python3 RSD_BinaryTrace.py inputFileName outputFileName
+#
+
+import sys
+import struct
+
+#
+# Global constants
+#
+RSD_BINARY_TRACE_MAGIC = b"\x00RSD_Bin"
+RSD_BINARY_TRACE_VERSION = 0
+
+RSD_BINARY_TRACE_TAG_CYCLE = 0x80
+RSD_BINARY_TRACE_TAG_STAGES = 0x81
+RSD_BINARY_TRACE_TAG_LABEL = 0x90
+RSD_BINARY_TRACE_TAG_LABEL_STRING = 0x91
+RSD_BINARY_TRACE_TAG_STRING = 0xA0
+RSD_BINARY_TRACE_TAG_RESET_STRINGS = 0xA1
+
+# A stage record in a run.
+RSD_BINARY_TRACE_STAGE = struct.Struct("<BHBH")
+
+# The max number of strings in a string table.
+RSD_BINARY_TRACE_MAX_STRINGS = 0xffff
+
+RSD_BINARY_TRACE_STAGE_VALID = 0x40
+RSD_BINARY_TRACE_STAGE_STALL = 0x20
+RSD_BINARY_TRACE_STAGE_CLEAR = 0x10
+RSD_BINARY_TRACE_STAGE_ID_MASK = 0x0f
+
+# (stage id, stall, clear) decoded from the first byte of a stage record,
+# or None if a record is invalid.
+RSD_BINARY_TRACE_STAGE_FLAGS = [
+    (
+        tag & RSD_BINARY_TRACE_STAGE_ID_MASK,
+        tag & RSD_BINARY_TRACE_STAGE_STALL != 0,
+        tag & RSD_BINARY_TRACE_STAGE_CLEAR != 0
+    ) if tag & RSD_BINARY_TRACE_STAGE_VALID else None
+    for tag in range(0x80)
+]
+
+# The size of a block read from a trace at once.
+RSD_BINARY_TRACE_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+class RSD_BinaryTraceError(Exception):
+    """ An exception class for binary traces """
+    pass
+
+
+def IsBinaryTrace(head):
+    """ Check whether bytes at the head of a file are a binary trace header. """
+    return head.startswith(RSD_BINARY_TRACE_MAGIC)
+
+
+def IsBinaryTraceFile(fileName):
+    """ Check whether a file is a binary trace. """
+    with open(fileName, "rb") as file:
+        return IsBinaryTrace(file.read(len(RSD_BINARY_TRACE_MAGIC)))
+
+
+def EncodeVarint(value):
+    out = bytearray()
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def DecodeVarint(data, pos):
+    """ Decode a varint at 'pos' and return (value, next position). """
+    value = 0
+    shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        value |= (b & 0x7f) << shift
+        if b < 0x80:
+            return value, pos
+        shift += 7
+
+
+class RSD_BinaryTraceWriter(object):
+    """ Write a binary trace. """
+
+    def __init__(self, file):
+        """ 'file' is a binary file object. """
+        self.file_ = file
+        self.strings_ = {"": 0}     # string -> index
+        self.buffer_ = bytearray()
+        self.stages_ = []           # Stage records in a current run
+
+        self.buffer_ += RSD_BINARY_TRACE_MAGIC
+        self.buffer_.append(RSD_BINARY_TRACE_VERSION)
+
+    def Close(self):
+        self.FlushStages_()
+        self.Flush_()
+
+    def Flush_(self):
+        self.file_.write(self.buffer_)
+        self.buffer_ = bytearray()
+
+    def FlushStages_(self):
+        """ Output a run of stage records. """
+        if self.stages_:
+            self.buffer_.append(RSD_BINARY_TRACE_TAG_STAGES)
+            self.buffer_ += EncodeVarint(len(self.stages_))
+            self.buffer_ += b"".join(self.stages_)
+            self.stages_ = []
+
+    def GetStringIndex_(self, str):
+        """ Return an index of an interned string, and define it if new.
+        A string record is output before a current run of stage records,
+        which is not output yet.
+        """
+        index = self.strings_.get(str)
+        if index is None:
+            if len(self.strings_) >= RSD_BINARY_TRACE_MAX_STRINGS:
+                self.FlushStages_()
+                self.buffer_.append(RSD_BINARY_TRACE_TAG_RESET_STRINGS)
+                self.strings_ = {"": 0}
+            index = len(self.strings_)
+            self.strings_[str] = index
+            data = str.encode()
+            self.buffer_.append(RSD_BINARY_TRACE_TAG_STRING)
+            self.buffer_ += EncodeVarint(len(data))
+            self.buffer_ += data
+        return index
+
+    def WriteStage(self, stageID, valid, stall, clear, iid, mid, comment):
+        commentIndex = self.GetStringIndex_(comment)
+        tag = stageID & RSD_BINARY_TRACE_STAGE_ID_MASK
+        if valid:
+            tag |= RSD_BINARY_TRACE_STAGE_VALID
+        if stall:
+            tag |= RSD_BINARY_TRACE_STAGE_STALL
+        if clear:
+            tag |= RSD_BINARY_TRACE_STAGE_CLEAR
+        try:
+            self.stages_.append(RSD_BINARY_TRACE_STAGE.pack(tag, iid, mid, commentIndex))
+        except struct.error:
+            raise RSD_BinaryTraceError("iid/mid is out of range: %d/%d" % (iid, mid))
+
+    def WriteLabel(self, iid, mid, pc, code):
+        """ Write a label record. 'pc' and 'code' are strings in a text log. """
+        if self.IsHex32_(pc) and self.IsHex32_(code):
+            self.FlushStages_()
+            self.buffer_.append(RSD_BINARY_TRACE_TAG_LABEL)
+            self.buffer_ += EncodeVarint(iid)
+            self.buffer_ += EncodeVarint(mid)
+            self.buffer_ += struct.pack("<II", int(pc, 16), int(code, 16))
+        else:
+            pcIndex = self.GetStringIndex_(pc)
+            codeIndex = self.GetStringIndex_(code)
+            self.FlushStages_()
+            self.buffer_.append(RSD_BINARY_TRACE_TAG_LABEL_STRING)
+            self.buffer_ += EncodeVarint(iid)
+            self.buffer_ += EncodeVarint(mid)
+            self.buffer_ += EncodeVarint(pcIndex)
+            self.buffer_ += EncodeVarint(codeIndex)
+
+    def WriteCycle(self, increment):
+        self.FlushStages_()
+        self.buffer_.append(RSD_BINARY_TRACE_TAG_CYCLE)
+        self.buffer_ += EncodeVarint(increment)
+        if len(self.buffer_) >= RSD_BINARY_TRACE_BLOCK_SIZE:
+            self.Flush_()
+
+    def IsHex32_(self, str):
+        """ Check whether 'str' is restored exactly from a 32-bit number. """
+        try:
+            return "%08x" % int(str, 16) == str and len(str) == 8
+        except ValueError:
+            return False
+
+
+class RSD_BinaryTraceReader(object):
+    """ Read a binary trace and call handlers of RSD_Parser. """
+
+    def __init__(self, file):
+        """ 'file' is a binary file object at the head of a trace. """
+        self.file_ = file
+        self.strings_ = [""]    # index -> string
+
+    def Parse(self, parser):
+        """ Read records and call OnStage_/OnLabel_/OnCycle_ of 'parser'. """
+        file = self.file_
+        header = file.read(len(RSD_BINARY_TRACE_MAGIC) + 1)
+        if not IsBinaryTrace(header):
+            raise RSD_BinaryTraceError("An unknown file format.")
+        version = header[-1]
+        if version != RSD_BINARY_TRACE_VERSION:
+            raise RSD_BinaryTraceError("An unknown file version: %d" % version)
+
+        onStage = parser.OnStage_
+        onLabel = parser.OnLabel_
+        onCycle = parser.OnCycle_
+        strings = self.strings_
+        stageFlags = RSD_BINARY_TRACE_STAGE_FLAGS
+        data = b""
+        pos = 0
+        offset = len(header)    # An offset of 'data' in a file
+        eof = False
+
+        while True:
+            start = pos
+            try:
+                tag = data[pos]
+                if tag == RSD_BINARY_TRACE_TAG_STAGES:
+                    num, pos = DecodeVarint(data, pos + 1)
+                    end = pos + num * RSD_BINARY_TRACE_STAGE.size
+                    if end > len(data):
+                        raise IndexError()
+                    stages = RSD_BINARY_TRACE_STAGE.iter_unpack(data[pos:end])
+                    pos = end
+                elif tag == RSD_BINARY_TRACE_TAG_CYCLE:
+                    increment, pos = DecodeVarint(data, pos + 1)
+                elif tag == RSD_BINARY_TRACE_TAG_LABEL:
+                    iid, pos = DecodeVarint(data, pos + 1)
+                    mid, pos = DecodeVarint(data, pos)
+                    if pos + 8 > len(data):
+                        raise IndexError()
+                    pc, code = struct.unpack_from("<II", data, pos)
+                    pos += 8
+                    pc = "%08x" % pc
+                    code = "%08x" % code
+                elif tag == RSD_BINARY_TRACE_TAG_LABEL_STRING:
+                    iid, pos = DecodeVarint(data, pos + 1)
+                    mid, pos = DecodeVarint(data, pos)
+                    pc, pos = DecodeVarint(data, pos)
+                    code, pos = DecodeVarint(data, pos)
+                    # An IndexError is taken as the end of a block, so
+                    # indices are checked explicitly.
+                    if pc >= len(strings) or code >= len(strings):
+                        raise RSD_BinaryTraceError(
+                            "An undefined string index at offset %d" % (offset + start)
+                        )
+                    pc = strings[pc]
+                    code = strings[code]
+                elif tag == RSD_BINARY_TRACE_TAG_STRING:
+                    length, pos = DecodeVarint(data, pos + 1)
+                    if pos + length > len(data):
+                        raise IndexError()
+                    strings.append(data[pos:pos + length].decode())
+                    pos += length
+                    continue
+                elif tag == RSD_BINARY_TRACE_TAG_RESET_STRINGS:
+                    pos += 1
+                    del strings[1:]
+                    continue
+                else:
+                    raise RSD_BinaryTraceError(
+                        "An unknown record tag 0x%02x at offset %d" % (tag, offset + start)
+                    )
+            except IndexError:
+                # A record continues to the next block.
+                if eof:
+                    if start == len(data):
+                        break
+                    raise RSD_BinaryTraceError("A trace is truncated.")
+                # read1 returns data in a pipe without waiting for a block.
+                block = file.read1(RSD_BINARY_TRACE_BLOCK_SIZE)
+                eof = block == b""
+                data = data[start:] + block
+                offset += start
+                pos = 0
+                continue
+
+            # Handlers are called out of the try block above, so that
+            # their errors are not taken as the end of a block.
+            if tag == RSD_BINARY_TRACE_TAG_STAGES:
+                for flags, iid, mid, comment in stages:
+                    if flags >= len(stageFlags) or comment >= len(strings):
+                        raise RSD_BinaryTraceError(
+                            "A broken stage record at offset %d" % (offset + start)
+                        )
+                    flags = stageFlags[flags]
+                    if flags is not None:
+                        stageID, stall, clear = flags
+                        onStage(stageID, stall, clear, iid, mid, strings[comment])
+            elif tag == RSD_BINARY_TRACE_TAG_CYCLE:
+                onCycle(increment)
+            else:
+                onLabel(iid, mid, pc, code)
+
+
+def Transcode(inputFileName, outputFileName):
+    """ Transcode a text RSD log to a binary trace. """
+    # Imported here because RSD_Parser imports this module.
+    from RSD_Parser import RSD_Parser
+    from CompressedStream import OpenOutputStream
+
+    class TranscodingParser(RSD_Parser):
+        """ Pass records parsed from a text log to a writer. """
+        def OnStage_(self, stageID, stall, clear, iid, mid, comment):
+            self.writer.WriteStage(stageID, True, stall, clear, iid, mid, comment)
+        def OnLabel_(self, iid, mid, pc, code):
+            self.writer.WriteLabel(iid, mid, pc, code)
+        def OnCycle_(self, increment):
+            self.writer.WriteCycle(increment)
+        def ProcessEvents_(self, dispose):
+            pass
+
+    parser = TranscodingParser()
+    outputFile = OpenOutputStream(outputFileName)
+    try:
+        parser.writer = RSD_BinaryTraceWriter(outputFile.buffer)
+        parser.Open(inputFileName)
+        parser.Parse(None)
+        parser.writer.Close()
+    finally:
+        parser.Close()
+        outputFile.close()
+
+
+#
+# The entry point of this program.
+#
+if __name__ == '__main__':
+    if ( len(sys.argv) < 3 ):
+        print( "usage: %(exe)s inputFileName outputFileName" % { 'exe': sys.argv[0] } )
+        exit(1)
+
+    Transcode(sys.argv[1], sys.argv[2])
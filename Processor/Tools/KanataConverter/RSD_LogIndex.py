@@ -0,0 +1,250 @@
+# -*- coding: utf-8 -*-
+
+#
+# A cycle index of a RSD log.
+#
+# An index is a sidecar file of a RSD log ('<log>.index'). It maps every
+# N-th cycle to a byte offset of a 'C' (cycle) line, and records a parsing
+# state at the offset, including the wrap-around base of gid used by
+# RSD_Parser.CreateGID_. A log is parsed from a checkpoint in the middle
+# of it with the state. See KanataWindowConverter.py
+#
+# An index file is a text file:
+#   RSD_LogIndex    version interval    log-size
+#   cycle   offset  line-number max-retired-op  ops-watermark   committed-op-num
+#   ...
+# 'cycle' is a cycle before a 'C' line at 'offset' is processed.
+# The first checkpoint is always the head of a log.
+#
+# An index is built in one pass with:
+#   python3 RSD_LogIndex.py [--interval N] inputFileName
+# KanataConverter.py builds it automatically when '--from-cycle' is used.
+#
+
+import os
+import sys
+import bisect
+from collections import namedtuple
+from optparse import OptionParser
+
+from RSD_Parser import RSD_Parser, RSD_ParserError, RSD_PARSER_INITIAL_CYCLE
+import CompressedStream
+from RSD_BinaryTrace import IsBinaryTraceFile
+
+#
+# Global constants
+#
+RSD_LOG_INDEX_HEADER = "RSD_LogIndex"
+RSD_LOG_INDEX_VERSION = 0
+RSD_LOG_INDEX_EXTENSION = ".index"
+
+# Cycles between checkpoints.
+RSD_LOG_INDEX_DEFAULT_INTERVAL = 2000
+
+# A parsing state at a 'C' line.
+RSD_LogCheckpoint = namedtuple(
+    "RSD_LogCheckpoint",
+    ("cycle", "offset", "lineNum", "maxRetiredOp", "opsWatermark", "committedOpNum")
+)
+
+
+class RSD_LogIndexError(Exception):
+    """ An exception class for RSD_LogIndex """
+    pass
+
+
+class RSD_LogIndexGenerator(object):
+    """ A generator that ignores events while an index is built. """
+
+    def OnCycle(self, cycle):
+        pass
+
+    def OnEvent(self, event):
+        pass
+
+
+class RSD_LogIndex(object):
+    """ Map cycles to byte offsets in a RSD log. """
+
+    def __init__(self, inputFileName, interval=RSD_LOG_INDEX_DEFAULT_INTERVAL):
+        self.inputFileName_ = inputFileName
+        self.interval_ = interval
+        self.logSize_ = 0
+        self.checkpoints_ = []
+        self.cycles_ = []   # Cycles of checkpoints for bisect
+
+    @staticmethod
+    def GetIndexFileName(inputFileName):
+        return inputFileName + RSD_LOG_INDEX_EXTENSION
+
+    @staticmethod
+    def Open(inputFileName, interval=RSD_LOG_INDEX_DEFAULT_INTERVAL):
+        """ Load the index of a log, or build and save it when it does not
+        exist or it is older than the log.
+        """
+        index = RSD_LogIndex(inputFileName, interval)
+        if not index.Load():
+            print("Building an index of %s" % inputFileName)
+            index.Build()
+            index.Save()
+        return index
+
+    #
+    # Building
+    #
+
+    def Build(self):
+        """ Parse a whole log and record checkpoints. """
+        fileName = self.inputFileName_
+        if CompressedStream.IsCompressed(fileName) or IsBinaryTraceFile(fileName):
+            raise RSD_LogIndexError(
+                "A compressed or binary log cannot be indexed: %s" % fileName
+            )
+
+        self.logSize_ = os.path.getsize(fileName)
+        self.checkpoints_ = [
+            RSD_LogCheckpoint(
+                RSD_PARSER_INITIAL_CYCLE, 0, 1, 0, -RSD_Parser.GID_WRAP_AROUND, 0
+            )
+        ]
+
+        parser = RSD_Parser()
+        generator = RSD_LogIndexGenerator()
+        interval = self.interval_
+        nextCycle = interval
+        try:
+            parser.Open(fileName)
+            begin = 0
+            for offset, cycle, newCycle in self.ScanCycleLines_(0, RSD_PARSER_INITIAL_CYCLE):
+                if newCycle < nextCycle:
+                    continue
+                nextCycle = (newCycle // interval + 1) * interval
+
+                parser.ParseRange(generator, begin, offset, False)
+                begin = offset
+                state = parser.SaveState()
+                if state["cycle"] != cycle:
+                    raise RSD_LogIndexError(
+                        "A cycle is mismatched at offset %d: %d" % (offset, state["cycle"])
+                    )
+                self.checkpoints_.append(
+                    RSD_LogCheckpoint(
+                        cycle, offset, state["lineNum"], state["maxRetiredOp"],
+                        state["opsWatermark"], state["committedOpNum"]
+                    )
+                )
+        finally:
+            parser.Close()
+        self.cycles_ = [c.cycle for c in self.checkpoints_]
+
+    def ScanCycleLines_(self, offset, cycle):
+        """ Scan 'C' lines from 'offset', where a current cycle is 'cycle'.
+        Yields (offset, cycle before the line, cycle after the line).
+        """
+        with open(self.inputFileName_, "rb") as file:
+            file.seek(offset)
+            for line in file:
+                if line.startswith(b"C\t"):
+                    newCycle = cycle + int(line[2:])
+                    yield offset, cycle, newCycle
+                    cycle = newCycle
+                offset += len(line)
+
+    #
+    # Loading and saving
+    #
+
+    def Save(self):
+        with open(self.GetIndexFileName(self.inputFileName_), "w") as file:
+            file.write(
+                "%s\t%04d\t%d\t%d\n" %
+                (RSD_LOG_INDEX_HEADER, RSD_LOG_INDEX_VERSION, self.interval_, self.logSize_)
+            )
+            for c in self.checkpoints_:
+                file.write("\t".join(str(value) for value in c) + "\n")
+
+    def Load(self):
+        """ Load an index file.
+        Returns False when it does not exist or it does not match a log.
+        """
+        indexFileName = self.GetIndexFileName(self.inputFileName_)
+        if not os.path.exists(indexFileName):
+            return False
+        if os.path.getmtime(indexFileName) < os.path.getmtime(self.inputFileName_):
+            return False
+
+        with open(indexFileName, "r") as file:
+            words = file.readline().split("\t")
+            if words[0] != RSD_LOG_INDEX_HEADER or int(words[1]) != RSD_LOG_INDEX_VERSION:
+                raise RSD_LogIndexError("An unknown index format: %s" % indexFileName)
+            self.interval_ = int(words[2])
+            self.logSize_ = int(words[3])
+            if self.logSize_ != os.path.getsize(self.inputFileName_):
+                return False
+            self.checkpoints_ = [
+                RSD_LogCheckpoint(*map(int, line.split("\t"))) for line in file
+            ]
+        self.cycles_ = [c.cycle for c in self.checkpoints_]
+        return True
+
+    #
+    # Lookup
+    #
+
+    def FindCheckpoint(self, cycle):
+        """ Return the last checkpoint at or before 'cycle'. """
+        i = bisect.bisect_right(self.cycles_, cycle) - 1
+        return self.checkpoints_[max(i, 0)]
+
+    def FindCycleLine(self, cycle):
+        """ Return an offset of the 'C' line that begins 'cycle', or the size
+        of a log when a log ends before 'cycle'.
+        """
+        # Lines before this checkpoint end at its cycle or before.
+        i = bisect.bisect_left(self.cycles_, cycle) - 1
+        checkpoint = self.checkpoints_[max(i, 0)]
+        for offset, prevCycle, newCycle in self.ScanCycleLines_(checkpoint.offset, checkpoint.cycle):
+            if newCycle >= cycle:
+                return offset
+        return self.logSize_
+
+    def GetParserState(self, checkpoint):
+        """ Return a state for RSD_Parser.LoadState at a checkpoint.
+        In-flight ops are not recorded, so they are rebuilt by parsing a
+        warm-up range after a checkpoint.
+        """
+        return {
+            "cycle": checkpoint.cycle,
+            "ops": [],
+            "opsWatermark": checkpoint.opsWatermark,
+            "events": [],
+            "flushed": [],
+            "maxRetiredOp": checkpoint.maxRetiredOp,
+            "committedOpNum": checkpoint.committedOpNum,
+            "lineNum": checkpoint.lineNum,
+        }
+
+
+#
+# The entry point of this program.
+#
+if __name__ == '__main__':
+    optionParser = OptionParser( usage="%prog [options] inputFileName" )
+    optionParser.add_option('-i', '--interval',
+                  action='store', type='int', dest='interval',
+                  default=RSD_LOG_INDEX_DEFAULT_INTERVAL,
+                  help="Record a checkpoint every specified number of cycles.")
+    options, args = optionParser.parse_args()
+
+    if ( len(args) < 1 ):
+        print( "usage: %(exe)s [options] inputFileName" % { 'exe': sys.argv[0] } )
+        exit(1)
+
+    try:
+        index = RSD_LogIndex( args[0], options.interval )
+        index.Build()
+        index.Save()
+    except IOError as err:
+        print("I/O error: %s" % err)
+    except (RSD_ParserError, RSD_LogIndexError) as err:
+        print(err)
@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+
+#
+# This script generates a synthetic RSD log.
+#
+# The generated log follows the format written by KanataDumper in
+# Verification/Dumper.sv, so it can be used to measure the performance of
+# the tools in this directory without running a simulation.
+# A simple pipeline model produces it:
+#   - An in-order front-end (Np, F, Pd, Dc, Rn, Ds) with stalls.
+#   - An issue queue (Sc) and out-of-order execution pipelines
+#     (Is, Rr, X, Mt, Ma, Rw) with back-end stalls.
+#   - In-order commitment (Cm) from an active list.
+#   - Branch mispredictions that flush all younger ops.
+# Each instruction is decoded into one op with 'mid' 0, as RISC-V
+# instructions are in Decoder.sv, so at most 'width' ops are in a stage and
+# ops appear in order of 'iid'.
+# 'iid' wraps around at 2^OP_SERIAL_WIDTH as the OpSerial signal does.
+#
+# The same parameters and seed always produce the same log, so it is used
+# by KanataConverterBenchmark.py.
+#
+# Usage:
+#   python3 RSD_LogSynthesizer.py [options] outputFileName
+#
+
+import sys
+import random
+from optparse import OptionParser
+
+from RSD_Parser import RSD_Parser
+from CompressedStream import OpenOutputStream
+
+
+class RSD_LogSynthesizer(object):
+    """ Generate a deterministic synthetic RSD log. """
+
+    # Stage IDs. See KS_* in Verification/Dumper.sv.
+    KS_NP = 0
+    KS_IF = 1
+    KS_PD = 2
+    KS_ID = 3
+    KS_RN = 4
+    KS_DS = 5
+    KS_SC = 6
+    KS_IS = 7
+    KS_RR = 8
+    KS_EX = 9
+    KS_MA = 10
+    KS_MT = 11
+    KS_RW = 12
+    KS_WC = 13
+    KS_CM = 14
+
+    FRONT_END_STAGES = [KS_NP, KS_IF, KS_PD, KS_ID, KS_RN, KS_DS]
+    INT_PIPE_STAGES = [KS_IS, KS_RR, KS_EX, KS_RW]
+    MEM_PIPE_STAGES = [KS_IS, KS_RR, KS_EX, KS_MT, KS_MA, KS_RW]
+
+    # The order of stages in a cycle in Dumper.sv.
+    DUMP_ORDER = [
+        KS_NP, KS_IF, KS_PD, KS_ID, KS_RN, KS_DS, KS_SC, KS_IS, KS_RR,
+        KS_EX, KS_MT, KS_MA, KS_RW, KS_WC, KS_CM
+    ]
+
+    PROGRAM_BASE = 0x80000000
+
+    # Instruction words used in a synthetic program.
+    # (code, kind)
+    INSN_TABLE = [
+        (0x00150513, "int"),   # addi a0, a0, 1
+        (0x00b50533, "int"),   # add a0, a0, a1
+        (0x40b50533, "int"),   # sub a0, a0, a1
+        (0x00c5f5b3, "int"),   # and a1, a1, a2
+        (0x00259593, "int"),   # slli a1, a1, 2
+        (0x000105b7, "int"),   # lui a1, 0x10
+        (0x00000597, "int"),   # auipc a1, 0x0
+        (0x0005a503, "mem"),   # lw a0, 0(a1)
+        (0x00a5a223, "mem"),   # sw a0, 4(a1)
+        (0x02b50533, "mul"),   # mul a0, a0, a1
+        (0x02b54533, "mul"),   # div a0, a0, a1
+        (0x0005a007, "mem"),   # flw ft0, 0(a1)
+        (0x001070d3, "int"),   # fadd.s ft1, ft0, ft1
+        (0xc0002573, "mem"),   # csrrs a0, cycle, zero
+    ]
+    BRANCH_CODE = 0xfeb51ce3      # bne a0, a1, -8
+
+    class Op(object):
+        """ An op in the pipeline model. """
+        def __init__(self, iid, mid, pc, code, kind, mispredict):
+            self.iid = iid
+            self.mid = mid
+            self.pc = pc
+            self.code = code
+            self.kind = kind
+            self.mispredict = mispredict
+            self.seq = 0            # Global program order.
+            self.stage = RSD_LogSynthesizer.KS_NP
+            self.pipe = None        # Remaining back-end stages.
+            self.ready = 0          # Cycle when an op in Sc becomes ready.
+            self.finished = False   # Whether an op finished Rw.
+            self.comment = ""
+
+    def __init__(
+        self, seed=1, width=2, cycles=10000,
+        flushRate=0.15, stallRate=0.05, comments=True,
+        serialWidth=RSD_Parser.OP_SERIAL_WIDTH
+    ):
+        """
+        width:       The number of instructions fetched/committed per cycle.
+        flushRate:   The probability that a branch is mispredicted.
+        stallRate:   The probability that the front-end begins stalling in
+                     a cycle. The back-end begins stalling at 1/4 of it.
+        comments:    Whether to output comments like Dumper.sv.
+        serialWidth: The bit width of OpSerial. RSD_Parser assumes
+                     RSD_Parser.OP_SERIAL_WIDTH.
+        """
+        self.rand_ = random.Random(seed)
+        self.width_ = width
+        self.cycles_ = cycles
+        self.flushRate_ = flushRate
+        self.stallRate_ = stallRate
+        self.comments_ = comments
+
+        self.issueQueueSize_ = 16 * width
+        self.activeListSize_ = 32 * width
+        self.serialMask_ = 2 ** serialWidth - 1
+
+        self.program_ = self.CreateProgram_()
+
+    def CreateProgram_(self):
+        """ Create a loop body that ends with a backward branch. """
+        body = []
+        for i in range(self.rand_.randint(8, 24)):
+            body.append(self.rand_.choice(self.INSN_TABLE))
+        body.append((self.BRANCH_CODE, "br"))
+        return body
+
+    def Generate(self, out):
+        """ Write a synthetic log to a file object 'out'. """
+        rand = self.rand_
+        width = self.width_
+        write = out.write
+
+        write("RSD_Kanata\t0000\n")
+        write("#\tS:\n")
+        write("#\tstage_id\tvalid\tstall\tclear\tiid\tmid\n")
+        write("#\tL:\n")
+        write("#\tiid\tmid\tpc\tcode\n")
+
+        frontEnd = [[] for i in self.FRONT_END_STAGES]
+        issueQueue = []
+        backEnd = []        # Ops in Is..Rw
+        activeList = []     # Ops dispatched and not committed
+        nextIID = 0
+        nextSeq = 0
+        fetchIndex = 0
+        frontStall = 0
+        backStall = 0
+        flushSeq = None     # Ops younger than this are flushed.
+
+        for cycle in range(self.cycles_):
+            write("C\t%11d\n" % 1)
+            write("#\tcycle:%d\n" % cycle)
+            lines = []
+
+            # --- Flush by branch misprediction detected at the last cycle.
+            if flushSeq is not None:
+                for stage, ops in zip(self.FRONT_END_STAGES, frontEnd):
+                    for op in ops:
+                        lines.append((stage, 0, 1, op, ""))
+                    del ops[:]
+                for op in issueQueue:
+                    if op.seq > flushSeq:
+                        lines.append((self.KS_SC, 0, 1, op, ""))
+                for op in backEnd:
+                    if op.seq > flushSeq:
+                        lines.append((op.stage, 0, 1, op, ""))
+                for op in activeList:
+                    if op.seq > flushSeq and op.finished:
+                        lines.append((self.KS_WC, 0, 1, op, ""))
+                issueQueue = [op for op in issueQueue if op.seq <= flushSeq]
+                backEnd = [op for op in backEnd if op.seq <= flushSeq]
+                activeList = [op for op in activeList if op.seq <= flushSeq]
+                fetchIndex = 0
+                flushSeq = None
+                self.WriteStages_(write, lines, frontEnd)
+                continue
+
+            # --- Commit
+            committed = 0
+            while activeList and committed < width:
+                op = activeList[0]
+                if not op.finished:
+                    break
+                activeList.pop(0)
+                comment = "\\nrelease: p%d, " % (op.seq % 64) if self.comments_ else ""
+                lines.append((self.KS_CM, 0, 0, op, comment))
+                committed += 1
+
+            # --- Back-end
+            if backStall > 0:
+                backStall -= 1
+                for op in issueQueue:
+                    lines.append((self.KS_SC, 1, 0, op, ""))
+                for op in backEnd:
+                    lines.append((op.stage, 1, 0, op, ""))
+            else:
+                if rand.random() < self.stallRate_ / 4:
+                    backStall = rand.randint(1, 3)
+                nextBackEnd = []
+                for op in backEnd:
+                    if not op.pipe:
+                        op.finished = True
+                        if op.mispredict and flushSeq is None:
+                            flushSeq = op.seq
+                        continue
+                    op.stage = op.pipe.pop(0)
+                    op.comment = ""
+                    if op.stage == self.KS_EX and self.comments_:
+                        op.comment = "\\nd:0x%x = fu(a:0x%x, b:0x%x)" % (
+                            op.seq, op.pc, op.code
+                        )
+                    nextBackEnd.append(op)
+
+                # Issue
+                issued = 0
+                for op in list(issueQueue):
+                    if issued >= width + 1:
+                        break
+                    if op.ready <= cycle:
+                        issueQueue.remove(op)
+                        if op.kind in ("mem", "mul"):
+                            op.pipe = list(self.MEM_PIPE_STAGES)
+                        else:
+                            op.pipe = list(self.INT_PIPE_STAGES)
+                        op.stage = op.pipe.pop(0)
+                        op.comment = ""
+                        nextBackEnd.append(op)
+                        issued += 1
+                backEnd = nextBackEnd
+
+                for op in issueQueue:
+                    lines.append((self.KS_SC, 0, 0, op, ""))
+                for op in backEnd:
+                    lines.append((op.stage, 0, 0, op, op.comment))
+
+            # --- Front-end
+            dispatch = frontEnd[-1]
+            dispatchable = (
+                len(issueQueue) + len(dispatch) <= self.issueQueueSize_ and
+                len(activeList) + len(dispatch) <= self.activeListSize_
+            )
+            if frontStall > 0 or not dispatchable:
+                frontStall = max(frontStall - 1, 0)
+                for stage, ops in zip(self.FRONT_END_STAGES, frontEnd):
+                    for op in ops:
+                        lines.append((stage, 1, 0, op, ""))
+            else:
+                if rand.random() < self.stallRate_:
+                    frontStall = rand.randint(1, 4)
+
+                for op in dispatch:
+                    op.ready = cycle + rand.choice((1, 1, 1, 2, 3, 6))
+                    issueQueue.append(op)
+                    activeList.append(op)
+
+                for i in range(len(frontEnd) - 1, 0, -1):
+                    frontEnd[i] = frontEnd[i - 1]
+
+                # Fetch
+                fetched = []
+                for i in range(width):
+                    code, kind = self.program_[fetchIndex]
+                    pc = self.PROGRAM_BASE + fetchIndex * 4
+                    mispredict = kind == "br" and rand.random() < self.flushRate_
+                    op = self.Op(nextIID, 0, pc, code, kind, mispredict)
+                    op.seq = nextSeq
+                    nextSeq += 1
+                    nextIID = (nextIID + 1) & self.serialMask_
+                    fetched.append(op)
+                    fetchIndex = (fetchIndex + 1) % len(self.program_)
+                frontEnd[0] = fetched
+
+                for stage, ops in zip(self.FRONT_END_STAGES, frontEnd):
+                    for op in ops:
+                        comment = ""
+                        if self.comments_:
+                            if stage == self.KS_IF and op.seq % 37 == 0:
+                                comment = "i-cache-miss\\n"
+                            elif stage == self.KS_DS:
+                                comment = "map: r%d(p%d),  = \\nprev: " % (
+                                    op.seq % 32, op.seq % 64
+                                )
+                        lines.append((stage, 0, 0, op, comment))
+
+            self.WriteStages_(write, lines, frontEnd)
+
+    def WriteStages_(self, write, lines, frontEnd):
+        """ Output stage records in the order of Dumper.sv. """
+        lines.sort(key=lambda l: self.DUMP_ORDER.index(l[0]))
+        for stage, stall, clear, op, comment in lines:
+            write(
+                "S\t%d\t1\t%d\t%d\t%d\t%d\t%s\n" %
+                (stage, stall, clear, op.iid, op.mid, comment)
+            )
+        for op in frontEnd[self.FRONT_END_STAGES.index(self.KS_ID)]:
+            write("L\t%d\t%d\t%08x\t%08x\n" % (op.iid, op.mid, op.pc, op.code))
+
+
+#
+# The entry point of this program.
+#
+if __name__ == '__main__':
+    optionParser = OptionParser( usage="%prog [options] outputFileName" )
+    optionParser.add_option('-c', '--cycles',
+                  action='store', type='int', dest='cycles', default=10000,
+                  help="The number of cycles in a log.")
+    optionParser.add_option('-w', '--width',
+                  action='store', type='int', dest='width', default=2,
+                  help="The number of instructions fetched/committed per cycle.")
+    optionParser.add_option('-f', '--flush-rate',
+                  action='store', type='float', dest='flushRate', default=0.15,
+                  help="The probability that a branch is mispredicted.")
+    optionParser.add_option('-s', '--stall-rate',
+                  action='store', type='float', dest='stallRate', default=0.05,
+                  help="The probability that the front-end begins stalling in a cycle.")
+    optionParser.add_option('--seed',
+                  action='store', type='int', dest='seed', default=1,
+                  help="A seed of random numbers.")
+    optionParser.add_option('--serial-width',
+                  action='store', type='int', dest='serialWidth',
+                  default=RSD_Parser.OP_SERIAL_WIDTH,
+                  help="The bit width of OpSerial, at which iid wraps around.")
+    optionParser.add_option('--no-comments',
+                  action='store_false', dest='comments', default=True,
+                  help="Do not output comments of stages.")
+    options, args = optionParser.parse_args()
+
+    if ( len(args) < 1 ):
+        print( "usage: %(exe)s [options] outputFileName" % { 'exe': sys.argv[0] } )
+        exit(1)
+
+    synthesizer = RSD_LogSynthesizer(
+        seed=options.seed, width=options.width, cycles=options.cycles,
+        flushRate=options.flushRate, stallRate=options.stallRate,
+        comments=options.comments, serialWidth=options.serialWidth
+    )
+    with OpenOutputStream(args[0]) as out:
+        synthesizer.Generate(out)
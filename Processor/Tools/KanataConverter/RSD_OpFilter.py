@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+
+#
+# Select ops whose events are passed to a generator.
+#
+# RSD_OpFilter is set to RSD_Parser with SetOpFilter. Events taken by
+# RSD_Parser.ProcessEvents_ are queued in the filter by cycle, and a cycle is
+# passed to a generator when all ops with events in it are kept or dropped.
+# Events of dropped ops are removed before labels are disassembled and
+# before a generator formats them, so a generator numbers only kept ops.
+#
+# An op is kept when it satisfies all of the following predicates given:
+#   pcRanges:    Its PC is in one of ranges [begin, end).
+#                It is decided when a label of the op is parsed.
+#   flushedOnly: It is flushed. It is decided when the op is flushed or
+#                retired.
+#   minStall:    It stalls 'minStall' cycles or more at once in a stage
+#                'stallStage', or in any stage if 'stallStage' is None.
+#                It is decided when a stall ends.
+# An op not decided when it is retired or flushed, when a younger op is
+# retired, or at the end of parsing, is dropped.
+#
+# With 'stages', stage and stall events are passed only for the stages in
+# it, and kept ops are shown only in these stages.
+#
+# Symbols for PC ranges are read from an ELF file or 'nm' output by
+# ReadSymbolRanges. See RSD_ProgramImage.ReadSymbols
+#
+
+from collections import deque
+
+from RSD_Event import RSD_Event
+from RSD_ProgramImage import ReadSymbols
+
+#
+# Global constants
+#
+RSD_OP_FILTER_GID_WRAP_AROUND = 2 ** 10 * 4  # See GID_WRAP_AROUND in RSD_Parser.py
+
+# Decisions of ops
+RSD_OP_FILTER_UNDECIDED = 0
+RSD_OP_FILTER_KEEP = 1
+RSD_OP_FILTER_DROP = 2
+
+
+def ReadSymbolRanges(fileName, names):
+    """ Return PC ranges [begin, end) of symbols in 'names' from an ELF file
+    or 'nm' output. A range ends at a size of a symbol, or at the next symbol.
+    """
+    symbols = ReadSymbols(fileName)
+
+    ranges = []
+    for name in names:
+        found = False
+        for i, (addr, size, symbolName, code) in enumerate(symbols):
+            if symbolName != name:
+                continue
+            if size is None:
+                following = [a for a, s, n, c in symbols[i + 1:] if a > addr]
+                end = following[0] if following else addr + 1
+            else:
+                end = addr + max(size, 1)
+            ranges.append((addr, end))
+            found = True
+        if not found:
+            raise ValueError("A symbol is not found: %s" % name)
+    return ranges
+
+
+class RSD_OpFilter(object):
+    """ Drop events of ops that do not satisfy predicates. """
+
+    class OpState(object):
+        __slots__ = ("gid", "decision", "pc", "flushed", "stalled", "stallBegin")
+
+        def __init__(self, gid):
+            self.gid = gid
+            self.decision = RSD_OP_FILTER_UNDECIDED
+            self.pc = None          # True/False when a PC is (not) in ranges
+            self.flushed = False
+            self.stalled = False    # True when an op stalls 'minStall' cycles
+            self.stallBegin = None  # A cycle when a current stall begins
+
+    def __init__(self, pcRanges=None, flushedOnly=False, minStall=None, stallStage=None, stages=None):
+        self.pcRanges_ = pcRanges
+        self.flushedOnly_ = flushedOnly
+        self.minStall_ = minStall
+        self.stallStage_ = stallStage
+        self.stages_ = stages
+
+        # Ops are stored in a window indexed by gid % GID_WRAP_AROUND like
+        # RSD_Parser.ops_. A state of an op is overwritten by a new op.
+        self.states_ = [None] * RSD_OP_FILTER_GID_WRAP_AROUND
+        # States of ops in order of INIT, to drop ops older than a retired op.
+        self.liveStates_ = deque()
+
+        # Cycles not yet passed to a generator: [cycle, [(event, state)]]
+        # Events of dropped ops and of stages not in 'stages' are not queued.
+        self.pending_ = deque()
+
+        # Event types observed to decide ops.
+        self.observed_ = set([
+            RSD_Event.INIT, RSD_Event.LABEL, RSD_Event.STALL_BEGIN,
+            RSD_Event.STALL_END, RSD_Event.FLUSH, RSD_Event.RETIRE
+        ])
+
+        # Event types passed only for 'stages'.
+        self.staged_ = set()
+        if stages is not None:
+            self.staged_ = set([
+                RSD_Event.STAGE_BEGIN, RSD_Event.STAGE_END,
+                RSD_Event.STALL_BEGIN, RSD_Event.STALL_END
+            ])
+
+    def GetState_(self, gid):
+        W = RSD_OP_FILTER_GID_WRAP_AROUND
+        state = self.states_[gid % W]
+        if state is None or state.gid != gid:
+            state = RSD_OpFilter.OpState(gid)
+            self.states_[gid % W] = state
+        return state
+
+    def IsDroppedPC(self, pc):
+        """ Return whether an op is dropped by a PC in a hexadecimal string. """
+        if self.pcRanges_ is None:
+            return False
+        pc = int(pc, 16)
+        return not any(begin <= pc < end for begin, end in self.pcRanges_)
+
+    def Add(self, cycle, events):
+        """ Queue events in 'cycle' and update decisions of their ops. """
+        W = RSD_OP_FILTER_GID_WRAP_AROUND
+        states = self.states_
+        observed = self.observed_
+        staged = self.staged_
+        stages = self.stages_
+        entries = []
+        for event in events:
+            gid = event.gid
+            state = states[gid % W]
+            if state is None or state.gid != gid:
+                state = self.GetState_(gid)
+            type = event.type
+            if state.decision == RSD_OP_FILTER_UNDECIDED and type in observed:
+                self.Observe_(cycle, event, state)
+            if state.decision == RSD_OP_FILTER_DROP:
+                continue
+            if type in staged and event.stageID not in stages:
+                continue
+            entries.append((event, state))
+        if entries:
+            self.pending_.append((cycle, entries))
+
+    def Observe_(self, cycle, event, state):
+        type = event.type
+        ended = False
+        if type == RSD_Event.LABEL:
+            if self.pcRanges_ is not None:
+                state.pc = not self.IsDroppedPC(event.comment[0])
+        elif type == RSD_Event.STALL_BEGIN:
+            if self.stallStage_ is None or event.stageID == self.stallStage_:
+                state.stallBegin = cycle
+        elif type == RSD_Event.STALL_END:
+            self.EndStall_(cycle, state)
+        elif type == RSD_Event.FLUSH:
+            state.flushed = True
+            self.EndStall_(cycle, state)
+            ended = True
+        elif type == RSD_Event.RETIRE:
+            self.EndStall_(cycle, state)
+            ended = True
+            self.DropOlderOps_(state.gid)
+        elif type == RSD_Event.INIT:
+            self.liveStates_.append(state)
+        state.decision = self.Decide_(state, ended)
+
+    def DropOlderOps_(self, gid):
+        """ Drop undecided ops older than a retired op 'gid', which are
+        disposed without being retired or flushed.
+        """
+        liveStates = self.liveStates_
+        while liveStates and liveStates[0].gid <= gid:
+            state = liveStates.popleft()
+            if state.decision == RSD_OP_FILTER_UNDECIDED and state.gid < gid:
+                state.decision = RSD_OP_FILTER_DROP
+
+    def EndStall_(self, cycle, state):
+        if state.stallBegin is not None:
+            if self.minStall_ is not None and cycle - state.stallBegin >= self.minStall_:
+                state.stalled = True
+            state.stallBegin = None
+
+    def Decide_(self, state, ended):
+        """ Return a decision of an op from predicates satisfied so far. """
+        if state.pc is False:
+            return RSD_OP_FILTER_DROP
+        undecided = (
+            (self.pcRanges_ is not None and state.pc is None) or
+            (self.flushedOnly_ and not state.flushed) or
+            (self.minStall_ is not None and not state.stalled)
+        )
+        if not undecided:
+            return RSD_OP_FILTER_KEEP
+        return RSD_OP_FILTER_DROP if ended else RSD_OP_FILTER_UNDECIDED
+
+    def Pop(self, final):
+        """ Return a list of [cycle, events] of kept ops that are ready.
+        When 'final' is True, undecided ops are dropped and all queued cycles
+        are returned.
+        """
+        ready = []
+        pending = self.pending_
+        while pending:
+            cycle, entries = pending[0]
+            for event, state in entries:
+                if state.decision == RSD_OP_FILTER_UNDECIDED:
+                    if not final:
+                        return ready
+                    state.decision = RSD_OP_FILTER_DROP
+            pending.popleft()
+            events = [event for event, state in entries if state.decision == RSD_OP_FILTER_KEEP]
+            if events:
+                ready.append((cycle, events))
+        return ready
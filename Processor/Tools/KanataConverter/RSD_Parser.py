@@ -7,9 +7,14 @@
 
 
 import re
+import heapq
 from KanataGenerator import KanataGenerator
 from RSD_Event import RSD_Event
-from RISCV_Disassembler import RISCV_Disassembler
+from RISCV_Disassembler import RISCV_Disassembler, RISCV_DisassemblyCache
+from CompressedStream import OpenInputStream
+from RSD_BinaryTrace import RSD_BinaryTraceReader, RSD_BinaryTraceError
+from RSD_BinaryTrace import IsBinaryTrace, RSD_BINARY_TRACE_MAGIC
+from ThreadedStage import ThreadedIterator
 
 #
 # Global constants
@@ -18,6 +23,9 @@ RSD_PARSER_INITIAL_CYCLE = -1
 RSD_PARSER_RETIREMENT_STAGE_ID = 14
 RSD_PARSER_CID_DEFAULT = -1
 
+# The size of a block read from an input file at once.
+RSD_PARSER_BLOCK_SIZE = 4 * 1024 * 1024
+
 class RSD_ParserError(Exception):
     """ An exception class for RSD_Parser """
     pass
@@ -86,6 +94,11 @@ class RSD_Parser(object):
     #
     class Op(object):
         """ Op class. """
+        __slots__ = (
+            "iid", "mid", "gid", "stageID", "stall", "clear",
+            "updatedCycle", "labelOutputted", "dropped"
+        )
+
         def __init__(self, iid, mid, gid, stall, clear, stageID, updatedCycle):
             self.iid = iid
             self.mid = mid
@@ -95,6 +108,7 @@ class RSD_Parser(object):
             self.clear = clear
             self.updatedCycle = updatedCycle
             self.labelOutputted = False
+            self.dropped = False    # Dropped by RSD_OpFilter. See OnLabel_
 
         def __repr__(self):
             return (
@@ -105,6 +119,8 @@ class RSD_Parser(object):
 
     class Event(object):
         """ Event class """
+        __slots__ = ("gid", "type", "stageID", "comment")
+
         def __init__(self, gid, type, stageID, comment):
             self.gid = gid
             self.type = type
@@ -126,22 +142,49 @@ class RSD_Parser(object):
         # A current processor cycle.
         self.currentCycle_ = RSD_PARSER_INITIAL_CYCLE
 
-        self.ops_ = {}       # gid -> Op map
+        # In-flight ops and flushed gids are stored in windows indexed by
+        # gid % GID_WRAP_AROUND. The number of in-flight ops is less than
+        # GID_WRAP_AROUND/2 (see CreateGID_), so live gids never collide.
+        self.ops_ = [None] * self.GID_WRAP_AROUND   # gid -> Op window
+        # Ops older than this gid are disposed. CreateGID_ can return
+        # negative gids until an op retires when parsing begins in the middle
+        # of a log, so this begins at -GID_WRAP_AROUND.
+        self.opsWatermark_ = -self.GID_WRAP_AROUND
         self.events_ = {}    # cycle -> Event map
-        self.flushedOpGIDs__ = set([])    # retired gids
+        self.eventCycles_ = []  # A heap of cycles in self.events_
+        self.flushedOpGIDs__ = [-1] * self.GID_WRAP_AROUND  # flushed gids
         self.maxRetiredOp_ = 0      # The maximum number in retired ops.
         self.committedOpNum_ = 0    # Num of committed ops.
 
         self.generator = None
-        self.lineNum_ = 1
+        self.lineNum_ = 1   # The number of a line being processed.
+
+        # Events are passed through this filter when it is set.
+        # See RSD_OpFilter.py
+        self.opFilter_ = None
 
-        self.disasm_ = RISCV_Disassembler()
+        # Labels are looked up in this image when it is set.
+        # See RSD_ProgramImage.py
+        self.programImage_ = None
+
+        # Label events are not generated when this is False unless
+        # 'opFilter_' is set. See SetLabelOutput.
+        self.outputLabels_ = True
+
+        # The max number of blocks read ahead on a worker thread, or 0 to
+        # read them on a parsing thread. See SetReadAhead.
+        self.readAhead_ = 0
+
+        self.disasm_ = RISCV_DisassemblyCache(RISCV_Disassembler())
         self.wordRe_ = re.compile(r"[\t\n\r]")
 
 
-    def Open(self, inputFileName):
+    def Open(self, inputFileName, follow=False, followTimeout=None):
+        """ Open an input file. '-' is stdin, and a growing file is
+        followed when 'follow' is True. See OpenInputStream.
+        """
         self.inputFileName_ = inputFileName
-        self.inputFile_  = open(inputFileName, "r")
+        self.inputFile_  = OpenInputStream(inputFileName, follow, followTimeout)
 
     def Close(self):
         if self.inputFile_ is not None :
@@ -184,29 +227,128 @@ class RSD_Parser(object):
             pass    # A blank line is skipped
         else:
             raise RSD_ParserError("Unknown command:'%s'" % cmd)
-       
+
+    def ProcessLines_(self, lines):
+        """ Process lines split from a block.
+        Fixed-layout records are dispatched by their first 2 characters, so
+        that comment lines are skipped without being tokenized. The other
+        lines are processed by ProcessLine_.
+        Only errors in a log are reported with a line number. Handlers
+        convert fields of a record before calling a generator, so that an
+        error in a generator is not taken as an error in a log.
+        """
+        onStage = self.OnRSD_Stage_
+        onCycle = self.OnRSD_Cycle_
+        onLabel = self.OnRSD_Label_
+        lineNum = self.lineNum_
+        try:
+            for line in lines:
+                lineNum += 1
+                head = line[:2]
+                if head == "S\t":
+                    onStage(line.split("\t"))
+                elif head == "#\t":
+                    pass    # A comment is not processed.
+                elif head == "C\t":
+                    onCycle(line.split("\t"))
+                elif head == "L\t":
+                    onLabel(line.split("\t"))
+                else:
+                    self.ProcessLine_(line)
+        except RSD_ParserError as err:
+            raise RSD_ParserError("%s at line %d" % (err, lineNum))
+        finally:
+            self.lineNum_ = lineNum
+
+    def SetReadAhead(self, depth):
+        """ Read and split blocks of a text log on a worker thread, at most
+        'depth' blocks ahead of parsing. 0 disables the worker thread.
+        See ThreadedStage.py
+        """
+        self.readAhead_ = depth
+
+    def ProcessBlocks_(self, file, size):
+        """ Read a binary file in large blocks and process lines in them.
+        At most 'size' bytes are read if 'size' is not None.
+        """
+        if self.readAhead_ == 0:
+            for lines in self.ReadLines_(file, size):
+                self.ProcessLines_(lines)
+            return
+
+        reader = ThreadedIterator(self.ReadLines_(file, size), self.readAhead_)
+        try:
+            for lines in reader:
+                self.ProcessLines_(lines)
+        finally:
+            reader.Close()
+
+    def ReadLines_(self, file, size):
+        """ Read a binary file in large blocks and yield lists of lines in
+        them. This does not touch a parsing state, so that it can run on a
+        worker thread.
+        A block is read with read1, so that data written to a pipe or a
+        followed file is processed without waiting for a whole block.
+        """
+        rest = b""
+        while True:
+            blockSize = RSD_PARSER_BLOCK_SIZE
+            if size is not None:
+                blockSize = min(blockSize, size)
+            block = file.read1(blockSize) if blockSize > 0 else b""
+            if block == b"":
+                break
+            if size is not None:
+                size -= len(block)
+
+            # A last line without a new line is carried to the next block.
+            cut = block.rfind(b"\n") + 1
+            if cut == 0:
+                rest += block
+                continue
+            text = (rest + block[:cut]).decode()
+            rest = block[cut:]
+            if "\r" in text:
+                text = text.replace("\r\n", "\n").replace("\r", "\n")
+            yield text[:-1].split("\n")
+
+        if rest != b"":
+            yield [rest.decode().rstrip("\r")]
 
     def OnRSD_Stage_(self, words):
         """ Dump a stage state.
         Format:
            'S', stage, valid, stall, flush, iid, mid, comment
+        A comment may be omitted.
         """
+        try:
+            # Check whether an op on this stage is valid or not.
+            if words[2] == 'x':
+                valid = False
+            else:
+                valid = int(words[2])
+            if(not valid):
+                return
 
-        # Check whether an op on this stage is valid or not.
-        if words[2] == 'x':
-            valid = False
-        else:
-            valid = int(words[2])
-        if(not valid):
-            return
+            stageID = int(words[1])
+            stall, clear, iid, mid = map(int, words[3:7])
+        except (ValueError, IndexError) as err:
+            raise RSD_ParserError("A broken stage record: %s" % err)
+        comment = words[7] if len(words) > 7 else ""
+        self.OnStage_(stageID, stall != 0, clear != 0, iid, mid, comment)
 
-        op = self.CreateOpFromString_(words)
+    def OnStage_(self, stageID, stall, clear, iid, mid, comment):
+        """ Process a valid op on a stage.
+        This is called from OnRSD_Stage_ and RSD_BinaryTraceReader.
+        """
+        gid = self.CreateGID_(iid, mid)
+        op = self.Op(iid, mid, gid, stall, clear, stageID, self.currentCycle_)
 
         # if both stall and clear signals are asserted, it means send bubble and
         # it is not pipeline flush.
         flush = op.clear and not op.stall
 
-        if (op.gid in self.flushedOpGIDs__):
+        if self.IsFlushedGID_(gid):
             if flush:
                 # Ops in a backend may be flush more than once, because there
                 # are ops in pipeline stages and an active list.
@@ -214,17 +356,23 @@ class RSD_Parser(object):
             else:
                 print("A retired op is dumped. op: (%s)" % op.__repr__())
 
-        comment = words[7]
         current = self.currentCycle_
-        gid = op.gid
         retire = op.stageID == RSD_PARSER_RETIREMENT_STAGE_ID
 
         if gid < self.maxRetiredOp_:
             print("A retired op is dumped. op: (%s)" % op.__repr__())
 
         # Check whether an event occurs or not.
-        if gid in self.ops_:
-            prevOp = self.ops_[ gid ]
+        prevOp = self.GetOp_(gid)
+        if prevOp is not None and prevOp.dropped:
+            # Only retirement is tracked for an op dropped by 'opFilter_'.
+            op.labelOutputted = True
+            op.dropped = True
+            if retire and prevOp.stageID != op.stageID:
+                self.RetireOp_(op)
+                self.committedOpNum_ += 1
+                self.AddEvent_(current + 1, gid, RSD_Event.RETIRE, op.stageID, "")
+        elif prevOp is not None:
             op.labelOutputted = prevOp.labelOutputted
 
             # End stalling
@@ -259,11 +407,15 @@ class RSD_Parser(object):
         # if both stall and clear signals are asserted, it means send bubble and
         # it is not pipeline flush.
         if flush:
-            prevOp = self.ops_[ gid ]
+            prevOp = self.GetOp_(gid)
+            if prevOp is None:
+                # An op is flushed when it is dumped at first.
+                # This occurs when parsing begins in the middle of a log.
+                prevOp = op
             if prevOp.stageID == 0:
                 # When an instruction was flushed in NextPCStage,
                 # delete the op from self.ops_ so that the instruction is not dumped
-                del self.ops_[ gid ]
+                self.ops_[ gid % self.GID_WRAP_AROUND ] = None
                 return
             else:
                 # Add events about flush
@@ -271,28 +423,20 @@ class RSD_Parser(object):
                 self.AddEvent_(current, gid, RSD_Event.FLUSH, op.stageID, comment)
             self.FlushOp_(op)
     
-        self.ops_[ gid ] = op
+        self.ops_[ gid % self.GID_WRAP_AROUND ] = op
 
 
-    def CreateOpFromString_(self, words):
-        """ Create an op from strings split from a source line text. 
-        Format:
-           'S', stage, stall, valid, clear, iid, mid
-        """
-        stageID = int(words[1])
-        stall = int(words[3]) != 0
-        clear = int(words[4]) != 0
-        iid = int(words[5])
-        mid = int(words[6])
-        gid = self.CreateGID_(iid, mid)
-        return self.Op(iid, mid, gid, stall, clear, stageID, self.currentCycle_)
-
     def AddEvent_(self, cycle, gid, type, stageID, comment):
         """ Add an event to an event list.  """
         event = self.Event(gid, type, stageID, comment)
-        if cycle not in self.events_:
-            self.events_[ cycle ] = []
-        self.events_[ cycle ].append(event)
+        bucket = self.events_.get(cycle)
+        if bucket is None:
+            # A new cycle is registered to the heap only once, so that
+            # ProcessEvents_ can take the oldest cycle without sorting.
+            bucket = []
+            self.events_[ cycle ] = bucket
+            heapq.heappush(self.eventCycles_, cycle)
+        bucket.append(event)
 
 
     def OnRSD_Label_(self, words):
@@ -300,86 +444,298 @@ class RSD_Parser(object):
         Format:
             'L', iid, mid, pc, code
         """
-        iid = int(words[1])
-        mid = int(words[2])
-        pc = words[3]
-        code = words[4]
+        try:
+            iid = int(words[1])
+            mid = int(words[2])
+            pc = words[3]
+            code = words[4]
+        except (ValueError, IndexError) as err:
+            raise RSD_ParserError("A broken label record: %s" % err)
+        self.OnLabel_(iid, mid, pc, code)
+
+    def OnLabel_(self, iid, mid, pc, code):
+        """ Process a label of an op.
+        This is called from OnRSD_Label_ and RSD_BinaryTraceReader.
+        """
         gid = self.CreateGID_(iid, mid)
 
-        if gid not in self.ops_:
+        op = self.GetOp_(gid)
+        if op is None:
             print("Label is outputtted with an unknown gid:%d" % gid)
-        op = self.ops_[gid]
+            return
 
         if not op.labelOutputted:
             op.labelOutputted = True
-            asmStr = self.disasm_.Disassemble(code)
-            comment = "%s: %s" % (pc, asmStr)
-            self.AddEvent_(self.currentCycle_, gid, RSD_Event.LABEL, -1, comment)
+            # Disassembly is deferred until the label is output, so ops
+            # flushed before it never pay for it. See ProcessEvents_.
+            if self.outputLabels_ or self.opFilter_ is not None:
+                self.AddEvent_(self.currentCycle_, gid, RSD_Event.LABEL, -1, (pc, code))
+            if self.opFilter_ is not None and self.opFilter_.IsDroppedPC(pc):
+                # Events of an op dropped by its PC are not generated any more.
+                op.dropped = True
 
     def OnRSD_Cycle_(self, words):
         """ Update a processor cycle.
         Format:
            'C', 'incremented value'
         """
-        self.currentCycle_ += int(words[1])
+        try:
+            increment = int(words[1])
+        except (ValueError, IndexError) as err:
+            raise RSD_ParserError("A broken cycle record: %s" % err)
+        self.OnCycle_(increment)
+
+    def OnCycle_(self, increment):
+        """ Process a cycle update.
+        This is called from OnRSD_Cycle_ and RSD_BinaryTraceReader.
+        """
+        self.currentCycle_ += increment
         self.ProcessEvents_(dispose=False)
 
 
+    def SetOpFilter(self, opFilter):
+        """ Pass only events of ops selected by a RSD_OpFilter. """
+        self.opFilter_ = opFilter
+
+    def SetLabelOutput(self, enabled):
+        """ Generate label events only when 'enabled' is True, so that labels
+        are not disassembled for a generator that does not output them.
+        They are still generated for 'opFilter_', which selects ops by PCs.
+        """
+        self.outputLabels_ = enabled
+
+    def SetProgramImage(self, programImage):
+        """ Look up labels in a RSD_ProgramImage. """
+        self.programImage_ = programImage
+
+    def FormatLabel_(self, pc, code):
+        """ Return a label of an op from its PC and instruction word. """
+        if self.programImage_ is not None:
+            return self.programImage_.FormatLabel(pc, code)
+        return "%s: %s" % (pc, self.disasm_.Disassemble(code))
+
     def ProcessEvents_(self, dispose):
+        if self.opFilter_ is not None:
+            self.ProcessFilteredEvents_(dispose)
+            return
         events = self.events_
-        for cycle in sorted(events.keys()):
+        eventCycles = self.eventCycles_
+        while eventCycles:
+            cycle = eventCycles[0]
             # イベント投入された後のサイクルで一部取り消されるものがあるためバッファする
             # 基本的に Np ステージでの命令取り消しのみのはず
             if not dispose and cycle > self.currentCycle_ - 3:
                 break
+            heapq.heappop(eventCycles)
             self.generator.OnCycle(cycle)
 
             # Extract and process events at a current cycle.
-            for e in events[cycle]:
-                if e.gid in self.ops_:
+            for e in events.pop(cycle):
+                if self.GetOp_(e.gid) is not None:
+                    if e.type == RSD_Event.LABEL:
+                        pc, code = e.comment
+                        e.comment = self.FormatLabel_(pc, code)
                     self.generator.OnEvent(e)
 
                 if e.type == RSD_Event.RETIRE:
-                    del self.ops_[e.gid]
                     # GC
-                    # リタイアした命令より古いものを削除する
-                    if e.gid % 64 == 0:
-                        for gid in list(self.ops_):
-                            if gid < e.gid:
-                                del self.ops_[gid]
+                    # リタイアした命令とそれより古いものを削除する
+                    self.DisposeOps_(e.gid + 1)
 
-            del events[cycle]
+    def ProcessFilteredEvents_(self, dispose):
+        """ Process events like ProcessEvents_ through 'opFilter_'.
+        Labels are disassembled only for events passed by the filter.
+        """
+        events = self.events_
+        eventCycles = self.eventCycles_
+        opFilter = self.opFilter_
+        ops = self.ops_
+        W = self.GID_WRAP_AROUND
+        while eventCycles:
+            cycle = eventCycles[0]
+            if not dispose and cycle > self.currentCycle_ - 3:
+                break
+            heapq.heappop(eventCycles)
 
+            live = []
+            for e in events.pop(cycle):
+                op = ops[e.gid % W]
+                if op is not None and op.gid == e.gid:
+                    live.append(e)
+                if e.type == RSD_Event.RETIRE:
+                    self.DisposeOps_(e.gid + 1)
+            opFilter.Add(cycle, live)
+
+        for cycle, kept in opFilter.Pop(dispose):
+            if not kept:
+                continue    # Cycles without events are merged in an output.
+            self.generator.OnCycle(cycle)
+            for e in kept:
+                if e.type == RSD_Event.LABEL:
+                    pc, code = e.comment
+                    e.comment = self.FormatLabel_(pc, code)
+                self.generator.OnEvent(e)
+
+
+    def GetOp_(self, gid):
+        """ Return an in-flight op with 'gid', or None. """
+        op = self.ops_[gid % self.GID_WRAP_AROUND]
+        if op is not None and op.gid == gid:
+            return op
+        return None
+
+    def DisposeOps_(self, gid):
+        """ Delete ops older than 'gid' from self.ops_.
+        Each slot is swept once while the watermark passes over it,
+        so the amortized cost per op is constant.
+        """
+        W = self.GID_WRAP_AROUND
+        ops = self.ops_
+        for g in range(max(self.opsWatermark_, gid - W), gid):
+            op = ops[g % W]
+            if op is not None and op.gid < gid:
+                ops[g % W] = None
+        self.opsWatermark_ = max(self.opsWatermark_, gid)
+
+    def IsFlushedGID_(self, gid):
+        """ Check whether an op with 'gid' is flushed and not yet passed by
+        retirement.
+        """
+        return (
+            self.flushedOpGIDs__[gid % self.GID_WRAP_AROUND] == gid and
+            gid >= self.maxRetiredOp_
+        )
 
     def RetireOp_(self, op):
+        # リタイアした命令より前のフラッシュされた命令は
+        # maxRetiredOp_ の更新によって IsFlushedGID_ から外れる
         self.maxRetiredOp_ = max(self.maxRetiredOp_, op.gid)
-        # リタイアした命令より前のフラッシュされた命令を削除
-        for gid in list(self.flushedOpGIDs__):
-            if gid < self.maxRetiredOp_:
-                self.flushedOpGIDs__.remove(gid)
 
     def FlushOp_(self, op):
-        self.flushedOpGIDs__.add(op.gid)
-        del self.ops_[op.gid]
+        self.flushedOpGIDs__[op.gid % self.GID_WRAP_AROUND] = op.gid
 
     def Parse(self, generator):
         """ Parse an input file. 
         This method includes a main loop that parses a file.
         """
         self.generator = generator
-        file = self.inputFile_
+        file = self.inputFile_.buffer
+
+        if IsBinaryTrace(file.peek(len(RSD_BINARY_TRACE_MAGIC))):
+            # Records are passed to OnStage_, OnLabel_ and OnCycle_.
+            try:
+                RSD_BinaryTraceReader(file).Parse(self)
+            except RSD_BinaryTraceError as err:
+                raise RSD_ParserError(err)
+            self.ProcessEvents_(dispose=True)
+            return
         
         # Process a file header.
         headerLine = file.readline()
-        self.ProcessHeader_(headerLine)
+        self.ProcessHeader_(headerLine.decode())
         
         # Parse lines.
-        while True:
-            line = file.readline()
-            if line == "" :
-                break
-            self.ProcessLine_(line)
-            self.lineNum_ = self.lineNum_ + 1
+        self.ProcessBlocks_(file, None)
 
         self.ProcessEvents_(dispose=True)
 
+    def ParseRange(self, generator, begin, end, dispose):
+        """ Parse lines in a byte range [begin, end) of an input file.
+        'begin' and 'end' must point to the beginning of lines, and an input
+        file must not be compressed.
+        A file header is processed only when 'begin' is 0. Pending events are
+        processed only when 'dispose' is True, so that a following range can
+        be parsed with the same state.
+        """
+        self.generator = generator
+        file = self.inputFile_.buffer
+        file.seek(begin)
+
+        if begin == 0:
+            headerLine = file.readline()
+            self.ProcessHeader_(headerLine.decode())
+
+        self.ProcessBlocks_(file, end - file.tell())
+
+        if dispose:
+            self.ProcessEvents_(dispose=True)
+
+    #
+    # Parsing state
+    # A state is saved at a boundary of byte ranges when a log is
+    # converted in parallel. See KanataParallelConverter.py
+    #
+
+    def SaveState(self):
+        """ Return a picklable snapshot of a parsing state. """
+        events = self.events_
+        return {
+            "cycle": self.currentCycle_,
+            "ops": sorted(
+                (op.gid, op.iid, op.mid, op.stall, op.clear, op.stageID,
+                 op.updatedCycle, op.labelOutputted)
+                for op in self.ops_ if op is not None
+            ),
+            "opsWatermark": self.opsWatermark_,
+            "events": [
+                (cycle, [(e.gid, e.type, e.stageID, e.comment) for e in events[cycle]])
+                for cycle in sorted(events)
+            ],
+            "flushed": sorted(
+                gid for gid in self.flushedOpGIDs__ if gid >= self.maxRetiredOp_
+            ),
+            "maxRetiredOp": self.maxRetiredOp_,
+            "committedOpNum": self.committedOpNum_,
+            "lineNum": self.lineNum_,
+        }
+
+    def LoadState(self, state):
+        """ Restore a parsing state saved by SaveState. """
+        W = self.GID_WRAP_AROUND
+        self.currentCycle_ = state["cycle"]
+
+        self.ops_ = [None] * W
+        for gid, iid, mid, stall, clear, stageID, updatedCycle, labelOutputted in state["ops"]:
+            op = self.Op(iid, mid, gid, stall, clear, stageID, updatedCycle)
+            op.labelOutputted = labelOutputted
+            self.ops_[gid % W] = op
+        self.opsWatermark_ = state["opsWatermark"]
+
+        self.events_ = {}
+        self.eventCycles_ = []
+        for cycle, events in state["events"]:
+            for gid, type, stageID, comment in events:
+                self.AddEvent_(cycle, gid, type, stageID, comment)
+
+        self.flushedOpGIDs__ = [-1] * W
+        for gid in state["flushed"]:
+            self.flushedOpGIDs__[gid % W] = gid
+        self.maxRetiredOp_ = state["maxRetiredOp"]
+        self.committedOpNum_ = state["committedOpNum"]
+        self.lineNum_ = state["lineNum"]
+
+    @staticmethod
+    def RelocateState(state, gidOffset, cycleOffset):
+        """ Shift gids and cycles in a state saved by SaveState.
+        'gidOffset' must be a multiple of GID_WRAP_AROUND.
+        """
+        return {
+            "cycle": state["cycle"] + cycleOffset,
+            "ops": [
+                (gid + gidOffset, iid, mid, stall, clear, stageID,
+                 updatedCycle + cycleOffset, labelOutputted)
+                for gid, iid, mid, stall, clear, stageID, updatedCycle, labelOutputted
+                in state["ops"]
+            ],
+            "opsWatermark": state["opsWatermark"] + gidOffset,
+            "events": [
+                (cycle + cycleOffset,
+                 [(gid + gidOffset, type, stageID, comment)
+                  for gid, type, stageID, comment in events])
+                for cycle, events in state["events"]
+            ],
+            "flushed": [gid + gidOffset for gid in state["flushed"]],
+            "maxRetiredOp": state["maxRetiredOp"] + gidOffset,
+            "committedOpNum": state["committedOpNum"],
+            "lineNum": state["lineNum"],
+        }
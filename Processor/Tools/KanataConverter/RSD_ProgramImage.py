@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+
+#
+# A program image of a test decoded into a table indexed by PC.
+#
+# A program image is loaded and disassembled once when RSD_ProgramImage is
+# constructed. It is set to RSD_Parser with SetProgramImage, and then a
+# label of an op is looked up in the table by its PC instead of being
+# disassembled, and it is annotated with 'function+offset' of a symbol:
+#   00001010: addi a0, a0, 1  # main+0x10
+# An op whose PC is not in an image, or whose instruction word differs from
+# the image (e.g. self-modifying code), falls back to disassembly of its
+# word. A label begins with a PC followed by ':' in either case.
+#
+# An image is loaded from:
+#   ELF:       Executable sections and symbols in '.symtab'.
+#   code.hex:  A memory image made by BinaryToHex.py. A line has 16 bytes
+#              in order from the highest address. Physical addresses in the
+#              image are mapped to logical ones with the memory map in
+#              MemoryMapTypes.sv, or are offset by 'base' when it is given.
+#              Symbols are read from another file with 'symbolFileName'.
+# A symbol file is an ELF file or the output of 'nm' or 'nm -S'.
+#
+# Usage:
+#   python3 RSD_ProgramImage.py [--base ADDR] [--symbol-file FILE] imageFileName
+#   Dump the decoded table.
+#
+
+import sys
+import struct
+import bisect
+from optparse import OptionParser
+
+from RISCV_Disassembler import RISCV_Disassembler, RISCV_DisassemblyCache
+
+#
+# Global constants
+#
+
+# Physical address ranges in code.hex mapped to logical addresses:
+# (physical begin, physical end, logical begin). See MemoryMapTypes.sv
+RSD_PROGRAM_IMAGE_MEMORY_MAP = (
+    (0x0_0000, 0x1_0000, 0x0000_0000),  # Section 0 (ROM)
+    (0x1_0000, 0x5_0000, 0x8000_0000),  # Section 1 (RAM)
+)
+
+# Bytes in a line of code.hex. See ENTRY_BYTE_SIZE in BinaryToHex.py
+RSD_PROGRAM_IMAGE_HEX_LINE_SIZE = 16
+
+# ELF constants
+ELF_MAGIC = b"\x7fELF"
+ELF_CLASS_64 = 2
+ELF_DATA_BIG_ENDIAN = 2
+ELF_SHT_SYMTAB = 2
+ELF_SHT_NOBITS = 8
+ELF_SHF_EXECINSTR = 0x4
+ELF_STT_NOTYPE = 0
+ELF_STT_FUNC = 2
+ELF_STT_SECTION = 3
+ELF_STT_FILE = 4
+ELF_SHN_UNDEF = 0
+ELF_SHN_LORESERVE = 0xff00
+
+# Types of 'nm' symbols in code sections.
+NM_CODE_SYMBOL_TYPES = "TtWw"
+
+
+class RSD_ProgramImageError(Exception):
+    """ An exception class for RSD_ProgramImage """
+    pass
+
+
+def IsELFFile(fileName):
+    """ Return whether a file is an ELF file. """
+    with open(fileName, "rb") as file:
+        return file.read(len(ELF_MAGIC)) == ELF_MAGIC
+
+
+def ReadELF(fileName):
+    """ Return (sections, symbols) of an ELF file.
+    sections: A list of (address, bytes, executable) of loaded sections.
+    symbols:  A list of (address, size, name, code) sorted by address.
+              'size' is None for a symbol without a size, and 'code' is
+              True for a function or a label in an executable section.
+    """
+    with open(fileName, "rb") as file:
+        data = file.read()
+    if data[:len(ELF_MAGIC)] != ELF_MAGIC:
+        raise RSD_ProgramImageError("Not an ELF file: %s" % fileName)
+
+    order = ">" if data[5] == ELF_DATA_BIG_ENDIAN else "<"
+    is64 = data[4] == ELF_CLASS_64
+    if is64:
+        header = struct.Struct(order + "HHIQQQIHHHHHH")
+        section = struct.Struct(order + "IIQQQQIIQQ")
+        symbol = struct.Struct(order + "IBBHQQ")
+    else:
+        header = struct.Struct(order + "HHIIIIIHHHHHH")
+        section = struct.Struct(order + "IIIIIIIIII")
+        symbol = struct.Struct(order + "IIIBBH")
+
+    try:
+        (_, _, _, _, _, shoff, _, _, _, _, shentsize, shnum, _) = header.unpack_from(data, 16)
+        headers = [
+            section.unpack_from(data, shoff + i * shentsize) for i in range(shnum)
+        ]
+
+        sections = []
+        symbols = []
+        for name, type, flags, addr, offset, size, link, info, align, entsize in headers:
+            if type == ELF_SHT_SYMTAB:
+                strOffset = headers[link][4]
+                for pos in range(offset, offset + size, entsize):
+                    if is64:
+                        nameOffset, stInfo, _, shndx, value, stSize = symbol.unpack_from(data, pos)
+                    else:
+                        nameOffset, value, stSize, stInfo, _, shndx = symbol.unpack_from(data, pos)
+                    stType = stInfo & 0xf
+                    if (stType in (ELF_STT_SECTION, ELF_STT_FILE) or
+                        shndx == ELF_SHN_UNDEF or shndx >= ELF_SHN_LORESERVE):
+                        continue
+                    end = data.index(b"\0", strOffset + nameOffset)
+                    symbolName = data[strOffset + nameOffset:end].decode("utf-8", "replace")
+                    if symbolName == "" or symbolName.startswith("$"):
+                        continue    # Mapping symbols
+                    code = (
+                        stType in (ELF_STT_NOTYPE, ELF_STT_FUNC) and
+                        (headers[shndx][2] & ELF_SHF_EXECINSTR) != 0
+                    )
+                    symbols.append((value, stSize if stSize > 0 else None, symbolName, code))
+            elif addr != 0 and type != ELF_SHT_NOBITS and size > 0:
+                sections.append(
+                    (addr, data[offset:offset + size], (flags & ELF_SHF_EXECINSTR) != 0)
+                )
+    except (struct.error, IndexError, ValueError):
+        raise RSD_ProgramImageError("A broken ELF file: %s" % fileName)
+
+    symbols.sort(key=lambda symbol: symbol[0])
+    return sections, symbols
+
+
+def ReadSymbols(fileName):
+    """ Return a list of (address, size, name, code) of symbols sorted by
+    address from an ELF file or the output of 'nm' or 'nm -S'.
+    See ReadELF
+    """
+    if IsELFFile(fileName):
+        return ReadELF(fileName)[1]
+
+    symbols = []
+    with open(fileName, "r") as file:
+        for line in file:
+            words = line.split()
+            try:
+                if len(words) == 4:
+                    addr, size, type, name = words
+                    size = int(size, 16)
+                elif len(words) == 3:
+                    addr, type, name = words
+                    size = None
+                else:
+                    continue
+                symbols.append((int(addr, 16), size, name, type in NM_CODE_SYMBOL_TYPES))
+            except ValueError:
+                continue
+    symbols.sort(key=lambda symbol: symbol[0])
+    return symbols
+
+
+def ReadHex(fileName, base=None):
+    """ Return a dictionary of logical address -> word from code.hex.
+    Addresses in the image are offset by 'base' when it is given, or are
+    mapped with RSD_PROGRAM_IMAGE_MEMORY_MAP. Zero words are not returned.
+    """
+    words = {}
+    lineSize = RSD_PROGRAM_IMAGE_HEX_LINE_SIZE
+    with open(fileName, "r") as file:
+        for lineNum, line in enumerate(file):
+            line = line.strip()
+            if line == "":
+                continue
+            try:
+                entry = bytes.fromhex(line)[::-1]   # In order of addresses
+            except ValueError:
+                raise RSD_ProgramImageError(
+                    "A broken hex file: %s at line %d" % (fileName, lineNum + 1)
+                )
+            addr = lineNum * lineSize
+            if base is not None:
+                logical = base + addr
+            else:
+                for begin, end, logicalBegin in RSD_PROGRAM_IMAGE_MEMORY_MAP:
+                    if begin <= addr < end:
+                        logical = logicalBegin + addr - begin
+                        break
+                else:
+                    continue
+            for offset, (word,) in enumerate(struct.iter_unpack("<I", entry)):
+                if word != 0:
+                    words[logical + offset * 4] = word
+    return words
+
+
+class RSD_ProgramImage(object):
+    """ Labels of instructions in a program image indexed by PC. """
+
+    def __init__(self, fileName, base=None, symbolFileName=None):
+        """ Load and disassemble an ELF file or code.hex.
+        Symbols are read from 'symbolFileName' if it is given, or from an
+        ELF file.
+        """
+        if IsELFFile(fileName):
+            sections, symbols = ReadELF(fileName)
+            words = {}
+            for addr, data, executable in sections:
+                if executable:
+                    n = len(data) // 4
+                    for i, (word,) in enumerate(struct.iter_unpack("<I", data[:n * 4])):
+                        words[addr + i * 4] = word
+        else:
+            words = ReadHex(fileName, base)
+            symbols = []
+        if symbolFileName is not None:
+            symbols = ReadSymbols(symbolFileName)
+
+        # Symbols in code for annotation. Of symbols at the same address, one
+        # with a size (a function) is preferred to one without it (a label).
+        self.symbols_ = []
+        for addr, size, name, code in symbols:
+            if not code:
+                continue
+            if self.symbols_ and self.symbols_[-1][0] == addr:
+                if self.symbols_[-1][1] is not None or size is None:
+                    continue
+                self.symbols_.pop()
+            self.symbols_.append((addr, size, name))
+        self.symbolAddrs_ = [addr for addr, size, name in self.symbols_]
+
+        # PC -> (instruction word in a hexadecimal string, text after a PC
+        # in a label)
+        # Each distinct word is disassembled once.
+        disasm = RISCV_Disassembler()
+        asms = {}
+        self.table_ = {}
+        for addr, word in words.items():
+            asm = asms.get(word)
+            if asm is None:
+                asm = disasm.Format(disasm.Decode(word))
+                asms[word] = asm
+            self.table_[addr] = ("%08x" % word, self.Annotate_(addr, asm))
+
+        # Words that do not match the image are disassembled on demand.
+        self.disasm_ = RISCV_DisassemblyCache(disasm)
+
+        # Statistics
+        self.hits = 0
+        self.misses = 0
+
+    def GetSymbol(self, addr):
+        """ Return 'function+offset' of an address, or None. """
+        i = bisect.bisect_right(self.symbolAddrs_, addr) - 1
+        if i < 0:
+            return None
+        begin, size, name = self.symbols_[i]
+        if size is not None and addr >= begin + size:
+            return None
+        if addr == begin:
+            return name
+        return "%s+0x%x" % (name, addr - begin)
+
+    def Annotate_(self, addr, asm):
+        symbol = self.GetSymbol(addr)
+        return asm if symbol is None else "%s  # %s" % (asm, symbol)
+
+    def FormatLabel(self, pc, code):
+        """ Return a label of an op from a PC and an instruction word in
+        hexadecimal strings.
+        """
+        try:
+            addr = int(pc, 16)
+        except ValueError:
+            return "%s: %s" % (pc, self.disasm_.Disassemble(code))
+        entry = self.table_.get(addr)
+        if entry is not None and entry[0] == code:
+            self.hits += 1
+            return "%s: %s" % (pc, entry[1])
+        self.misses += 1
+        return "%s: %s" % (pc, self.Annotate_(addr, self.disasm_.Disassemble(code)))
+
+    def Dump(self, file):
+        """ Write the table in order of PCs. """
+        for addr in sorted(self.table_):
+            word, text = self.table_[addr]
+            file.write("%08x\t%s\t%s\n" % (addr, word, text))
+
+
+#
+# The entry point of this program.
+#
+if __name__ == '__main__':
+    optionParser = OptionParser( usage="%prog [options] imageFileName" )
+    optionParser.add_option('--base',
+                  action='store', type='string', dest='base', default=None,
+                  help="A hexadecimal logical address of the head of code.hex.")
+    optionParser.add_option('--symbol-file',
+                  action='store', type='string', dest='symbolFile', default=None,
+                  help="Read symbols from an ELF file or the output of 'nm' or 'nm -S'.")
+    options, args = optionParser.parse_args()
+
+    if ( len(args) < 1 ):
+        print( "usage: %(exe)s [options] imageFileName" % { 'exe': sys.argv[0] } )
+        exit(1)
+
+    try:
+        base = int( options.base, 16 ) if options.base is not None else None
+        image = RSD_ProgramImage( args[0], base, options.symbolFile )
+        image.Dump( sys.stdout )
+    except (ValueError, IOError, RSD_ProgramImageError) as err:
+        print( err )
+        exit(1)
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+#
+# Run stages of a conversion on worker threads.
+#
+# A conversion is a pipeline of 3 stages:
+#   read/decode:   Reading blocks of a log and splitting them into lines.
+#                  RSD_Parser runs it on a worker thread with ThreadedIterator
+#                  when SetReadAhead is called.
+#   parse/event:   Parsing lines and generating events on a calling thread.
+#                  See RSD_Parser.Parse
+#   format/write:  Formatting and writing events by a generator.
+#                  ThreadedGenerator runs any generator on a worker thread.
+# Stages are connected by bounded queues of batches, because passing each
+# line or event through a queue is much slower than processing it.
+#
+# Python threads do not run Python code in parallel, so these stages mainly
+# overlap blocking reads and writes with parsing. (De)compression runs on
+# its own threads in CompressedStream.py.
+#
+
+import queue
+import threading
+
+#
+# Global constants
+#
+
+# The number of cycles and events passed to a worker thread at once.
+THREADED_STAGE_BATCH_SIZE = 4096
+
+# The max number of batches queued for a worker thread.
+THREADED_STAGE_QUEUE_DEPTH = 16
+
+
+class ThreadedIterator(object):
+    """ Iterate over items produced by an iterable on a worker thread.
+    At most 'queueDepth' items are produced ahead of a consumer. An error in
+    a worker thread is raised to a consumer.
+    """
+
+    END = object()  # A sentinel put after the last item
+
+    def __init__(self, iterable, queueDepth=THREADED_STAGE_QUEUE_DEPTH):
+        self.iterable_ = iterable
+        self.queue_ = queue.Queue(queueDepth)
+        self.error_ = None
+        self.stopped_ = False
+        self.thread_ = threading.Thread(target=self.Run_)
+        self.thread_.daemon = True
+        self.thread_.start()
+
+    def Run_(self):
+        try:
+            for item in self.iterable_:
+                if self.stopped_:
+                    break
+                self.queue_.put(item)
+        except Exception as err:
+            self.error_ = err
+        finally:
+            self.queue_.put(self.END)
+
+    def __iter__(self):
+        while True:
+            item = self.queue_.get()
+            if item is self.END:
+                self.queue_.put(self.END)   # Later calls also end.
+                if self.error_ is not None:
+                    raise self.error_
+                return
+            yield item
+
+    def Close(self):
+        """ Stop a worker thread. Items not yet consumed are discarded. """
+        self.stopped_ = True
+        while self.thread_.is_alive():
+            try:
+                self.queue_.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        self.thread_.join()
+
+
+class ThreadedGenerator(object):
+    """ Run a generator on a worker thread.
+    Cycles and events are batched, because passing each of them through a
+    queue is much slower than processing it.
+    """
+
+    def __init__(self, generator, queueDepth=THREADED_STAGE_QUEUE_DEPTH):
+        self.generator_ = generator
+        self.queue_ = queue.Queue(queueDepth)
+        self.batch_ = []
+        self.error_ = None
+        self.thread_ = threading.Thread(target=self.Run_)
+        self.thread_.daemon = True
+        self.thread_.start()
+
+    def Run_(self):
+        onCycle = self.generator_.OnCycle
+        onEvent = self.generator_.OnEvent
+        while True:
+            batch = self.queue_.get()
+            if batch is None:
+                break
+            if self.error_ is not None:
+                continue    # Drain the queue so that a producer is not blocked.
+            try:
+                for item in batch:
+                    # A cycle is an int, and the others are events.
+                    if type(item) is int:
+                        onCycle(item)
+                    else:
+                        onEvent(item)
+            except Exception as err:
+                self.error_ = err
+
+    def Put_(self):
+        if self.error_ is not None:
+            raise self.error_
+        self.queue_.put(self.batch_)
+        self.batch_ = []
+
+    def OnCycle(self, cycle):
+        self.batch_.append(cycle)
+        if len(self.batch_) >= THREADED_STAGE_BATCH_SIZE:
+            self.Put_()
+
+    def OnEvent(self, event):
+        self.batch_.append(event)
+
+    def Close(self):
+        """ Wait for a worker thread and close a generator. """
+        if self.thread_ is not None:
+            if self.batch_:
+                self.queue_.put(self.batch_)
+                self.batch_ = []
+            self.queue_.put(None)
+            self.thread_.join()
+            self.thread_ = None
+        try:
+            if self.error_ is not None:
+                raise self.error_
+        finally:
+            self.generator_.Close()
@@ -0,0 +1,438 @@
+# -*- coding: utf-8 -*-
+
+#
+# This script computes a top-down breakdown of pipeline slots of a RSD log.
+#
+# TopDownGenerator has the same OnCycle/OnEvent interface as
+# KanataGenerator, and is driven by RSD_Parser in the same way. Every cycle
+# has 'width' dispatch slots, and each slot is classified into one of:
+#
+#   retiring:        An op is dispatched in the slot and retires later.
+#   badSpeculation:  An op is dispatched in the slot and is flushed later,
+#                    or the slot is empty while the frontend refills after
+#                    dispatched ops are flushed.
+#   frontendBound:   The slot is empty because no op is delivered from the
+#                    frontend (Np/F/Pd/Dc/Rn).
+#   backendBound:    The slot is empty because ops stall in Rn/Ds, or an op
+#                    stays in Ds, since the backend (Ds/Sc/Is and later
+#                    stages) cannot accept them.
+#
+# An op is dispatched in a cycle when it is in Ds without stalling. A slot
+# of an op dispatched but neither retired nor flushed at the end of a log
+# is counted as unresolved.
+#
+# Slots are also counted in windows of 'window' cycles. Each entry of a
+# timeline is [the first cycle of a window, fractions of retiring,
+# badSpeculation, frontendBound and backendBound in the window]. When there
+# are more than 'maxWindows' windows, adjacent windows are merged and
+# 'window' is doubled, so that a timeline of a long log stays bounded.
+#
+# Results are written as a table, as JSON when an output file name ends
+# with '.json', or as CSV when it ends with '.csv'.
+#
+# Usage:
+#   python3 TopDownGenerator.py [options] inputFileName outputFileName
+#
+
+import sys
+import csv
+import json
+import collections
+from optparse import OptionParser
+
+from RSD_Event import RSD_Event
+from KanataGenerator import KANATA_CONVERTER_STAGE_NAME_TABLE
+from KanataGenerator import KANATA_CONVERTER_GID_WRAP_AROUND
+
+#
+# Global constants
+#
+TOP_DOWN_RENAME_STAGE_ID = KANATA_CONVERTER_STAGE_NAME_TABLE.index("Rn")
+TOP_DOWN_DISPATCH_STAGE_ID = KANATA_CONVERTER_STAGE_NAME_TABLE.index("Ds")
+
+# See CONF_DISPATCH_WIDTH in MicroArchConf.sv
+TOP_DOWN_DEFAULT_WIDTH = 2
+TOP_DOWN_DEFAULT_WINDOW = 1000
+TOP_DOWN_DEFAULT_MAX_WINDOWS = 4096
+
+# Categories of slots
+TOP_DOWN_RETIRING = 0
+TOP_DOWN_BAD_SPECULATION = 1
+TOP_DOWN_FRONTEND_BOUND = 2
+TOP_DOWN_BACKEND_BOUND = 3
+TOP_DOWN_CATEGORY_NAMES = ["retiring", "badSpeculation", "frontendBound", "backendBound"]
+
+
+class TopDownGenerator(object):
+    """ Classify dispatch slots into top-down categories. """
+
+    class Op(object):
+        """ A state of an in-flight op. """
+        __slots__ = ("gid", "stageID", "stallStageID", "dispatchCycle")
+
+        def __init__(self, gid):
+            self.gid = gid
+            self.stageID = None
+            self.stallStageID = None
+            self.dispatchCycle = None
+
+    def __init__(self, width=TOP_DOWN_DEFAULT_WIDTH, window=TOP_DOWN_DEFAULT_WINDOW,
+                 maxWindows=TOP_DOWN_DEFAULT_MAX_WINDOWS):
+        if width < 1 or window < 1 or maxWindows < 1:
+            raise ValueError("A width, a window and the maximum number of windows must be positive.")
+        self.width_ = width
+        self.window_ = window
+        self.maxWindows_ = maxWindows
+        self.outputFileName_ = ""
+
+        # gid -> Op. See opMap_ in KanataGenerator.py
+        self.ops_ = [None] * KANATA_CONVERTER_GID_WRAP_AROUND
+        self.opsWatermark_ = -KANATA_CONVERTER_GID_WRAP_AROUND
+
+        self.currentCycle_ = None
+
+        self.dispatchOps_ = {}      # gid -> Op in Ds
+        self.blockedOps_ = 0        # The number of ops stalling in Rn/Ds
+        self.recovering_ = False    # True until an op is dispatched after a flush
+
+        # Window index -> [slots, slots of each category]
+        self.windows_ = {}
+        self.cycles_ = 0
+        self.overflowSlots_ = 0     # Slots of ops dispatched over 'width'
+        self.unresolvedSlots_ = 0
+
+        # Event handlers indexed by an event type.
+        handlers = {
+            RSD_Event.INIT: self.OnInitialize_,
+            RSD_Event.STAGE_BEGIN: self.OnStageBegin_,
+            RSD_Event.STAGE_END: self.OnStageEnd_,
+            RSD_Event.STALL_BEGIN: self.OnStallBegin_,
+            RSD_Event.STALL_END: self.OnStallEnd_,
+            RSD_Event.RETIRE: self.OnRetire_,
+            RSD_Event.FLUSH: self.OnFlush_,
+            RSD_Event.LABEL: self.OnIgnore_,
+        }
+        self.eventHandlers_ = [handlers[type] for type in range(len(handlers))]
+
+    #
+    # File open/close
+    # Results are written when a generator is closed.
+    #
+    def Open(self, fileName):
+        self.outputFileName_ = fileName
+
+    def Close(self):
+        if self.outputFileName_ == "":
+            return
+        results = self.GetResults()
+        if self.overflowSlots_ > 0:
+            print(
+                "Warning: %d ops are dispatched over a width of %d. "
+                "They are counted in extra slots." % (self.overflowSlots_, self.width_)
+            )
+        lowerName = self.outputFileName_.lower()
+        with open(self.outputFileName_, "w") as file:
+            if lowerName.endswith(".json"):
+                json.dump(results, file, indent=2)
+                file.write("\n")
+            elif lowerName.endswith(".csv"):
+                self.WriteCSV_(file, results)
+            else:
+                self.WriteTable_(file, results)
+        self.outputFileName_ = ""
+
+    #
+    # Interface for RSD_Parser
+    #
+    def OnCycle(self, cycle):
+        """ This method is called from RSD_Parser """
+        if self.currentCycle_ is not None and cycle > self.currentCycle_:
+            self.AccountCycles_(cycle)
+        self.currentCycle_ = cycle
+
+    def OnEvent(self, event):
+        """ This method is called from RSD_Parser """
+        op = self.ops_[event.gid % KANATA_CONVERTER_GID_WRAP_AROUND]
+        if op is not None and op.gid == event.gid:
+            self.eventHandlers_[event.type](event, op)
+        elif event.type == RSD_Event.INIT:
+            self.OnInitialize_(event, None)
+
+    def AccountCycles_(self, cycle):
+        """ Classify slots from a current cycle to 'cycle'. """
+        current = self.currentCycle_
+
+        # Ops in Ds without stalling are dispatched in a current cycle.
+        # The others wait in Ds.
+        used = 0
+        waiting = 0
+        for op in self.dispatchOps_.values():
+            if op.stallStageID is None and op.dispatchCycle is None:
+                op.dispatchCycle = current
+                used += 1
+            else:
+                waiting += 1
+        if used > 0:
+            self.recovering_ = False
+        if used > self.width_:
+            # Ops dispatched over a width have extra slots, so that
+            # categories of a window sum up to its slots.
+            self.GetWindow_(current)[0] += used - self.width_
+            self.overflowSlots_ += used - self.width_
+        self.AddSlots_(current, 1, self.GetEmptyCategory_(waiting), max(self.width_ - used, 0))
+
+        # No op is dispatched in the rest of the cycles, because RSD_Parser
+        # calls OnCycle for every cycle with events. All ops in Ds wait.
+        if cycle - current > 1:
+            self.AddSlots_(
+                current + 1, cycle - current - 1,
+                self.GetEmptyCategory_(len(self.dispatchOps_)), self.width_
+            )
+
+    def GetEmptyCategory_(self, waiting):
+        """ Return a category of empty slots when 'waiting' ops wait in Ds. """
+        if self.blockedOps_ > 0 or waiting > 0:
+            return TOP_DOWN_BACKEND_BOUND
+        if self.recovering_:
+            return TOP_DOWN_BAD_SPECULATION
+        return TOP_DOWN_FRONTEND_BOUND
+
+    def AddSlots_(self, begin, cycles, category, emptySlots):
+        """ Add slots of 'cycles' cycles from 'begin', and 'emptySlots'
+        empty slots of 'category' in each cycle. Cycles are split into
+        windows.
+        """
+        end = begin + cycles
+        self.cycles_ += cycles
+        while begin < end:
+            entry = self.GetWindow_(begin)
+            size = self.window_     # Windows may be merged by GetWindow_
+            n = min(end, (begin // size + 1) * size) - begin
+            entry[0] += self.width_ * n
+            entry[1 + category] += emptySlots * n
+            begin += n
+
+    def GetWindow_(self, cycle):
+        """ Return an entry of a window including 'cycle'. """
+        entry = self.windows_.get(cycle // self.window_)
+        if entry is None:
+            entry = self.windows_[cycle // self.window_] = [0] * (1 + len(TOP_DOWN_CATEGORY_NAMES))
+            if len(self.windows_) > self.maxWindows_:
+                self.MergeWindows_()
+                entry = self.windows_[cycle // self.window_]
+        return entry
+
+    def MergeWindows_(self):
+        """ Double the size of windows by merging adjacent windows. """
+        while len(self.windows_) > self.maxWindows_:
+            windows = {}
+            for window, entry in self.windows_.items():
+                merged = windows.get(window // 2)
+                if merged is None:
+                    windows[window // 2] = entry
+                else:
+                    for i in range(len(entry)):
+                        merged[i] += entry[i]
+            self.windows_ = windows
+            self.window_ *= 2
+
+    def AddOpSlot_(self, op, category):
+        """ Add a slot of a dispatched op when it is resolved. """
+        if op.dispatchCycle is not None:
+            self.GetWindow_(op.dispatchCycle)[1 + category] += 1
+            op.dispatchCycle = None
+
+    def DisposeOps_(self, gid):
+        """ Delete ops older than 'gid'. See DisposeOps_ in KanataGenerator.py """
+        W = KANATA_CONVERTER_GID_WRAP_AROUND
+        ops = self.ops_
+        for g in range(max(self.opsWatermark_, gid - W), gid):
+            op = ops[g % W]
+            if op is not None and op.gid < gid:
+                # An op disposed without being retired or flushed.
+                if op.dispatchCycle is not None:
+                    self.unresolvedSlots_ += 1
+                self.RemoveOp_(op)
+                ops[g % W] = None
+        self.opsWatermark_ = max(self.opsWatermark_, gid)
+
+    def RemoveOp_(self, op):
+        """ Remove an op from stages and stalls. """
+        self.EndStall_(op)
+        if op.stageID == TOP_DOWN_DISPATCH_STAGE_ID:
+            del self.dispatchOps_[op.gid]
+        op.stageID = None
+
+    def EndStall_(self, op):
+        if op.stallStageID in (TOP_DOWN_RENAME_STAGE_ID, TOP_DOWN_DISPATCH_STAGE_ID):
+            self.blockedOps_ -= 1
+        op.stallStageID = None
+
+    #
+    # Event handlers
+    # 'op' is a state of an event op. It is None when INIT adds a new op.
+    #
+    def OnIgnore_(self, event, op):
+        pass
+
+    def OnInitialize_(self, event, op):
+        self.ops_[event.gid % KANATA_CONVERTER_GID_WRAP_AROUND] = self.Op(event.gid)
+
+    def OnStageBegin_(self, event, op):
+        if op.stageID is not None and op.stageID != event.stageID:
+            self.RemoveOp_(op)
+        op.stageID = event.stageID
+        if event.stageID == TOP_DOWN_DISPATCH_STAGE_ID:
+            self.dispatchOps_[op.gid] = op
+
+    def OnStageEnd_(self, event, op):
+        if op.stageID == event.stageID:
+            if op.stageID == TOP_DOWN_DISPATCH_STAGE_ID:
+                del self.dispatchOps_[op.gid]
+            op.stageID = None
+
+    def OnStallBegin_(self, event, op):
+        self.EndStall_(op)
+        op.stallStageID = event.stageID
+        if event.stageID in (TOP_DOWN_RENAME_STAGE_ID, TOP_DOWN_DISPATCH_STAGE_ID):
+            self.blockedOps_ += 1
+
+    def OnStallEnd_(self, event, op):
+        self.EndStall_(op)
+
+    def OnRetire_(self, event, op):
+        self.AddOpSlot_(op, TOP_DOWN_RETIRING)
+        self.DisposeOps_(event.gid + 1)
+
+    def OnFlush_(self, event, op):
+        if op.dispatchCycle is not None:
+            # The frontend refills after dispatched ops are flushed.
+            self.recovering_ = True
+        self.AddOpSlot_(op, TOP_DOWN_BAD_SPECULATION)
+        self.RemoveOp_(op)
+        self.ops_[event.gid % KANATA_CONVERTER_GID_WRAP_AROUND] = None
+
+    #
+    # Results
+    #
+    def GetResults(self):
+        """ Return results as a dictionary. Slots of a last cycle are
+        classified when results are taken first.
+        """
+        if self.currentCycle_ is not None:
+            self.AccountCycles_(self.currentCycle_ + 1)
+            self.currentCycle_ = None
+            # Ops in flight at the end of a log
+            for op in self.ops_:
+                if op is not None and op.dispatchCycle is not None:
+                    self.unresolvedSlots_ += 1
+                    op.dispatchCycle = None
+
+        slots = 0
+        totals = [0] * len(TOP_DOWN_CATEGORY_NAMES)
+        series = []
+        for window in sorted(self.windows_):
+            entry = self.windows_[window]
+            slots += entry[0]
+            for i in range(len(totals)):
+                totals[i] += entry[1 + i]
+            series.append(
+                [window * self.window_] +
+                [self.Divide_(n, entry[0]) for n in entry[1:]]
+            )
+
+        categories = collections.OrderedDict()
+        for name, n in zip(TOP_DOWN_CATEGORY_NAMES, totals):
+            categories[name] = collections.OrderedDict([
+                ("slots", n),
+                ("fraction", self.Divide_(n, slots)),
+            ])
+
+        return collections.OrderedDict([
+            ("width", self.width_),
+            ("cycles", self.cycles_),
+            ("slots", slots),
+            ("overflowSlots", self.overflowSlots_),
+            ("categories", categories),
+            ("unresolvedSlots", self.unresolvedSlots_),
+            ("windows", collections.OrderedDict([
+                ("window", self.window_),
+                ("series", series),
+            ])),
+        ])
+
+    def Divide_(self, a, b):
+        return float(a) / b if b != 0 else 0.0
+
+    def WriteTable_(self, file, results):
+        file.write(
+            "width: %d, cycles: %d, slots: %d\n\n" %
+            (results["width"], results["cycles"], results["slots"])
+        )
+        file.write("%-16s %12s %7s\n" % ("category", "slots", "%"))
+        for name, c in results["categories"].items():
+            file.write("%-16s %12d %6.1f%%\n" % (name, c["slots"], 100.0 * c["fraction"]))
+        file.write("%-16s %12d\n\n" % ("unresolved", results["unresolvedSlots"]))
+
+        file.write(
+            "%12s %10s %10s %10s %10s\n" % ("window", "retiring", "badSpec", "frontend", "backend")
+        )
+        for entry in results["windows"]["series"]:
+            file.write(
+                "%12d %9.1f%% %9.1f%% %9.1f%% %9.1f%%\n" %
+                tuple([entry[0]] + [100.0 * f for f in entry[1:]])
+            )
+
+    def WriteCSV_(self, file, results):
+        """ Write a row of fractions for a whole log and each window. """
+        writer = csv.writer(file, lineterminator="\n")
+        writer.writerow(["window"] + TOP_DOWN_CATEGORY_NAMES)
+        writer.writerow(
+            ["total"] + [c["fraction"] for c in results["categories"].values()]
+        )
+        for entry in results["windows"]["series"]:
+            writer.writerow(entry)
+
+
+#
+# The entry point of this program.
+#
+if __name__ == '__main__':
+    from RSD_Parser import RSD_Parser, RSD_ParserError
+
+    optionParser = OptionParser( usage="%prog [options] inputFileName outputFileName" )
+    optionParser.add_option('-w', '--width',
+                  action='store', type='int', dest='width',
+                  default=TOP_DOWN_DEFAULT_WIDTH,
+                  help="The number of dispatch slots in a cycle.")
+    optionParser.add_option('--window',
+                  action='store', type='int', dest='window',
+                  default=TOP_DOWN_DEFAULT_WINDOW,
+                  help="Count slots in windows of the specified number of cycles.")
+    optionParser.add_option('--max-windows',
+                  action='store', type='int', dest='maxWindows',
+                  default=TOP_DOWN_DEFAULT_MAX_WINDOWS,
+                  help="Merge windows when there are more than the specified number of them.")
+    options, args = optionParser.parse_args()
+
+    if ( len(args) < 2 ):
+        print( "usage: %(exe)s [options] inputFileName outputFileName" % { 'exe': sys.argv[0] } )
+        exit(1)
+
+    parser = RSD_Parser()
+    try:
+        generator = TopDownGenerator( options.width, options.window, options.maxWindows )
+    except ValueError as err:
+        print( err )
+        exit(1)
+    try:
+        parser.Open( args[0] )
+        generator.Open( args[1] )
+        parser.Parse( generator )
+    except IOError as err:
+        print("I/O error: %s" % err)
+    except RSD_ParserError as err:
+        print(err)
+    finally:
+        parser.Close()
+        generator.Close()